@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""วัดความเร็วของ fast_ahp เทียบกับ ahpy.Compare (ความตรงกันของผลตรวจใน tests/test_fast_ahp.py)
+
+ใช้งาน: python benchmarks/bench_ahp.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_ahp import ahp_weights, comparison_weights  # noqa: E402
+from fast_topsis import CRITERIA  # noqa: E402
+
+
+def ratio_comparisons(weights):
+    """dict เปรียบเทียบคู่แบบเดียวกับที่ calculate_ahp_topsis เคยสร้างให้ ahpy"""
+    keys = list(weights)
+    return {(k1, k2): weights[k1] / weights[k2] for i, k1 in enumerate(keys) for k2 in keys[i + 1:]}
+
+
+def saaty_comparisons(rng, n=7):
+    """matrix เปรียบเทียบคู่แบบสุ่มบนสเกล Saaty (โดยทั่วไปไม่ consistent)"""
+    scale = [1 / 9, 1 / 7, 1 / 5, 1 / 3, 1, 3, 5, 7, 9]
+    keys = CRITERIA[:n]
+    return {(k1, k2): float(rng.choice(scale)) for i, k1 in enumerate(keys) for k2 in keys[i + 1:]}
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    from ahpy import Compare
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    weights = dict(zip(CRITERIA, [14.28, 20.0, 5.0, 8.0, 12.0, 30.0, 10.72]))
+    baseline = timeit(lambda: Compare('Criteria Comparison', ratio_comparisons(weights)), max(1, args.repeat // 10))
+    fast = timeit(lambda: ahp_weights(weights), args.repeat)
+    comparisons = saaty_comparisons(np.random.default_rng(3))
+    solver = timeit(lambda: comparison_weights(comparisons), args.repeat)
+    print(f"ahpy.Compare                 : {baseline * 1e3:8.3f} ms")
+    print(f"ahp_weights (memoized)       : {fast * 1e3:8.3f} ms  ({baseline / fast:.0f}x)")
+    print(f"comparison_weights (eig)     : {solver * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""เปรียบเทียบเวลา train โมเดล clustering โหมด batch กับ incremental บนข้อมูลจาก synth_data.py
+
+ใช้งาน: python benchmarks/bench_clustering.py --data-dir data/bench [--skip-batch] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data/bench')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--skip-batch', action='store_true', help='ข้ามโหมด batch (ช้ามากเมื่อข้อมูลเกินหลักหมื่นแถว)')
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    os.environ['DATA_SOURCE'] = 'local'
+    os.environ['LOCAL_DATA_DIR'] = os.path.abspath(args.data_dir)
+    os.environ['CLUSTER_CHUNK_SIZE'] = str(args.chunk_size)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import bit15_model_app as app_module
+
+    report = {}
+    start = time.perf_counter()
+    model = app_module.build_incremental_clustering_model()
+    report['incremental_full'] = {'seconds': time.perf_counter() - start, 'rows': model.n_samples,
+                                  'n_clusters': int(model.pipeline.kmeans.n_clusters)}
+    start = time.perf_counter()
+    updated = app_module.build_incremental_clustering_model(model)
+    report['incremental_update'] = {'seconds': time.perf_counter() - start,
+                                    'new_rows': updated.n_samples - model.n_samples}
+    if not args.skip_batch:
+        start = time.perf_counter()
+        model = app_module.build_batch_clustering_model()
+        report['batch'] = {'seconds': time.perf_counter() - start, 'rows': model.n_samples,
+                           'n_clusters': int(model.pipeline.named_steps['cluster'].n_clusters)}
+
+    for name, result in report.items():
+        print(f"{name:>20}: " + ', '.join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                           for k, v in result.items()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
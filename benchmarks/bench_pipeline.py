@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""benchmark ของ pipeline /handleSubmit แบบ offline: latency ต่อขั้นตอน, end-to-end และ throughput ภายใต้ concurrency
+
+ใช้ข้อมูลจาก synth_data.py ผ่าน DATA_SOURCE=local (จำลอง round-trip ของ BigQuery ด้วย --latency-ms)
+ผลลัพธ์เป็น JSON (--json) ที่มี commit ของ repo ไว้เทียบ regression ระหว่าง commit
+
+ใช้งาน:
+    python benchmarks/synth_data.py --out data/bench --models 2000 --profiles 100000
+    python benchmarks/bench_pipeline.py --data-dir data/bench --requests 2000 --concurrency 1 4 16 --json out.json
+    python benchmarks/bench_pipeline.py --url http://localhost:8080 ...   (ยิง server ที่รันอยู่แทน in-process)
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synth_data import random_submissions  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(samples):
+    """สรุป latency (วินาที) เป็น ms: count, mean, p50/p95/p99, max"""
+    values = np.asarray(samples, dtype=float) * 1000
+    if len(values) == 0:
+        return {'count': 0}
+    summary = {'count': int(len(values)), 'mean_ms': float(values.mean())}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{p}_ms'] = float(v)
+    summary['max_ms'] = float(values.max())
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args):
+    """ตั้งค่า env ของแอปก่อน import (แหล่งข้อมูล local, artifact และ spool อยู่ในโฟลเดอร์ข้อมูล benchmark)"""
+    data_dir = os.path.abspath(args.data_dir)
+    os.environ['DATA_SOURCE'] = 'local'
+    os.environ['LOCAL_DATA_DIR'] = data_dir
+    os.environ['LOCAL_DATA_LATENCY_MS'] = str(args.latency_ms)
+    os.environ.setdefault('CLUSTER_MODEL_PATH', os.path.join(data_dir, 'user_clustering.pkl'))
+    os.environ.setdefault('WRITE_BEHIND_SPOOL', os.path.join(data_dir, 'bench.spool.jsonl'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+def run_stages(app_module, submissions):
+    """เรียกแต่ละขั้นตอนของ handle_submit ตามลำดับเดียวกัน แล้วจับเวลาแยกขั้นตอน"""
+    stages = {name: [] for name in ('transform', 'cluster', 'hybrid_weights', 'ahp', 'filter', 'topsis',
+                                    'select', 'persist', 'total')}
+    for data in submissions:
+        start = total_start = time.perf_counter()
+
+        def lap(name):
+            nonlocal start
+            now = time.perf_counter()
+            stages[name].append(now - start)
+            start = now
+
+        user_profile = dict(data['userProfile'], driveCon=data['driveCon'], seats=data['numSeats'])
+        user_df = app_module.transform_user_features(user_profile)
+        lap('transform')
+        cluster_id = app_module.cluster_store.predict(user_df)
+        lap('cluster')
+        user_weights = app_module.map_user_weights(data['summedWeight'])
+        hybrid = app_module.create_hybrid_weights(user_weights, cluster_id)
+        lap('hybrid_weights')
+        snapshot = app_module.catalog_cache.get()
+        ahp = app_module.compute_criteria_weights(hybrid)
+        lap('ahp')
+        results = []
+        if ahp is not None:
+            positions = app_module.get_catalog_index(snapshot).candidates(data['driveCon'], data['numSeats'])
+            lap('filter')
+            scores = app_module.get_topsis_engine(snapshot).score(ahp, positions)
+            lap('topsis')
+            results = app_module.select_top_models(app_module.get_catalog_records(snapshot), positions, scores)
+            lap('select')
+        app_module.save_user_data(user_profile, user_weights, results, data['driveCon'], data['numSeats'])
+        app_module.save_user_result(user_profile, user_weights, hybrid, results, cluster_id,
+                                    data['driveCon'], data['numSeats'])
+        lap('persist')
+        stages['total'].append(time.perf_counter() - total_start)
+    return {name: summarize(samples) for name, samples in stages.items()}
+
+
+def make_in_process_sender(app_module):
+    def send(body):
+        client = app_module.app.test_client()
+        response = client.post('/handleSubmit', json=body)
+        return response.status_code
+    return send
+
+
+def make_http_sender(url):
+    import urllib.error
+    import urllib.request
+
+    endpoint = url.rstrip('/') + '/handleSubmit'
+
+    def send(body):
+        request = urllib.request.Request(endpoint, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def run_load(send, submissions, concurrency):
+    """ส่งทุก request ด้วย thread pool ขนาด concurrency คืน latency และ throughput"""
+    def timed(body):
+        start = time.perf_counter()
+        status = send(body)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, submissions))
+    elapsed = time.perf_counter() - start
+    result = summarize([latency for latency, _ in outcomes])
+    result['concurrency'] = concurrency
+    result['throughput_rps'] = len(outcomes) / elapsed if elapsed > 0 else None
+    result['errors'] = sum(1 for _, status in outcomes if status >= 500)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data/bench')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency จำลองต่อการเรียกแหล่งข้อมูล')
+    parser.add_argument('--url', help='ยิง server ที่รันอยู่แทนการเรียกแอปใน process นี้')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    submissions = random_submissions(args.requests, args.seed)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'args': vars(args),
+    }
+
+    if args.url:
+        send = make_http_sender(args.url)
+    else:
+        configure_environment(args)
+        import bit15_model_app as app_module
+
+        start = time.perf_counter()
+        app_module.warmup()
+        report['warmup_s'] = time.perf_counter() - start
+        snapshot = app_module.catalog_cache.get()
+        report['dataset'] = {'models': len(snapshot.df), 'catalog_version': snapshot.version,
+                             'cluster_model_version': app_module.cluster_store.version}
+        report['stages'] = run_stages(app_module, submissions)
+        start = time.perf_counter()
+        app_module.write_sink.flush()
+        report['persist_flush_s'] = time.perf_counter() - start
+        send = make_in_process_sender(app_module)
+
+    report['load'] = []
+    for concurrency in args.concurrency:
+        report['load'].append(run_load(send, submissions, concurrency))
+    if not args.url:
+        app_module.write_sink.close()
+
+    for name, summary in report.get('stages', {}).items():
+        print(f"{name:>15}: p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms")
+    for result in report['load']:
+        print(f"concurrency={result['concurrency']:>3}: p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+              f"p99={result['p99_ms']:.2f}ms throughput={result['throughput_rps']:.1f} req/s errors={result['errors']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
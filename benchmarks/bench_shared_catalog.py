@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""เปรียบเทียบหน่วยความจำและเวลาโหลดแคตตาล็อกต่อ worker ระหว่างแบบแยก process กับแคตตาล็อกร่วม (SHARED_CATALOG_DIR)
+
+แต่ละโหมดเริ่ม worker --workers process พร้อมกัน ทุก process โหลดแคตตาล็อกพร้อม TOPSIS matrix, ดัชนี และ records
+แล้วรายงานหน่วยความจำส่วนตัว (Private_Clean + Private_Dirty จาก /proc/self/smaps_rollup ใช้ได้บน Linux) ที่เพิ่มขึ้น
+
+ใช้งาน: python benchmarks/bench_shared_catalog.py --data-dir data/bench --workers 4 [--json out.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def private_bytes():
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def run_worker():
+    """โหลดแคตตาล็อกใน process นี้แล้วพิมพ์ผลเป็น JSON หนึ่งบรรทัด"""
+    import bit15_model_app as app_module
+
+    before = private_bytes()
+    start = time.perf_counter()
+    snapshot = app_module.catalog_cache.get()
+    app_module.get_topsis_engine(snapshot)
+    app_module.get_catalog_index(snapshot)
+    app_module.get_catalog_records(snapshot)
+    print(json.dumps({'seconds': time.perf_counter() - start, 'private_bytes': private_bytes() - before,
+                      'version': snapshot.version, 'shared': snapshot.view is not None}))
+
+
+def run_mode(args, shared_dir):
+    env = dict(os.environ, DATA_SOURCE='local', LOCAL_DATA_DIR=os.path.abspath(args.data_dir),
+               LOG_LEVEL='WARNING', RESULT_CACHE_SIZE='0')
+    env.pop('SHARED_CATALOG_DIR', None)
+    if shared_dir:
+        env['SHARED_CATALOG_DIR'] = shared_dir
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker'], env=env, cwd=ROOT,
+                                stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    results = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+    return {
+        'workers': results,
+        'total_private_mb': sum(r['private_bytes'] for r in results) / 2 ** 20,
+        'max_load_s': max(r['seconds'] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data/bench')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker()
+        return
+
+    shared_dir = tempfile.mkdtemp(prefix='ev-catalog-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        report = {'per_process': run_mode(args, None), 'shared': run_mode(args, shared_dir)}
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+    for name, result in report.items():
+        print(f"{name:>12}: private รวม {result['total_private_mb']:.1f} MB, โหลดนานสุด {result['max_load_s']:.3f}s, "
+              f"shared={[r['shared'] for r in result['workers']]}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""วัดเวลา import แอป และ latency ของ request แรก (cold เทียบกับหลัง warmup แบบ preload_app)
+
+แต่ละรอบรันใน process ใหม่เพื่อให้ได้เวลาเริ่มต้นจริง ใช้แหล่งข้อมูล local (ดู export_snapshot.py)
+
+ใช้งาน: python benchmarks/bench_startup.py [--data-dir data] [--repeat 3] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_BODY = {
+    'userProfile': {'gender': 'unknown', 'age_range': 'unknown', 'occupation': 'unknown'},
+    'driveCon': 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ',
+    'numSeats': 5,
+    'summedWeight': {'range': 20, 'top_speed': 5, 'accelarate': 5, 'efficiency': 10,
+                     'battery': 10, 'estimated_thb_value': 40, 'fastcharge': 10},
+}
+
+
+def child(mode):
+    """ทำงานใน process ลูก: พิมพ์ผลเวลาเป็น JSON หนึ่งบรรทัด"""
+    result = {}
+    start = time.perf_counter()
+    import bit15_model_app
+    result['import_s'] = time.perf_counter() - start
+    result['heavy_modules_loaded'] = sorted(m for m in ('pandas', 'sklearn', 'google.cloud.bigquery')
+                                            if m in sys.modules)
+    if mode == 'import':
+        print(json.dumps(result))
+        return
+    if mode == 'warm':
+        start = time.perf_counter()
+        bit15_model_app.warmup()
+        result['warmup_s'] = time.perf_counter() - start
+    client = bit15_model_app.app.test_client()
+    start = time.perf_counter()
+    response = client.post('/handleSubmit', json=SAMPLE_BODY)
+    result['first_request_s'] = time.perf_counter() - start
+    result['status'] = response.status_code
+    start = time.perf_counter()
+    client.post('/handleSubmit', json=SAMPLE_BODY)
+    result['second_request_s'] = time.perf_counter() - start
+    bit15_model_app.write_sink.close()
+    print(json.dumps(result))
+
+
+def run_child(mode, env):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    keys = [k for k, v in runs[0].items() if isinstance(v, float)]
+    return {k: statistics.median(run[k] for run in runs) for k in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default=os.environ.get('LOCAL_DATA_DIR', 'data'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    parser.add_argument('--child', choices=['import', 'cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        child(args.child)
+        return
+
+    env = dict(os.environ, DATA_SOURCE='local', LOCAL_DATA_DIR=os.path.abspath(args.data_dir))
+    # ไม่ให้ request ของ benchmark ค้างอยู่ใน spool ของ deployment จริง
+    env.setdefault('WRITE_BEHIND_SPOOL', os.path.join(os.path.abspath(args.data_dir), 'bench.spool.jsonl'))
+    report = {}
+    for mode in ('import', 'cold', 'warm'):
+        runs = [run_child(mode, env) for _ in range(args.repeat)]
+        report[mode] = summarize(runs)
+        report[mode]['heavy_modules_loaded'] = runs[0]['heavy_modules_loaded']
+        timings = ', '.join(f"{k}={v * 1000:.1f}ms" for k, v in report[mode].items() if isinstance(v, float))
+        print(f"{mode:>6}: {timings}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""latency ของการค้นสถานีชาร์จด้วย StationIndex (grid + inverted index) เทียบกับคำนวณระยะทุกสถานีต่อ query
+
+ตรวจด้วยว่าผล k-nearest / รัศมีตรงกับการคำนวณตรง ๆ ทุก query
+
+ใช้งาน: python benchmarks/bench_stations.py [--stations 20000] [--queries 2000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import summarize  # noqa: E402
+from station_index import CONNECTION_TYPES, POWER_LEVELS, StationIndex, haversine_km  # noqa: E402
+from synth_data import STATION_CITIES, make_stations  # noqa: E402
+
+
+def random_filters(rng):
+    """เงื่อนไขกรองแบบหน้าแผนที่: ไม่กรอง, จังหวัด, ประเภทหัวชาร์จ หรือกำลังไฟ"""
+    choice = rng.integers(4)
+    if choice == 0:
+        return {}
+    if choice == 1:
+        return {'province': STATION_CITIES[rng.integers(len(STATION_CITIES))][0]}
+    if choice == 2:
+        return {'connection_type': CONNECTION_TYPES[rng.integers(len(CONNECTION_TYPES))]}
+    return {'powers': [POWER_LEVELS[rng.integers(len(POWER_LEVELS))]]}
+
+
+def brute_force(index, lat, lon, positions):
+    candidates = index.located if positions is None else positions[index.located_mask[positions]]
+    distances = haversine_km(lat, lon, index.lats[candidates], index.lons[candidates])
+    return np.sort(distances)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stations', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--radius-km', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    df = make_stations(args.stations, rng)
+    start = time.perf_counter()
+    index = StationIndex.from_dataframe(df)
+    build_seconds = time.perf_counter() - start
+
+    timings = {'filter': [], 'nearest': [], 'within': [], 'full_scan': []}
+    for _ in range(args.queries):
+        # จุดที่ถามอยู่ใกล้เมืองหลักหรือสุ่มทั่วประเทศ
+        if rng.random() < 0.8:
+            city = STATION_CITIES[rng.integers(len(STATION_CITIES))]
+            lat, lon = city[1] + rng.normal(0, 0.2), city[2] + rng.normal(0, 0.2)
+        else:
+            lat, lon = rng.uniform(5.6, 20.5), rng.uniform(97.3, 105.6)
+        filters = random_filters(rng)
+
+        start = time.perf_counter()
+        positions = index.filter(**filters)
+        timings['filter'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        _, nearest = index.nearest(lat, lon, args.k, positions)
+        timings['nearest'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        _, within = index.within(lat, lon, args.radius_km, positions)
+        timings['within'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = brute_force(index, lat, lon, positions)
+        timings['full_scan'].append(time.perf_counter() - start)
+
+        assert np.allclose(nearest, expected[:args.k]), "k-nearest ไม่ตรงกับการคำนวณทุกสถานี"
+        assert np.allclose(within, expected[expected <= args.radius_km]), "ผลในรัศมีไม่ตรงกับการคำนวณทุกสถานี"
+
+    report = {'stations': args.stations, 'build_seconds': build_seconds,
+              **{name: summarize(samples) for name, samples in timings.items()}}
+    print(f"สร้างดัชนี {args.stations} สถานี: {build_seconds:.3f}s")
+    for name in timings:
+        summary = report[name]
+        print(f"{name:>10}: p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
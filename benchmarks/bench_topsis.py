@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""ตรวจความตรงกัน (parity) ของ TopsisEngine กับ skcriteria และวัดความเร็ว
+
+ใช้งาน: python benchmarks/bench_topsis.py [--models 2000] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_topsis import CRITERIA, COST_CRITERIA, TopsisEngine  # noqa: E402
+
+
+def random_catalog(n_models, seed=0):
+    """สร้าง matrix เกณฑ์แบบสุ่มในช่วงค่าใกล้เคียงข้อมูลจริง"""
+    rng = np.random.default_rng(seed)
+    low = np.array([200, 120, 3.0, 12, 40, 700_000, 50])
+    high = np.array([700, 260, 12.0, 25, 110, 5_000_000, 350])
+    return rng.uniform(low, high, size=(n_models, len(CRITERIA)))
+
+
+def skcriteria_similarity(matrix, weights):
+    """คะแนนอ้างอิงจาก skcriteria: VectorScaler(matrix) แล้ว TOPSIS"""
+    from skcriteria import mkdm, Objective
+    from skcriteria.agg.similarity import TOPSIS
+    from skcriteria.preprocessing.scalers import VectorScaler
+
+    objectives = [Objective.MIN if c in COST_CRITERIA else Objective.MAX for c in CRITERIA]
+    dm = mkdm(matrix=matrix, objectives=objectives, weights=weights, criteria=CRITERIA)
+    dm = VectorScaler(target='matrix').transform(dm)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return TOPSIS().evaluate(dm).e_.similarity, dm
+
+
+def check_parity(n_models=500, trials=20):
+    rng = np.random.default_rng(1)
+    matrix = random_catalog(n_models)
+    engine = TopsisEngine(matrix)
+    worst = 0.0
+    for _ in range(trials):
+        weights = rng.uniform(0.01, 1.0, len(CRITERIA))
+        expected, _ = skcriteria_similarity(matrix, weights)
+        worst = max(worst, float(np.max(np.abs(engine.score(weights) - expected))))
+    assert worst < 1e-9, f"TopsisEngine ไม่ตรงกับ skcriteria (max abs diff {worst})"
+    return worst
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    diff = check_parity()
+    print(f"parity: OK (max abs diff {diff:.2e})")
+
+    matrix = random_catalog(args.models)
+    weights = np.full(len(CRITERIA), 1.0 / len(CRITERIA))
+    engine = TopsisEngine(matrix)
+    baseline = timeit(lambda: skcriteria_similarity(matrix, weights), max(1, args.repeat // 10))
+    fast = timeit(lambda: engine.score(weights), args.repeat)
+    build = timeit(lambda: TopsisEngine(matrix), max(1, args.repeat // 10))
+    print(f"models={args.models}")
+    print(f"skcriteria (per request) : {baseline * 1e3:9.3f} ms")
+    print(f"TopsisEngine.score       : {fast * 1e3:9.3f} ms  ({baseline / fast:.0f}x)")
+    print(f"TopsisEngine build (1x/version): {build * 1e3:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""latency ของ /whatIf (ปรับน้ำหนักแล้วจัดอันดับใหม่ พร้อม/ไม่พร้อมช่วง rank stability) เทียบกับ /handleSubmit
+
+แต่ละ session มาจาก /handleSubmit หนึ่งครั้ง แล้วจำลองการเลื่อน slider ด้วยน้ำหนักสุ่ม --moves ครั้งต่อ session
+
+ใช้งาน: python benchmarks/bench_whatif.py --data-dir data/bench --sessions 200 --moves 10 [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import configure_environment, summarize  # noqa: E402
+from synth_data import WEIGHT_KEYS, random_submissions  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data/bench')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--moves', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+    args.latency_ms = 0.0
+    configure_environment(args)
+    import bit15_model_app as app_module
+
+    app_module.warmup()
+    client = app_module.app.test_client()
+    rng = np.random.default_rng(args.seed)
+    timings = {'handleSubmit': [], 'whatIf': [], 'whatIf_no_stability': []}
+    for body in random_submissions(args.sessions, args.seed):
+        start = time.perf_counter()
+        response = client.post('/handleSubmit', json=body)
+        timings['handleSubmit'].append(time.perf_counter() - start)
+        session_id = response.headers.get('X-Session-Id')
+        if session_id is None:
+            continue
+        for _ in range(args.moves):
+            weights = dict(body['summedWeight'])
+            key = list(WEIGHT_KEYS)[rng.integers(len(WEIGHT_KEYS))]
+            weights[key] = max(0, weights[key] + int(rng.integers(-5, 6)))
+            for name, stability in (('whatIf', True), ('whatIf_no_stability', False)):
+                start = time.perf_counter()
+                client.post('/whatIf', json={'sessionId': session_id, 'summedWeight': weights, 'stability': stability})
+                timings[name].append(time.perf_counter() - start)
+    app_module.write_sink.close()
+
+    report = {name: summarize(samples) for name, samples in timings.items()}
+    for name, summary in report.items():
+        print(f"{name:>20}: p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms p99={summary['p99_ms']:.3f}ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
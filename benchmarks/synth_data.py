@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""สร้างข้อมูลสังเคราะห์สำหรับ benchmark: ตาราง Model, UserProfiles, User_data และ ChargingStation เป็นไฟล์ Parquet
+
+ชื่อคอลัมน์และค่าที่เป็นไปได้ตรงกับ BigQuery และแบบฟอร์มหน้าเว็บ (app/formPage) ใช้คู่กับ DATA_SOURCE=local
+
+ใช้งาน: python benchmarks/synth_data.py --out data/bench --models 2000 --profiles 1000000 [--user-data 100000] [--stations 20000]
+"""
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+DRIVE_CONFIGS = ['ระบบขับเคลื่อนล้อหน้า', 'ระบบขับเคลื่อนล้อหลัง', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ']
+SEATS = [2, 4, 5, 7]
+PROFILE_CHOICES = {
+    'gender': ['male', 'female', 'other'],
+    'age_range': ['18-24', '25-34', '35-44', '45-54', '55-64', '65+'],
+    'occupation': ['student', 'employed', 'self-employed', 'unemployed', 'retired', 'officer'],
+    'marital_status': ['single', 'married', 'divorced', 'widowed'],
+    'family_status': ['no_children', 'with_children'],
+    'income_range': ['low', 'medium', 'high', 'very_high'],
+    'vehicle_status': ['have', "don't_have"],
+}
+# summedWeight ของหน้าเว็บ: ผลรวมคะแนน 2 คำถามต่อปัจจัย (คะแนน 1-9)
+ANSWER_SCORES = [1, 2, 3, 5, 7, 8, 9]
+WEIGHT_KEYS = {
+    'battery': 'battery_weight',
+    'range': 'range_weight',
+    'accelarate': 'accelarate_weight',
+    'top_speed': 'topspeed_weight',
+    'efficiency': 'efficiency_weight',
+    'fastcharge': 'fastcharge_weight',
+    'estimated_thb_value': 'price_weight',
+}
+CHUNK_ROWS = 500_000
+# เมืองหลักสำหรับวางสถานีชาร์จ: (จังหวัด, ละติจูด, ลองจิจูด)
+STATION_CITIES = [
+    ('กรุงเทพมหานคร', 13.7563, 100.5018), ('เชียงใหม่', 18.7883, 98.9853), ('ขอนแก่น', 16.4419, 102.8360),
+    ('นครราชสีมา', 14.9799, 102.0977), ('ชลบุรี', 13.3611, 100.9847), ('ภูเก็ต', 7.8804, 98.3923),
+    ('สงขลา', 7.1898, 100.5954), ('อุดรธานี', 17.4138, 102.7872), ('พิษณุโลก', 16.8211, 100.2659),
+    ('สุราษฎร์ธานี', 9.1382, 99.3215),
+]
+STATION_DISTRIBUTORS = ['PTT EV Station', 'EA Anywhere', 'EleXA', 'PEA VOLTA', 'MEA EV', 'Sharge']
+
+
+def make_models(n, rng):
+    """แคตตาล็อกรถ n รุ่น (คอลัมน์ดิบแบบตาราง Model ก่อนทำความสะอาด)"""
+    import pandas as pd
+
+    battery = rng.uniform(30, 120, n)
+    efficiency = rng.uniform(13, 26, n)
+    brands = np.array(['BYD', 'MG', 'Tesla', 'GWM', 'Neta', 'Volvo', 'BMW', 'Hyundai', 'Kia', 'Nissan'])
+    return pd.DataFrame({
+        'Model_ID': np.arange(1, n + 1),
+        'Brand': brands[rng.integers(0, len(brands), n)],
+        'Model': [f"EV-{i:06d}" for i in range(n)],
+        'Battery': battery.round(1),
+        'Real_Range': (battery / efficiency * 85).round(),
+        'Range': (battery / efficiency * 100).round().astype(int),
+        'Accelarate': rng.uniform(3, 13, n).round(1),
+        'Top_Speed': rng.integers(130, 260, n),
+        'Efficiency': efficiency.round(1),
+        'Fastcharge': rng.integers(150, 1000, n),
+        'Towing_capacity': rng.choice([0, 750, 1000, 1600], n),
+        'Seats': rng.choice(SEATS, n, p=[0.05, 0.1, 0.7, 0.15]),
+        # ราคาในตารางจริงเป็นข้อความมีจุลภาค
+        'Estimated_THB_Value': [f"{v:,}" for v in rng.integers(600_000, 6_000_000, n)],
+        'Drive_Configuration': np.array(DRIVE_CONFIGS)[rng.integers(0, len(DRIVE_CONFIGS), n)],
+        'Tow_Hitch': rng.choice(['Yes', 'No'], n),
+        'Segment': rng.choice(['A', 'B', 'C', 'D', 'E', 'F'], n),
+        'EV_Image_URL': '',
+        'Website': '',
+    })
+
+
+def make_stations(n, rng):
+    """สถานีชาร์จ n แห่งกระจายรอบเมืองหลัก (คอลัมน์แบบตาราง ChargingStation)"""
+    import pandas as pd
+
+    city = rng.integers(0, len(STATION_CITIES), n)
+    provinces = np.array([c[0] for c in STATION_CITIES])
+    centers = np.array([c[1:] for c in STATION_CITIES])
+    # ส่วนใหญ่อยู่ในเมือง ที่เหลือกระจายตามทางหลวงรอบเมือง
+    spread = np.where(rng.random(n) < 0.7, 0.08, 0.6)[:, None]
+    location = centers[city] + rng.normal(0, 1, (n, 2)) * spread
+    df = pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Name': [f"Station-{i:06d}" for i in range(n)],
+        'Address': '',
+        'Subdistrict': [f"ตำบล {i}" for i in rng.integers(0, 20, n)],
+        'District': [f"อำเภอ {i}" for i in rng.integers(0, 10, n)],
+        'Province': provinces[city],
+        'Latitude': location[:, 0].round(6),
+        'Longitude': location[:, 1].round(6),
+        'Distributor': np.array(STATION_DISTRIBUTORS)[rng.integers(0, len(STATION_DISTRIBUTORS), n)],
+        'logo_url': '',
+    })
+    for column, probability in (('25kW', 0.2), ('50kW', 0.4), ('120kW', 0.3), ('300kW', 0.1), ('360kW', 0.05),
+                                ('AC Type 2', 0.6), ('CCS2', 0.7), ('CHAdeMO', 0.2)):
+        df[column] = np.where(rng.random(n) < probability, rng.integers(1, 5, n), 0)
+    return df
+
+
+def random_profiles(n, rng):
+    """userProfile แบบสุ่ม n คน (dict ต่อคอลัมน์ของ numpy array)"""
+    columns = {key: np.array(values)[rng.integers(0, len(values), n)] for key, values in PROFILE_CHOICES.items()}
+    columns['driveCon'] = np.array(DRIVE_CONFIGS)[rng.integers(0, len(DRIVE_CONFIGS), n)]
+    columns['seats'] = rng.choice(SEATS, n, p=[0.05, 0.15, 0.6, 0.2])
+    return columns
+
+
+def random_summed_weights(n, rng):
+    """summedWeight แบบหน้าเว็บ n ชุด (dict ตามคีย์ของฟรอนต์เอนด์)"""
+    scores = np.array(ANSWER_SCORES)
+    return {key: scores[rng.integers(0, len(scores), (n, 2))].sum(axis=1) for key in WEIGHT_KEYS}
+
+
+def random_submissions(n, seed=0):
+    """body ของ /handleSubmit แบบสุ่ม n รายการ"""
+    rng = np.random.default_rng(seed)
+    profiles = random_profiles(n, rng)
+    weights = random_summed_weights(n, rng)
+    submissions = []
+    for i in range(n):
+        user_profile = {key: str(profiles[key][i]) for key in PROFILE_CHOICES}
+        user_profile['user_id'] = f"bench-{seed}-{i}"
+        submissions.append({
+            'userProfile': user_profile,
+            'driveCon': str(profiles['driveCon'][i]),
+            'numSeats': int(profiles['seats'][i]),
+            'summedWeight': {key: int(values[i]) for key, values in weights.items()},
+        })
+    return submissions
+
+
+def make_history_chunk(n, rng, start, with_cluster):
+    """ประวัติผู้ใช้ n แถวในรูปแบบเดียวกับ save_user_result / save_user_data"""
+    import pandas as pd
+
+    profiles = random_profiles(n, rng)
+    weights = random_summed_weights(n, rng)
+    df = pd.DataFrame({'user_id': [f"u{start + i}" for i in range(n)]})
+    for key in PROFILE_CHOICES:
+        df[key] = profiles[key]
+    if with_cluster:
+        df['cluster_id'] = rng.integers(0, 6, n)
+    df['driveCon'] = profiles['driveCon']
+    df['seats'] = profiles['seats']
+    now = datetime.datetime.now()
+    offsets = rng.integers(0, 365 * 24 * 3600, n)
+    df['timestamp'] = [(now - datetime.timedelta(seconds=int(s))).isoformat() for s in offsets]
+    for key, column in WEIGHT_KEYS.items():
+        df[column] = weights[key].astype(float)
+    if with_cluster:
+        totals = sum(weights[key] for key in WEIGHT_KEYS).astype(float)
+        for key, column in WEIGHT_KEYS.items():
+            df[f"hybrid_{column}"] = weights[key] / totals * 100
+    df['recommended_models'] = ''
+    df['selected_model'] = ''
+    df['satisfaction_score'] = rng.uniform(0.3, 0.9, n)
+    return df
+
+
+def write_history(path, n, rng, with_cluster):
+    """เขียนประวัติทีละ chunk (รองรับหลายล้านแถวโดยไม่ต้องถือทั้งตารางในหน่วยความจำ)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for start in range(0, n, CHUNK_ROWS):
+            chunk = make_history_chunk(min(CHUNK_ROWS, n - start), rng, start, with_cluster)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def generate(out, models, profiles, user_data, seed=0, stations=0):
+    """สร้างไฟล์ Model / UserProfiles / User_data (และ ChargingStation ถ้า stations > 0) .parquet ใน out"""
+    os.makedirs(out, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    make_models(models, rng).to_parquet(os.path.join(out, 'Model.parquet'), index=False)
+    write_history(os.path.join(out, 'UserProfiles.parquet'), profiles, rng, with_cluster=True)
+    write_history(os.path.join(out, 'User_data.parquet'), user_data, rng, with_cluster=False)
+    if stations:
+        make_stations(stations, rng).to_parquet(os.path.join(out, 'ChargingStation.parquet'), index=False)
+    # แถวที่ benchmark เขียนเพิ่ม (LocalSource ต่อท้าย .jsonl) ไม่ควรติดไปกับชุดข้อมูลใหม่
+    for table in ('UserProfiles', 'User_data'):
+        appended = os.path.join(out, f"{table}.jsonl")
+        if os.path.exists(appended):
+            os.remove(appended)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='data/bench')
+    parser.add_argument('--models', type=int, default=2000)
+    parser.add_argument('--profiles', type=int, default=10000)
+    parser.add_argument('--user-data', type=int, help='ค่าเริ่มต้นเท่ากับ --profiles')
+    parser.add_argument('--stations', type=int, default=0, help='จำนวนสถานีชาร์จ (0 = ไม่สร้างตาราง ChargingStation)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    user_data = args.user_data if args.user_data is not None else args.profiles
+    generate(args.out, args.models, args.profiles, user_data, args.seed, args.stations)
+    print(f"สร้างข้อมูลใน {args.out}: Model={args.models}, UserProfiles={args.profiles}, User_data={user_data}, "
+          f"ChargingStation={args.stations}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,62 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from google.cloud import bigquery
-import pandas as pd
 import os
+import base64
+import copy
 import logging
-from google.oauth2 import service_account
-from ahpy import Compare
-from skcriteria import mkdm
-from skcriteria.agg.similarity import TOPSIS
-from skcriteria import Objective
 import datetime
-import uuid
+import time
 import numpy as np
-from sklearn.preprocessing import OrdinalEncoder, StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.metrics import silhouette_score
 import json
+from call_pool import CallPool
+from catalog_cache import CatalogCache, catalog_records
+from catalog_index import CatalogIndex, top_k_positions
+from cluster_model_store import ClusterModel, ClusterModelStore, new_model_version
+from cluster_weights import WEIGHT_COLUMNS, ClusterWeightStore, aggregate_cluster_weights
+from data_sources import InstrumentedSource, make_data_source
+from fast_ahp import ahp_cache_info, ahp_weights as compute_ahp_weights
+from fast_topsis import TopsisEngine
+from metrics import DATA_SOURCE_SECONDS, REQUEST_SECONDS, CallbackCounter, Counter, Gauge, render as render_metrics, span
+from profiler import SamplingProfiler
+from result_cache import make_result_cache, make_result_key
+from sensitivity import rank_stability
+from shared_catalog import make_shared_catalog_store
+from station_index import StationIndex
+from write_behind import WriteBehindSink
+# pandas และ scikit-learn ถูก import เมื่อใช้งานครั้งแรก (หรือใน warmup ก่อน fork) เพื่อให้ worker เริ่มเร็ว
 # =======================================================
 # ตั้งค่าเริ่มต้น
 # =======================================================
 app = Flask(__name__)
 
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
+# log แบบมีระดับ: LOG_LEVEL=DEBUG จะ log ข้อมูลผู้ใช้และผลลัพธ์ทุก request (ค่าเริ่มต้น INFO)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s pid=%(process)d %(name)s: %(message)s')
+logger = logging.getLogger('bit15_model_app')
 
-def get_bq_client():
-    """สร้าง BigQuery Client จาก variables"""
-    try:
-        credentials = service_account.Credentials.from_service_account_file("C:/senior_project/config/bit15-ev-decision-support-2cef27def9c2.json")        
-        return bigquery.Client(credentials=credentials, project=os.environ.get("GCP_PROJECT"))
-    except Exception as e:
-        raise
-
-bq_client = get_bq_client()
+CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, expose_headers=['X-Session-Id'])
 
-# ตั้งค่า BigQuery Client
+# ตั้งค่าแหล่งข้อมูล
 PROJECT_ID = os.environ.get('PROJECT_ID', 'bit15-ev-decision-support')
 DATASET_ID = os.environ.get('DATASET_ID', 'EV_Dataset')
 MODEL_TABLE_ID = os.environ.get('MODEL_TABLE_ID', 'Model')
 USERPROFILES_TABLE = os.environ.get('USERPROFILES_TABLE', 'UserProfiles')
 USERPRODATA_TABLE = os.environ.get('USERPRODATA_TABLE', 'User_data')
+STATION_TABLE_ID = os.environ.get('STATION_TABLE_ID', 'ChargingStation')
 
-
+# BigQuery (ค่าเริ่มต้น) หรือ snapshot Parquet ในเครื่อง เลือกด้วย DATA_SOURCE (ดู data_sources.make_data_source)
+# ทุกการเรียกถูกจับเวลาลง ev_data_source_seconds
+data_source = InstrumentedSource(make_data_source(PROJECT_ID, DATASET_ID), DATA_SOURCE_SECONDS)
 
 # =======================================================
 # ส่วนฟังก์ชันเตรียมข้อมูล (สำหรับตาราง Model)
 # =======================================================
 def load_and_preprocess_data():
-    """โหลดและเตรียมข้อมูลจาก BigQuery (ตาราง Model)"""
+    """โหลดและเตรียมข้อมูลจากแหล่งข้อมูล (ตาราง Model)"""
+    import pandas as pd
     try:
-        query = f"SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.{MODEL_TABLE_ID}`"
-        df = bq_client.query(query).to_dataframe()
+        df = data_source.load_table(MODEL_TABLE_ID)
 
         # ทำความสะอาดชื่อคอลัมน์: ลบช่องว่าง, - และ _ แล้วแปลงเป็น lowercase
         df.columns = df.columns.str.strip().str.replace(' ', '').str.replace('-', '').str.replace('_', '').str.lower()
@@ -61,16 +65,28 @@ def load_and_preprocess_data():
         numeric_cols = ['range', 'topspeed', 'accelarate', 'efficiency', 'battery', 'estimatedthbvalue', 'fastcharge']
         for col in numeric_cols:
             df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', ''), errors='coerce')
-        df.dropna(subset=numeric_cols)
-        print("Model: ",df.head(5))
         # ลบแถวที่มีค่า NaN ในคอลัมน์ที่ระบุ
+        df = df.dropna(subset=numeric_cols).reset_index(drop=True)
+        logger.info("โหลดแคตตาล็อก %d โมเดล", len(df))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Model: %s", df.head(5))
         return df
     except Exception as e:
-        print(f"Error loading data: {str(e)}")
+        logger.error("Error loading data: %s", e)
         raise
- 
+
+def get_model_table_marker():
+    """คืน change marker ของตาราง Model (metadata ราคาถูก ใช้ตรวจว่าแคตตาล็อกเปลี่ยน)"""
+    return data_source.table_marker(MODEL_TABLE_ID)
+
+# แคตตาล็อกที่ทำความสะอาดแล้ว: โหลดครั้งแรกครั้งเดียว แล้วรีเฟรชเบื้องหลังตาม TTL / marker
+# SHARED_CATALOG_DIR: เผยแพร่ matrix และคอลัมน์แสดงผลเป็นไฟล์ memory-mapped ให้ทุก worker ใช้ร่วมกัน
+catalog_cache = CatalogCache(load_and_preprocess_data, marker=get_model_table_marker,
+                             shared=make_shared_catalog_store())
+
 def transform_user_features(profile):
     """แปลงข้อมูลผู้ใช้ให้เหมาะสมสำหรับโมเดล clustering"""
+    import pandas as pd
     # เติมค่าที่ขาดหาย
     required_fields = {
         'gender': 'unknown',
@@ -100,139 +116,256 @@ def transform_user_features(profile):
     
     return df[categorical_cols + ['seats']]
 
+def transform_user_features_batch(profiles):
+    """แปลงข้อมูลผู้ใช้หลายคนเป็น DataFrame เดียว (แถวละคน) สำหรับ predict ครั้งเดียว"""
+    import pandas as pd
+    categorical_cols = [
+        'gender', 'age_range', 'occupation',
+        'marital_status', 'family_status',
+        'income_range', 'vehicle_status', 'driveCon'
+    ]
+    rows = [{**{col: 'unknown' for col in categorical_cols}, 'seats': 5, **profile} for profile in profiles]
+    df = pd.DataFrame(rows, columns=categorical_cols + ['seats'])
+    df['seats'] = df['seats'].astype(int)
+    return df
+
+def map_user_weights(user_weights_raw):
+    """แปลงคีย์น้ำหนักให้ตรงกับชื่อคอลัมน์ (mapping 'top_speed' จากฟรอนต์เอนด์เป็น 'topspeed')"""
+    return {
+        'battery': user_weights_raw.get('battery'),
+        'range': user_weights_raw.get('range'),
+        'accelarate': user_weights_raw.get('accelarate'),
+        'topspeed': user_weights_raw.get('top_speed', user_weights_raw.get('topspeed')),
+        'efficiency': user_weights_raw.get('efficiency'),
+        'fastcharge': user_weights_raw.get('fastcharge'),
+        'estimatedthbvalue': user_weights_raw.get('estimated_thb_value')
+    }
+
 # =======================================================
 # ส่วน Hybrid Weights
 # =======================================================
-def create_hybrid_weights(user_weights, cluster_id):
-    """สร้างค่าน้ำหนักแบบผสมระหว่างค่าน้ำหนักผู้ใช้และค่าน้ำหนักเฉลี่ยของกลุ่ม"""
-    # กำหนดค่าเริ่มต้น
-    weights = {
-        'battery': 14.28, 
-        'range': 14.28,
-        'accelarate': 14.28, 
-        'topspeed': 14.28,
-        'efficiency': 14.28, 
-        'fastcharge': 14.28,
-        'estimatedthbvalue': 14.32
-    }
-    
+# ค่าน้ำหนักเริ่มต้นของ cluster (ใช้กับเกณฑ์ที่ไม่มีข้อมูล หรือเมื่อหา cluster ไม่ทันเวลา)
+DEFAULT_CLUSTER_WEIGHTS = {
+    'battery': 14.28,
+    'range': 14.28,
+    'accelarate': 14.28,
+    'topspeed': 14.28,
+    'efficiency': 14.28,
+    'fastcharge': 14.28,
+    'estimatedthbvalue': 14.32
+}
+
+def cluster_average_weights(cluster_id):
+    """ค่าน้ำหนักเฉลี่ยของ cluster (เกณฑ์ที่ไม่มีข้อมูลใช้ค่าเริ่มต้น)"""
+    weights = dict(DEFAULT_CLUSTER_WEIGHTS)
+
+    # ค่าเฉลี่ยของ cluster จาก store ในหน่วยความจำ (O(1) ไม่มี network call เมื่อโหลดแล้ว)
     try:
-        query = f"""
-        SELECT
-            AVG(battery_weight) as battery,
-            AVG(range_weight) as `range`,
-            AVG(accelarate_weight) as accelarate,
-            AVG(topspeed_weight) as topspeed,
-            AVG(efficiency_weight) as efficiency,
-            AVG(fastcharge_weight) as fastcharge,
-            AVG(price_weight) as estimatedthbvalue
-        FROM `{PROJECT_ID}.{DATASET_ID}.{USERPROFILES_TABLE}`
-        WHERE cluster_id = '{cluster_id}'
-        """
-        result = bq_client.query(query).to_dataframe()
-
-        if not result.empty and not result.iloc[0].isnull().all():
-            # อัพเดทค่าจาก Query เฉพาะคอลัมน์ที่มีข้อมูล
-            new_weights = result.iloc[0].fillna(0).to_dict()
-            for k, v in new_weights.items():
-                
-                if v != 0:
+        cluster_averages = cluster_weight_store.averages(cluster_id)
+        if cluster_averages is not None:
+            # อัพเดทค่าเฉพาะเกณฑ์ที่มีข้อมูล
+            for k, v in cluster_averages.items():
+                if not np.isnan(v) and v != 0:
                     weights[k] = v
 
     except Exception as e:
-        print(f"Error getting cluster weights: {str(e)}")
-    
+        logger.warning("Error getting cluster weights: %s", e)
+    return weights
+
+# สัดส่วนของค่าเฉลี่ยของ cluster ใน hybrid weights (ที่เหลือเป็นน้ำหนักผู้ใช้)
+# 0 = ผลเดิมของระบบ: สูตรผสมเดิมใช้น้ำหนักของผู้ใช้เองแทนค่าเฉลี่ยของ cluster อันดับจึงขึ้นกับน้ำหนักผู้ใช้เท่านั้น
+# การเปลี่ยนค่านี้เปลี่ยนผลแนะนำ ต้องได้รับอนุมัติแยกต่างหาก
+# เมื่อเป็น 0 ไม่มีการใช้ค่าเฉลี่ยของ cluster: ไม่ seed/reconcile ClusterWeightStore และไม่คำนวณค่าเฉลี่ยต่อ request
+HYBRID_CLUSTER_SHARE = float(os.environ.get('HYBRID_CLUSTER_SHARE', 0.0))
+if not 0 <= HYBRID_CLUSTER_SHARE <= 1:
+    raise ValueError("HYBRID_CLUSTER_SHARE ต้องอยู่ระหว่าง 0 ถึง 1")
+
+def create_hybrid_weights(user_weights, cluster_id, cluster_weights=None):
+    """สร้างค่าน้ำหนักแบบผสมระหว่างค่าน้ำหนักผู้ใช้และค่าน้ำหนักเฉลี่ยของกลุ่ม (ร้อยละ รวมเป็น 100)
+
+    cluster_weights ระบุเองได้ (เช่น DEFAULT_CLUSTER_WEIGHTS เมื่อหา cluster ไม่ทันเวลา)
+    """
+    if not HYBRID_CLUSTER_SHARE:
+        cluster_weights = {}
+    elif cluster_weights is None:
+        cluster_weights = cluster_average_weights(cluster_id)
+
     # คำนวณ hybrid weights
-    cluster_weights = user_weights
     hybrid = {
-        k: (user_weights.get(k, 0) * 0.8 + cluster_weights.get(k, 0) * 0.2)
+        k: (user_weights.get(k, 0) * (1 - HYBRID_CLUSTER_SHARE) + cluster_weights.get(k, 0) * HYBRID_CLUSTER_SHARE)
         for k in set(user_weights) | set(cluster_weights)
     }
     total = sum(hybrid.values())
+    if not total > 0:
+        raise ValueError("ผลรวมน้ำหนักต้องมากกว่า 0")
     hybrid = {k: (v / total) * 100 for k, v in hybrid.items()}
     return hybrid
 
+def predict_cluster_weights(user_df):
+    """ทำนาย cluster ของผู้ใช้แล้วคืน (cluster_id, ค่าน้ำหนักเฉลี่ยของ cluster)
+
+    ยังไม่มีโมเดล: คืน (None, DEFAULT_CLUSTER_WEIGHTS) เหมือนกรณีหา cluster ไม่ทันเวลา
+    HYBRID_CLUSTER_SHARE เป็น 0: ค่าเฉลี่ยไม่มีผลต่อ hybrid weights จึงคืน DEFAULT_CLUSTER_WEIGHTS โดยไม่คำนวณ
+    """
+    cluster_id = cluster_store.predict(user_df)
+    if cluster_id is None or not HYBRID_CLUSTER_SHARE:
+        return cluster_id, DEFAULT_CLUSTER_WEIGHTS
+    return cluster_id, cluster_average_weights(cluster_id)
+
+def load_cluster_weight_aggregates(since=None):
+    """ดึง count/sum ของคอลัมน์น้ำหนักต่อ cluster จาก UserProfiles (เฉพาะแถวที่ timestamp >= since ถ้าระบุ)"""
+    return data_source.cluster_weight_aggregates(USERPROFILES_TABLE, since)
+
+# ค่าเฉลี่ยน้ำหนักต่อ cluster: seed จาก BigQuery ครั้งเดียว บวกเพิ่มใน process และ reconcile ตามรอบ
+cluster_weight_store = ClusterWeightStore(load_cluster_weight_aggregates)
+
 # =======================================================
 # ส่วน AHP-TOPSIS
 # =======================================================
+# ใช้ชื่อคอลัมน์ที่ผ่านการทำความสะอาดแล้ว
+NUMERIC_COLS = ['range', 'topspeed', 'accelarate', 'efficiency', 'battery', 'estimatedthbvalue', 'fastcharge']
+
+def build_topsis_engine(snapshot):
+    if snapshot.view is not None and snapshot.view.criteria == NUMERIC_COLS:
+        # matrix ที่เผยแพร่ไว้แล้ว: ใช้ view ของไฟล์ร่วมโดยไม่คำนวณใหม่
+        return snapshot.view.topsis_engine()
+    return TopsisEngine.from_dataframe(snapshot.df, NUMERIC_COLS)
+
+def get_topsis_engine(snapshot):
+    """TOPSIS engine ของ catalog version นี้ (normalized matrix และ ideal/anti-ideal คำนวณครั้งเดียว)"""
+    return snapshot.derived('topsis', build_topsis_engine)
+
+def compute_criteria_weights(weights):
+    """ตรวจสอบค่าน้ำหนักแล้วคำนวณน้ำหนัก AHP (คืน None หาก inconsistency สูง)"""
+    valid_weights = {k: v for k, v in weights.items() if k in NUMERIC_COLS}
+    if len(valid_weights) != len(NUMERIC_COLS):
+        raise ValueError("ค่าน้ำหนักและคอลัมน์ไม่ตรงกัน")
+
+    # คำนวณ AHP: matrix เปรียบเทียบคู่ที่สร้างจากอัตราส่วนน้ำหนักชุดเดียว consistent เสมอ
+    # จึงได้น้ำหนักแบบ closed-form (memoize ตามน้ำหนักที่ quantize แล้ว) โดยไม่ต้องสร้าง ahpy.Compare
+    ahp_weights, consistency_ratio = compute_ahp_weights(valid_weights)
+    if consistency_ratio >= 0.1:
+        return None
+    return ahp_weights
+
+def get_catalog_index(snapshot):
+    """ดัชนี (seats, driveconfiguration) -> ตำแหน่งแถว ของ catalog version นี้"""
+    if snapshot.view is not None:
+        return snapshot.derived('index', lambda snap: CatalogIndex(snap.view.column('seats'),
+                                                                   snap.view.column('driveconfiguration')))
+    return snapshot.derived('index', lambda snap: CatalogIndex.from_dataframe(snap.df))
+
+def get_catalog_records(snapshot):
+    """ข้อมูลแต่ละโมเดลในรูป dict (catalog_records ครั้งเดียวต่อ catalog version)
+
+    แคตตาล็อกร่วม: ใช้ view ซึ่งสร้าง dict เฉพาะแถวที่ถูกเลือกจากคอลัมน์ใน memory-mapped file
+    """
+    if snapshot.view is not None:
+        return snapshot.view
+    return snapshot.derived('records', lambda snap: catalog_records(snap.df))
+
+def select_top_models(records, positions, scores, k=10):
+    """คืน k แถวที่คะแนนสูงสุดจากแถวที่ผ่านการกรอง (scores เรียงตาม positions) พร้อมคอลัมน์ score"""
+    order = top_k_positions(scores, k)
+    return [dict(records[position], score=float(score))
+            for position, score in zip(positions[order], scores[order])]
+
+# cache ผลจัดอันดับตามน้ำหนักที่ quantize แล้ว (None เมื่อ RESULT_CACHE_SIZE=0)
+result_cache = make_result_cache()
+# จำนวนทศนิยมของน้ำหนักที่ normalize แล้ว (3 = ขั้นละ 0.1%) ที่ถือว่าเป็นน้ำหนักชุดเดียวกัน
+RESULT_CACHE_DECIMALS = int(os.environ.get('RESULT_CACHE_DECIMALS', 3))
+
 def calculate_ahp_topsis(weights, drive_config, seats):
-    """คำนวณ AHP-TOPSIS เพื่อจัดอันดับโมเดล EV"""
+    """คำนวณ AHP-TOPSIS เพื่อจัดอันดับโมเดล EV (ผ่าน result cache ถ้าเปิดใช้)"""
+    if result_cache is None:
+        return compute_ahp_topsis(weights, drive_config, seats)
     try:
-        df = load_and_preprocess_data()
-        # ใช้ชื่อคอลัมน์ที่ผ่านการทำความสะอาดแล้ว
-        numeric_cols = ['range', 'topspeed', 'accelarate', 'efficiency', 'battery', 'estimatedthbvalue', 'fastcharge']
+        snapshot = catalog_cache.get()
+        key = make_result_key(weights, NUMERIC_COLS, drive_config, seats, snapshot.version,
+                              cluster_store.version, RESULT_CACHE_DECIMALS)
+    except Exception:
+        # น้ำหนักไม่ครบ/ไม่ถูกต้อง: ให้ขั้นคำนวณจัดการ error ตามเดิม
+        return compute_ahp_topsis(weights, drive_config, seats)
+    with span('result_cache'):
+        results = result_cache.get(key)
+    if results is not None:
+        return results
+    results = compute_ahp_topsis(weights, drive_config, seats)
+    if results:
+        # ไม่ cache ผลว่าง (อาจมาจาก error ชั่วคราว)
+        result_cache.put(key, results)
+    return results
 
-        # ตรวจสอบค่าน้ำหนัก
-        valid_weights = {k: v for k, v in weights.items() if k in numeric_cols}
-        if len(valid_weights) != len(numeric_cols):
-            raise ValueError("ค่าน้ำหนักและคอลัมน์ไม่ตรงกัน")
+def clear_result_cache(*args):
+    """listener ของ catalog / cluster model: ล้าง entry ของ version เก่าออกจากหน่วยความจำ"""
+    if result_cache is not None:
+        result_cache.clear()
 
-        # คำนวณ AHP: สร้าง dictionary เปรียบเทียบคู่
-        comparisons = {(k1, k2): valid_weights[k1] / valid_weights[k2]
-                       for i, k1 in enumerate(valid_weights) for k2 in list(valid_weights)[i+1:]}
-        ahp_model = Compare('Criteria Comparison', comparisons)
-        if ahp_model.consistency_ratio >= 0.1:
-            return []  # หาก inconsistency สูง ให้คืนค่าเป็น list ว่าง
-        ahp_weights = ahp_model.target_weights
+catalog_cache.add_listener(clear_result_cache)
 
-        # TOPSIS: ใช้ชื่อคอลัมน์ให้ตรงกับ df
-        objectives = [Objective.MAX if c not in ['accelarate', 'estimatedthbvalue', 'efficiency'] else Objective.MIN
-                      for c in numeric_cols]
+def compute_ahp_topsis(weights, drive_config, seats):
+    """คำนวณ AHP-TOPSIS เพื่อจัดอันดับโมเดล EV"""
+    try:
+        with span('catalog'):
+            snapshot = catalog_cache.get()
+        with span('ahp'):
+            ahp_weights = compute_criteria_weights(weights)
+        if ahp_weights is None:
+            return []  # หาก inconsistency สูง ให้คืนค่าเป็น list ว่าง
 
-        dm = mkdm(
-            matrix=df[numeric_cols].values,
-            objectives=objectives,
-            weights=list(ahp_weights.values()),
-            alternatives=df['model'].values
-        )
-        # คำนวณ similarity score ด้วย TOPSIS
-        df['score'] = TOPSIS().evaluate(dm).e_.similarity
-
-        # normalized_df = df[numeric_cols].apply(lambda x: x / np.sqrt((x**2).sum()), axis=0)
-
-        # # การคำนวณเหล่านี้ตรงข้ามกับคอลัมน์อื่นๆ
-        # for col in ['accelarate', 'estimatedthbvalue', 'efficiency']:
-        #     if col in normalized_df.columns:
-        #         normalized_df[col] = 1 / normalized_df[col].replace(0, np.nan)  # ป้องกันการหารด้วย 0
-
-        # # กำหนดน้ำหนักโดยใช้ AHP
-        # final_weights = ahp_weights
-
-        # # คำนวณ Weighted Normalized Matrix
-        # weighted_normalized_df = normalized_df * final_weights
-
-        # # หา Ideal Best และ Ideal Worst
-        # ideal_best = weighted_normalized_df.max()
-        # ideal_worst = weighted_normalized_df.min()
-
-        # # คำนวณระยะทางจาก Ideal Best และ Ideal Worst
-        # distance_best = np.sqrt(((weighted_normalized_df - ideal_best) ** 2).sum(axis=1))
-        # distance_worst = np.sqrt(((weighted_normalized_df - ideal_worst) ** 2).sum(axis=1))
-
-        # # คำนวณคะแนน TOPSIS
-        # topsis_score = distance_worst / (distance_best + distance_worst)
-        # df['score'] = topsis_score
-
-        # กรองข้อมูล: ใช้ชื่อคอลัมน์ที่ผ่านการทำความสะอาด (drive_configuration -> driveconfiguration)
-        filtered_df = df[
-            (df['seats'] == seats) &
-            (df['driveconfiguration'].str.lower() == drive_config.lower())
-        ]
-        if len(filtered_df) < 3:
-            filtered_df = df[
-              (df['seats'] == seats) |
-              (df['driveconfiguration'].str.lower() == drive_config.lower())
-          ]
-        print("AHP-TOPSIS Result: ",filtered_df.sort_values('score', ascending=False).head(5).to_dict('records'))
+        # กรองข้อมูลด้วยดัชนีที่สร้างไว้ต่อ catalog version แล้วคำนวณ TOPSIS เฉพาะแถวที่ผ่าน
+        # (ideal/anti-ideal มาจากทั้งแคตตาล็อก คะแนนจึงเท่ากับการคำนวณทั้งตารางแล้วกรอง)
+        with span('filter'):
+            positions = get_catalog_index(snapshot).candidates(drive_config, seats)
+        with span('topsis'):
+            scores = get_topsis_engine(snapshot).score(ahp_weights, positions)
+        with span('select'):
+            results = select_top_models(get_catalog_records(snapshot), positions, scores)
+        logger.debug("AHP-TOPSIS Result: %s", results[:5])
         # คืนค่า top 10 แถวตามคะแนน (score)
-        return filtered_df.sort_values('score', ascending=False).head(10).to_dict('records')
+        return results
     except Exception as e:
-        print(f"คำนวณ AHP-TOPSIS ไม่สำเร็จ: {str(e)}")
+        logger.exception("คำนวณ AHP-TOPSIS ไม่สำเร็จ: %s", e)
         return []
 
- # =======================================================
+def calculate_ahp_topsis_batch(weights_list, drive_configs, seats_list, k=10):
+    """คำนวณ AHP-TOPSIS ของน้ำหนัก N ชุดในครั้งเดียว (TOPSIS เป็น matrix N x จำนวนโมเดล)"""
+    results = [[] for _ in weights_list]
+    snapshot = catalog_cache.get()
+    engine = get_topsis_engine(snapshot)
+    index = get_catalog_index(snapshot)
+    records = get_catalog_records(snapshot)
+    # จัดกลุ่มโปรไฟล์ตามแถวที่ผ่านการกรอง แล้วคำนวณ TOPSIS ของแต่ละกลุ่มเป็น matrix เดียว
+    groups = {}
+    for i, weights in enumerate(weights_list):
+        if weights is None:
+            continue
+        try:
+            ahp_weights = compute_criteria_weights(weights)
+        except Exception as e:
+            logger.warning("คำนวณ AHP-TOPSIS ไม่สำเร็จ: %s", e)
+            continue
+        if ahp_weights is not None:
+            positions = index.candidates(drive_configs[i], seats_list[i])
+            group = groups.setdefault(positions.tobytes(), (positions, [], []))
+            group[1].append(i)
+            group[2].append(engine.weight_vector(ahp_weights))
+    for positions, members, weight_matrix in groups.values():
+        scores = engine.score_many(np.vstack(weight_matrix), positions)
+        for score_row, i in zip(scores, members):
+            results[i] = select_top_models(records, positions, score_row, k)
+    return results
+
+# =======================================================
 # ส่วนบันทึกข้อมูลผู้ใช้
 # =======================================================
+def insert_rows(table, rows, row_ids):
+    """insert หลายแถวลงตารางใน dataset (row_ids ใช้เป็น insertId กันแถวซ้ำตอน replay)"""
+    return data_source.insert_rows(table, rows, row_ids)
+
+# คิว write-behind: flush เป็น batch ตามขนาด/อายุ, spool ลงไฟล์เมื่อ BigQuery ใช้ไม่ได้ และ flush ตอนปิด process
+write_sink = WriteBehindSink(insert_rows)
+
 def save_user_data(profile, user_weights ,recommendations, driveCon, seats):
     if not isinstance(recommendations, list) or len(recommendations) == 0:
         recommended_models = ''
@@ -268,9 +401,8 @@ def save_user_data(profile, user_weights ,recommendations, driveCon, seats):
         'satisfaction_score': satisfaction_score
     }
 
-    errors = bq_client.insert_rows_json(f"{PROJECT_ID}.{DATASET_ID}.{USERPRODATA_TABLE}", [record],row_ids=[uuid.uuid4().hex],skip_invalid_rows=True)
-    if errors:
-        print(f"บันทึกข้อมูลไม่สำเร็จ: {errors}")
+    # เข้าคิว write-behind: ไม่รอ BigQuery ก่อนตอบกลับ
+    write_sink.submit(USERPRODATA_TABLE, record)
 
 def save_user_result(profile, user_weights, hybrid_weights, recommendations, cluster_id, driveCon, seats):
     """บันทึกข้อมูลผู้ใช้ลงในตาราง UserProfiles"""
@@ -291,7 +423,7 @@ def save_user_result(profile, user_weights, hybrid_weights, recommendations, clu
         'marital_status': profile.get('marital_status'),
         'family_status': profile.get('family_status'),
         'income_range': profile.get('income_range'),
-        'cluster_id': int(cluster_id),
+        'cluster_id': int(cluster_id) if cluster_id is not None else None,
         'driveCon': driveCon,
         'seats': seats,
         'timestamp': datetime.datetime.now().isoformat(),
@@ -317,21 +449,39 @@ def save_user_result(profile, user_weights, hybrid_weights, recommendations, clu
         'satisfaction_score': satisfaction_score
     }
 
-    errors = bq_client.insert_rows_json(f"{PROJECT_ID}.{DATASET_ID}.{USERPROFILES_TABLE}", [record],row_ids=[uuid.uuid4().hex],skip_invalid_rows=True)
-    if errors:
-        print(f"บันทึกข้อมูลไม่สำเร็จ: {errors}")
+    write_sink.submit(USERPROFILES_TABLE, record)
+    if cluster_id is not None and HYBRID_CLUSTER_SHARE:
+        cluster_weight_store.add(cluster_id, user_weights)
 
 # =======================================================
 # ส่วน Train Clustering Model
 # =======================================================
+# batch (ค่าเริ่มต้น): KMeans + silhouette เต็มตารางแบบเดิม
+# incremental: MiniBatchKMeans อ่านทีละ chunk เลือก k จาก sample และรอบถัดไป partial_fit เฉพาะแถวใหม่
+CLUSTER_MODE = os.environ.get('CLUSTER_MODE', 'batch').lower()
+CLUSTER_CHUNK_SIZE = int(os.environ.get('CLUSTER_CHUNK_SIZE', 50000))
+# โหมด incremental: เลือก k และ fit ใหม่ทั้งหมดตามรอบนี้ (รอบอื่นเป็นการอัปเดตด้วยแถวใหม่)
+CLUSTER_FULL_REBUILD_INTERVAL = float(os.environ.get('CLUSTER_FULL_REBUILD_INTERVAL', 7 * 24 * 3600))
+CLUSTER_FEATURES = ['gender', 'age_range', 'occupation', 'marital_status', 'family_status', 'income_range', 'vehicle_status', 'driveCon', 'seats']
+
 def build_user_clustering_model():
-    """สร้างโมเดล clustering ใหม่โดยใช้ข้อมูลจากตาราง User"""
+    """สร้างโมเดล clustering ใหม่โดยใช้ข้อมูลจากตาราง User (ตาม CLUSTER_MODE)"""
+    if CLUSTER_MODE == 'incremental':
+        return build_incremental_clustering_model(cluster_store.current)
+    return build_batch_clustering_model()
+
+def build_batch_clustering_model():
+    """สร้างโมเดล KMeans จากข้อมูลทั้งตาราง และเลือก k ด้วย silhouette ของทุกแถว"""
+    from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+    from sklearn.cluster import KMeans
+    from sklearn.pipeline import Pipeline
+    from sklearn.compose import ColumnTransformer
+    from sklearn.metrics import silhouette_score
+    # เวลาที่เริ่มอ่าน (เป็น since ของ ClusterWeightStore): แถวที่บันทึกระหว่าง train ต้องถูกนับเป็นส่วนเพิ่ม
+    started = datetime.datetime.now().isoformat()
     try:
-        query = f"""
-        SELECT gender, age_range, occupation, marital_status, family_status, income_range, vehicle_status, driveCon, seats
-        FROM `{PROJECT_ID}.{DATASET_ID}.{USERPROFILES_TABLE}`
-        """
-        df = bq_client.query(query).to_dataframe()
+        categorical_features = CLUSTER_FEATURES
+        df = data_source.load_table(USERPROFILES_TABLE, categorical_features + list(WEIGHT_COLUMNS.values()))
 
         # # หากข้อมูลน้อยเกินไป ให้ใช้ข้อมูลจำลอง
         # if len(df) < 5:
@@ -356,7 +506,7 @@ def build_user_clustering_model():
         #     })
         #     df = dummy_data
 
-        categorical_features = ['gender', 'age_range', 'occupation', 'marital_status', 'family_status', 'income_range', 'vehicle_status', 'driveCon', 'seats']
+        features = df[categorical_features]
         
         preprocessor = ColumnTransformer([
             ('cat', OrdinalEncoder(
@@ -377,21 +527,127 @@ def build_user_clustering_model():
             K_range = range(2, min(10, len(df) // 2) + 1)
             for k in K_range:
                 pipeline.set_params(cluster__n_clusters=k)
-                labels = pipeline.fit_predict(df)
-                score = silhouette_score(pipeline[:-1].transform(df), labels)
+                labels = pipeline.fit_predict(features)
+                score = silhouette_score(pipeline[:-1].transform(features), labels)
                 silhouette_scores.append(score)
             best_k = K_range[np.argmax(silhouette_scores)]
 
         pipeline.set_params(cluster__n_clusters=best_k)
-        pipeline.fit(df)
-        return pipeline
+        pipeline.fit(features)
+        # สรุปน้ำหนักต่อ cluster ตาม label ของโมเดลใหม่ เก็บไว้ใน artifact เป็น baseline ของ ClusterWeightStore
+        cluster_weights = aggregate_cluster_weights(pipeline.named_steps['cluster'].labels_, df)
+        return ClusterModel(pipeline, new_model_version(), started, len(df),
+                            extra={'cluster_weights': cluster_weights})
     except Exception as e:
-        print(f"สร้างโมเดลคลัสเตอร์ไม่สำเร็จ: {str(e)}")
+        logger.exception("สร้างโมเดลคลัสเตอร์ไม่สำเร็จ: %s", e)
         return None
 
+def _can_update_incrementally(model):
+    if model is None or model.extra.get('mode') != 'incremental' or not model.extra.get('data_until'):
+        return False
+    try:
+        full_fit_at = datetime.datetime.fromisoformat(model.extra['full_fit_at'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (datetime.datetime.now() - full_fit_at).total_seconds() < CLUSTER_FULL_REBUILD_INTERVAL
+
+def build_incremental_clustering_model(current=None):
+    """สร้างหรืออัปเดตโมเดล MiniBatchKMeans แบบอ่านทีละ chunk
+
+    ถ้าโมเดลปัจจุบันเป็นโหมด incremental และยังไม่ถึงรอบ fit ใหม่ทั้งหมด จะ partial_fit เฉพาะแถวที่บันทึกหลัง
+    data_until ของโมเดลเดิม (cluster id เดิมยังใช้ได้ baseline น้ำหนักต่อ cluster จึงต่อยอดจากของเดิม)
+    """
+    from incremental_clustering import fit_streaming, update_streaming
+
+    columns = CLUSTER_FEATURES + list(WEIGHT_COLUMNS.values())
+    # เวลาที่เริ่มอ่าน: แถวที่บันทึกหลังจากนี้จะถูกนับในรอบถัดไป / ใน ClusterWeightStore
+    started = datetime.datetime.now().isoformat()
+    try:
+        if _can_update_incrementally(current):
+            pipeline = copy.deepcopy(current.pipeline)
+            chunks = data_source.iter_table(USERPROFILES_TABLE, columns, CLUSTER_CHUNK_SIZE, since=current.extra['data_until'])
+            n_new, cluster_weights = update_streaming(pipeline, chunks, current.extra.get('cluster_weights'), aggregate_weights=True)
+            logger.info("อัปเดตโมเดลคลัสเตอร์ %s ด้วยข้อมูลใหม่ %d แถว", current.version, n_new)
+            extra = dict(current.extra, cluster_weights=cluster_weights, data_until=started)
+            return ClusterModel(pipeline, new_model_version(), started, current.n_samples + n_new, extra=extra)
+
+        result = fit_streaming(lambda: data_source.iter_table(USERPROFILES_TABLE, columns, CLUSTER_CHUNK_SIZE),
+                               CLUSTER_FEATURES, aggregate_weights=True)
+        if result is None:
+            logger.warning("ข้อมูลผู้ใช้ไม่พอสำหรับสร้างโมเดลคลัสเตอร์")
+            return None
+        pipeline, n_rows, cluster_weights, scores = result
+        logger.info("สร้างโมเดลคลัสเตอร์ incremental k=%d จาก %d แถว (silhouette: %s)",
+                    pipeline.kmeans.n_clusters, n_rows, scores)
+        extra = {'cluster_weights': cluster_weights, 'mode': 'incremental', 'data_until': started,
+                 'full_fit_at': started, 'silhouette_scores': scores}
+        return ClusterModel(pipeline, new_model_version(), started, n_rows, extra=extra)
+    except Exception as e:
+        logger.exception("สร้างโมเดลคลัสเตอร์ไม่สำเร็จ: %s", e)
+        return None
+
+# โมเดล clustering: โหลดจาก artifact ครั้งเดียว และ train ใหม่เบื้องหลังตามรอบ (CLUSTER_RETRAIN_INTERVAL)
+cluster_store = ClusterModelStore(build_user_clustering_model)
+# cluster id เปลี่ยนความหมายเมื่อ train ใหม่ จึงต้องเริ่มนับค่าเฉลี่ยน้ำหนักใหม่
+cluster_store.add_listener(lambda old_version, model: cluster_weight_store.reset(model))
+cluster_store.add_listener(clear_result_cache)
+
 # =======================================================
 # ส่วน API Endpoints
 # =======================================================
+# เวลารอสูงสุด (วินาที นับจากต้น request) ของงานที่ทำพร้อมกันใน /handleSubmit
+SUBMIT_CLUSTER_TIMEOUT = float(os.environ.get('SUBMIT_CLUSTER_TIMEOUT', 2.0))
+SUBMIT_CATALOG_TIMEOUT = float(os.environ.get('SUBMIT_CATALOG_TIMEOUT', 10.0))
+call_pool = CallPool(on_fallback=lambda call, reason: CALL_FALLBACKS.inc(call, reason))
+
+@app.before_request
+def start_background_workers():
+    """เริ่ม thread เบื้องหลังของ process นี้ (เรียกซ้ำได้ ทำงานจริงครั้งเดียวต่อ process)"""
+    catalog_cache.start()
+    station_cache.start()
+    cluster_store.start()
+    if HYBRID_CLUSTER_SHARE:
+        cluster_weight_store.start()
+    write_sink.start()
+
+def warmup():
+    """โหลดแคตตาล็อก โมเดล clustering และค่าที่คำนวณล่วงหน้าทั้งหมดใน process นี้
+
+    ใช้กับ gunicorn preload_app: เรียกใน master ก่อน fork เพื่อให้ทุก worker ใช้หน่วยความจำชุดเดียวกันแบบ copy-on-write
+    """
+    snapshot = catalog_cache.get()
+    get_topsis_engine(snapshot)
+    get_catalog_index(snapshot)
+    get_catalog_records(snapshot)
+    model = cluster_store.prepare()
+    if model is not None:
+        # predict ครั้งแรกจะ import ส่วนที่เหลือของ scikit-learn และเตรียม pipeline
+        model.predict(transform_user_features({}))
+    if HYBRID_CLUSTER_SHARE:
+        cluster_weight_store.seed()
+    try:
+        get_station_index(station_cache.get())
+    except Exception as e:
+        # แผนที่ไม่ควรทำให้ warmup ของการแนะนำรถล้ม: worker จะโหลดเองตอน request แรกของ /chargingStations
+        logger.warning("โหลดข้อมูลสถานีชาร์จใน warmup ไม่สำเร็จ: %s", e)
+    return snapshot
+
+def after_fork():
+    """เรียกใน worker หลัง fork: ทิ้ง connection ของ process แม่ แล้วเริ่ม thread เบื้องหลังของ worker"""
+    data_source.after_fork()
+    start_background_workers()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = g.get('request_start')
+    if start is not None and request.endpoint is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint, str(response.status_code))
+    return response
+
 @app.route("/handleSubmit", methods=["POST"])
 def handle_submit():          
         data = request.get_json()
@@ -400,43 +656,38 @@ def handle_submit():
         user_profile = data.get('userProfile', {})
         user_profile['driveCon'] = data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ')
         user_profile['seats'] = data.get('numSeats', 5)
-        print("user_profile: ",user_profile)
+        logger.debug("user_profile: %s", user_profile)
         
+        # งานที่อาจ block (โหลดแคตตาล็อก, โหลด/ทำนายโมเดล clustering) ทำพร้อมกันใน call_pool
+        # แต่ละงานมี deadline ของตัวเอง latency จึงถูกจำกัดด้วยงานที่ช้าที่สุด ไม่ใช่ผลรวมของทุกงาน
+        # (เมื่อข้อมูลพร้อมอยู่แล้วงานเหล่านี้ไม่ block จึงเรียกใน thread ของ request เลย)
+        # การโหลดแคตตาล็อกตอน cold ใช้ Future เดียวร่วมกันทุก request จนกว่าจะเสร็จ
+        started = time.monotonic()
+        catalog_future = call_pool.submit_once('catalog', catalog_cache.get, inline=catalog_cache.version is not None)
+
         # เตรียมข้อมูลผู้ใช้
-        user_df = transform_user_features(user_profile)
-        print("user_df: ",user_df)
-        # สร้างโมเดล clustering
-        clustering_model = build_user_clustering_model()
-        
-        # ดึง Component จาก Pipeline
-        preprocessor = clustering_model.named_steps['preprocessor']  # ได้ Object ColumnTransformer
-        scaler = clustering_model.named_steps['scaler']  # ได้ Object StandardScaler
-        cluster_model = clustering_model.named_steps['cluster']  # ได้ Object KMeans
-        
-        # แปลงข้อมูล
-        user_processed = preprocessor.transform(user_df)  # ใช้ ColumnTransformer.transform()
-        print("user_processed: ",user_processed)
-        user_scaled = scaler.transform(user_processed)  # ใช้ StandardScaler.transform()
-        print("user_scaled: ",user_scaled)
-        # ทำนาย Cluster
-        user_cluster = int(cluster_model.predict(user_scaled)[0])
-        print("user_cluster: ",user_cluster)
+        with span('transform'):
+            user_df = transform_user_features(user_profile)
+        # ทำนาย Cluster ด้วยโมเดลที่ train ไว้แล้ว (ไม่ train ใหม่ทุก request)
+        # ถ้าไม่ทันเวลาใช้ค่าน้ำหนักเริ่มต้นของ cluster แทน (cluster_id เป็น None)
+        with span('cluster'):
+            user_cluster, cluster_weights = call_pool.result(
+                'cluster', call_pool.submit(predict_cluster_weights, user_df,
+                                            inline=cluster_store.current is not None),
+                started + SUBMIT_CLUSTER_TIMEOUT, (None, DEFAULT_CLUSTER_WEIGHTS))
+        logger.debug("user_cluster: %s", user_cluster)
 
         # แปลงคีย์น้ำหนักให้ตรงกับชื่อคอลัมน์ (mapping 'top_speed' จากฟรอนต์เอนด์เป็น 'topspeed')
-        user_weights_raw = data.get('summedWeight', {})
-        user_weights = {
-            'battery': user_weights_raw.get('battery'),
-            'range': user_weights_raw.get('range'),
-            'accelarate': user_weights_raw.get('accelarate'),
-            'topspeed': user_weights_raw.get('top_speed', user_weights_raw.get('topspeed')),
-            'efficiency': user_weights_raw.get('efficiency'),
-            'fastcharge': user_weights_raw.get('fastcharge'),
-            'estimatedthbvalue': user_weights_raw.get('estimated_thb_value')
-        }
-        hybrid_weights = create_hybrid_weights(user_weights, user_cluster)
-        print("user_weights: ",user_weights)
-        print("hybrid_weights: ",hybrid_weights)
+        with span('hybrid_weights'):
+            user_weights = map_user_weights(data.get('summedWeight', {}))
+            hybrid_weights = create_hybrid_weights(user_weights, user_cluster, cluster_weights)
+        logger.debug("user_weights: %s hybrid_weights: %s", user_weights, hybrid_weights)
 
+        # แคตตาล็อกไม่มีค่า fallback: ถ้ายังโหลดไม่เสร็จตอบ 503 ให้ลองใหม่ (การโหลดยังทำต่อเบื้องหลัง)
+        with span('catalog_wait'):
+            snapshot = call_pool.result('catalog', catalog_future, started + SUBMIT_CATALOG_TIMEOUT, None)
+        if snapshot is None:
+            return jsonify({"error": "กำลังโหลดข้อมูลรถ กรุณาลองใหม่อีกครั้ง"}), 503
 
         # คำนวณผลลัพธ์ AHP-TOPSIS โดยใช้ driveCon และ numSeats
         results = calculate_ahp_topsis(
@@ -444,15 +695,339 @@ def handle_submit():
             data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'),
             data.get('numSeats', 5)
         )
-        save_user_data(user_profile, user_weights,  results, data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'), data.get('numSeats', 5))
-        save_user_result(user_profile, user_weights, hybrid_weights, results, user_cluster,data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'), data.get('numSeats', 5))
+        with span('persist'):
+            save_user_data(user_profile, user_weights,  results, data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'), data.get('numSeats', 5))
+            save_user_result(user_profile, user_weights, hybrid_weights, results, user_cluster,data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'), data.get('numSeats', 5))
 
         if not isinstance(results, list) or len(results) == 0:
+            NO_RESULT_TOTAL.inc()
             return jsonify({"error": "ไม่พบรถที่เหมาะกับเงื่อนไข"}), 404
 
         # ส่งคืนเฉพาะ 3 อันดับแรก หากมีมากกว่า 3
-        return jsonify(results[:3] if len(results) >= 3 else results), 200
-        
+        response = jsonify(results[:3] if len(results) >= 3 else results)
+        # session สำหรับ /whatIf: ปรับน้ำหนักแล้วจัดอันดับใหม่โดยไม่ต้องหา cluster หรือบันทึกข้อมูลซ้ำ
+        response.headers['X-Session-Id'] = encode_session(
+            user_cluster, cluster_weights, data.get('driveCon', 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'),
+            data.get('numSeats', 5), snapshot.version)
+        return response, 200
+
+def predict_clusters(profiles):
+    """ทำนาย cluster ของหลายโปรไฟล์ด้วย predict ครั้งเดียว (None หากยังไม่มีโมเดล)"""
+    model = cluster_store.get()
+    if model is None:
+        return None
+    return [int(c) for c in model.predict(transform_user_features_batch(profiles))]
+
+def recommend_batch(submissions, save=True):
+    """แนะนำรถให้ผู้ใช้หลายคนในครั้งเดียว (Python API ของ /handleSubmitBatch)
+
+    submissions เป็น list ของ dict รูปแบบเดียวกับ body ของ /handleSubmit
+    (userProfile, summedWeight, driveCon, numSeats) คืน list ของ top-3 ตามลำดับเดิม
+    โปรไฟล์ที่ข้อมูลไม่ถูกต้อง (เช่น numSeats ไม่ใช่ตัวเลข) ได้ {'error': ...} แทนและไม่ถูกบันทึก
+    """
+    default_drive = 'ระบบขับเคลื่อนสี่ล้อแบบอัตโนมัติ'
+    profiles, drive_configs, seats_list, errors = [], [], [], []
+    for data in submissions:
+        user_profile = dict(data.get('userProfile', {}))
+        user_profile['driveCon'] = data.get('driveCon', default_drive)
+        # ตรวจ/แปลง seats ทีละโปรไฟล์ ค่าที่ผิดของโปรไฟล์หนึ่งต้องไม่ทำให้ทั้ง batch ล้มเหลว
+        try:
+            user_profile['seats'] = int(data.get('numSeats', 5))
+            errors.append(None)
+        except (TypeError, ValueError):
+            user_profile['seats'] = 5
+            errors.append("numSeats ต้องเป็นจำนวนเต็ม")
+        profiles.append(user_profile)
+        drive_configs.append(user_profile['driveCon'])
+        seats_list.append(user_profile['seats'])
+    valid = [i for i, error in enumerate(errors) if error is None]
+
+    # predict cluster ของทุกคนด้วย predict ครั้งเดียว ภายใต้ deadline เดียวกับ /handleSubmit
+    # ไม่มีโมเดลหรือไม่ทันเวลา: cluster_id เป็น None และใช้ค่าน้ำหนักเริ่มต้นของ cluster (ไม่นับเข้า cluster ใด)
+    with span('batch_cluster'):
+        started = time.monotonic()
+        clusters = [None] * len(profiles)
+        if valid:
+            predicted = call_pool.result(
+                'batch_cluster', call_pool.submit(predict_clusters, [profiles[i] for i in valid],
+                                                  inline=cluster_store.current is not None),
+                started + SUBMIT_CLUSTER_TIMEOUT, None)
+            for i, c in zip(valid, predicted or []):
+                clusters[i] = c
+
+    with span('batch_hybrid_weights'):
+        user_weights_list = [map_user_weights(data.get('summedWeight', {})) for data in submissions]
+        hybrid_list = []
+        for user_weights, cluster_id, error in zip(user_weights_list, clusters, errors):
+            if error is not None:
+                hybrid_list.append(None)
+                continue
+            try:
+                hybrid_list.append(create_hybrid_weights(
+                    user_weights, cluster_id, DEFAULT_CLUSTER_WEIGHTS if cluster_id is None else None))
+            except Exception as e:
+                # น้ำหนักไม่ครบ/ไม่ถูกต้อง: โปรไฟล์นี้ไม่มีผลลัพธ์ แต่ไม่กระทบโปรไฟล์อื่น
+                logger.warning("สร้าง hybrid weights ไม่สำเร็จ: %s", e)
+                hybrid_list.append(None)
+    with span('batch_rank'):
+        results = calculate_ahp_topsis_batch(hybrid_list, drive_configs, seats_list)
+
+    if save:
+        with span('batch_persist'):
+            for i in valid:
+                profile = profiles[i]
+                save_user_data(profile, user_weights_list[i], results[i], drive_configs[i], seats_list[i])
+                save_user_result(profile, user_weights_list[i], hybrid_list[i] or {}, results[i], clusters[i], drive_configs[i], seats_list[i])
+    return [{'error': error} if error is not None else r[:3] for r, error in zip(results, errors)]
+
+@app.route("/handleSubmitBatch", methods=["POST"])
+def handle_submit_batch():
+    """แนะนำรถให้หลายโปรไฟล์ในคำขอเดียว: body = {"profiles": [<body ของ /handleSubmit>, ...]}"""
+    data = request.get_json()
+    submissions = data.get('profiles', [])
+    max_profiles = int(os.environ.get('BATCH_MAX_PROFILES', 1000))
+    if not isinstance(submissions, list) or len(submissions) == 0:
+        return jsonify({"error": "ต้องระบุ profiles อย่างน้อย 1 รายการ"}), 400
+    if len(submissions) > max_profiles:
+        return jsonify({"error": f"ส่งได้ไม่เกิน {max_profiles} profiles ต่อคำขอ"}), 400
+
+    results = recommend_batch(submissions)
+    return jsonify([r if r else {"error": "ไม่พบรถที่เหมาะกับเงื่อนไข"} for r in results]), 200
+
+# =======================================================
+# ส่วน What-if (ปรับน้ำหนักแล้วจัดอันดับใหม่)
+# =======================================================
+# จำนวนจุดต่อเกณฑ์ของ grid ที่ใช้หาช่วงน้ำหนักที่ top 3 ไม่เปลี่ยน
+WHATIF_GRID_POINTS = int(os.environ.get('WHATIF_GRID_POINTS', 41))
+WHATIF_MAX_RESULTS = 10
+# ชื่อเกณฑ์ใน summedWeight ของฟรอนต์เอนด์ (ตรงข้ามกับ map_user_weights)
+FRONTEND_WEIGHT_KEYS = {'topspeed': 'top_speed', 'estimatedthbvalue': 'estimated_thb_value'}
+
+def encode_session(cluster_id, cluster_weights, drive_config, seats, catalog_version):
+    """สร้าง session id ของ /whatIf: ข้อมูลที่ต้องใช้จัดอันดับใหม่ทั้งหมด (ไม่เก็บสถานะใน server)
+
+    worker หรือ instance ใดก็รับ request ต่อได้ ข้อมูลไม่ใช่ความลับและไม่มีข้อมูลส่วนตัวของผู้ใช้
+    (แก้ไข session เองมีผลเฉพาะผลจัดอันดับที่ผู้ส่งได้รับ เพราะ /whatIf ไม่บันทึกอะไร)
+    """
+    payload = {'c': cluster_id, 'w': [round(float(cluster_weights[c]), 4) for c in NUMERIC_COLS],
+               'd': drive_config, 's': seats, 'v': catalog_version}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_session(session_id):
+    """คืน dict ของ session หรือ None หาก session id ไม่ถูกต้อง
+
+    session มาจากผู้ใช้ จึงตรวจรูปแบบทั้งหมดก่อนใช้: น้ำหนักของ cluster ครบทุกเกณฑ์ เป็นตัวเลขจำกัดที่ไม่ติดลบ
+    และผลรวมมากกว่า 0, ที่นั่งเป็นจำนวนเต็ม และระบบขับเคลื่อนเป็นข้อความ
+    """
+    try:
+        raw = base64.urlsafe_b64decode(session_id + '=' * (-len(session_id) % 4))
+        payload = json.loads(raw)
+        weights = [float(w) for w in payload['w']]
+        cluster_id = payload['c']
+        session = {
+            'cluster_id': None if cluster_id is None else int(cluster_id),
+            'cluster_weights': dict(zip(NUMERIC_COLS, weights)),
+            'drive_config': payload['d'],
+            'seats': int(payload['s']),
+            'catalog_version': payload['v'],
+        }
+    except Exception:
+        return None
+    if (len(weights) != len(NUMERIC_COLS) or not all(np.isfinite(w) and w >= 0 for w in weights)
+            or not sum(weights) > 0 or not isinstance(session['drive_config'], str)):
+        return None
+    return session
+
+def hybrid_weight_matrix(user_matrix, cluster_weights):
+    """create_hybrid_weights แบบ vectorized: แต่ละแถวของ user_matrix (ตามลำดับ NUMERIC_COLS) -> น้ำหนักที่รวมเป็น 1"""
+    cluster = np.array([cluster_weights[c] for c in NUMERIC_COLS], dtype=float)
+    hybrid = user_matrix * (1 - HYBRID_CLUSTER_SHARE) + cluster * HYBRID_CLUSTER_SHARE
+    # แถวที่น้ำหนักเป็น 0 ทั้งหมด (จุดใน grid ของ rank_stability) ได้ NaN: อันดับไม่นิยาม ถือว่าเปลี่ยน
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return hybrid / hybrid.sum(axis=1, keepdims=True)
+
+@app.route("/whatIf", methods=["POST"])
+def what_if():
+    """จัดอันดับใหม่ตามน้ำหนักที่ผู้ใช้ปรับ (อ่านอย่างเดียว ไม่บันทึกข้อมูล) พร้อมช่วงน้ำหนักที่ top 3 ไม่เปลี่ยน
+
+    body: {"sessionId": <header X-Session-Id จาก /handleSubmit>, "summedWeight": {...}, "k": 3, "stability": true}
+    ใช้ cluster และค่าเฉลี่ยของ cluster จาก session กับแคตตาล็อกและ TOPSIS matrix ที่คำนวณไว้แล้วของ version ปัจจุบัน
+    """
+    data = request.get_json(silent=True) or {}
+    session = decode_session(str(data.get('sessionId') or request.headers.get('X-Session-Id') or ''))
+    if session is None:
+        return jsonify({"error": "sessionId ไม่ถูกต้อง"}), 400
+    user_weights = map_user_weights(data.get('summedWeight', {}))
+    try:
+        base = np.array([float(user_weights[c]) for c in NUMERIC_COLS])
+        k = min(int(data.get('k', 3)), WHATIF_MAX_RESULTS)
+    except (TypeError, ValueError):
+        return jsonify({"error": "ต้องระบุน้ำหนักเป็นตัวเลขครบทุกเกณฑ์"}), 400
+    if not np.isfinite(base).all() or (base < 0).any() or k < 1:
+        return jsonify({"error": "ต้องระบุน้ำหนักเป็นตัวเลขครบทุกเกณฑ์"}), 400
+    if not (base > 0).all():
+        # AHP สร้างจากอัตราส่วนน้ำหนัก จึงต้องเป็นบวกทุกเกณฑ์ (ผลรวมเป็น 0 ทำให้ normalize ไม่ได้)
+        return jsonify({"error": "น้ำหนักทุกเกณฑ์ต้องมากกว่า 0"}), 400
+
+    with span('whatif_rank'):
+        snapshot = catalog_cache.get()
+        # ใช้น้ำหนักที่ตรวจและแปลงเป็นตัวเลขแล้ว (ค่าจาก JSON อาจเป็นข้อความ เช่น "20")
+        hybrid_weights = create_hybrid_weights(dict(zip(NUMERIC_COLS, base.tolist())), session['cluster_id'],
+                                               session['cluster_weights'])
+        ahp_weights = compute_criteria_weights(hybrid_weights)
+        positions = get_catalog_index(snapshot).candidates(session['drive_config'], session['seats'])
+        engine = get_topsis_engine(snapshot)
+        results = []
+        if ahp_weights is not None and len(positions):
+            scores = engine.score(ahp_weights, positions)
+            results = select_top_models(get_catalog_records(snapshot), positions, scores, k)
+    # แคตตาล็อกเปลี่ยน version หลัง /handleSubmit: ผลอาจต่างจากเดิมแม้น้ำหนักเท่าเดิม (ฟรอนต์เอนด์แจ้งผู้ใช้ได้)
+    body = {'results': results, 'catalogVersion': snapshot.version,
+            'catalogChanged': snapshot.version != session['catalog_version']}
+
+    if data.get('stability', True) and results:
+        with span('whatif_stability'):
+            lower, upper = rank_stability(engine, base, lambda m: hybrid_weight_matrix(m, session['cluster_weights']),
+                                          positions, top=3, points=WHATIF_GRID_POINTS)
+        body['stability'] = {FRONTEND_WEIGHT_KEYS.get(c, c): {'min': float(lo), 'max': float(hi)}
+                             for c, lo, hi in zip(NUMERIC_COLS, lower, upper)}
+        # ขอบบนของช่วงที่ตรวจ (max เท่าค่านี้ = top 3 ไม่เปลี่ยนตลอดช่วงที่ตรวจ)
+        body['stabilityLimit'] = float(base.sum())
+    return jsonify(body), 200
+
+# =======================================================
+# ส่วนสถานีชาร์จ (หน้าแผนที่)
+# =======================================================
+STATION_PAGE_SIZE = int(os.environ.get('STATION_PAGE_SIZE', 100))
+# เท่ากับ LIMIT ของ app/api/charging-stations/route.js
+STATION_MAX_PAGE_SIZE = 1000
+
+def load_charging_stations():
+    """โหลดตาราง ChargingStation ทั้งตาราง (ครั้งเดียวต่อ version ไม่ใช่ทุกครั้งที่กดแผนที่)"""
+    df = data_source.load_table(STATION_TABLE_ID)
+    logger.info("โหลดสถานีชาร์จ %d แห่ง", len(df))
+    return df
+
+# ตารางสถานีชาร์จในหน่วยความจำ รีเฟรชเบื้องหลังตาม TTL / marker แบบเดียวกับแคตตาล็อกรถ
+station_cache = CatalogCache(load_charging_stations, marker=lambda: data_source.table_marker(STATION_TABLE_ID))
+
+def get_station_index(snapshot):
+    """grid พิกัดและ inverted index ของสถานีชาร์จ version นี้"""
+    return snapshot.derived('stations', lambda snap: StationIndex.from_dataframe(snap.df))
+
+def _optional_float(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    value = float(value)
+    if not np.isfinite(value):
+        raise ValueError(name)
+    return value
+
+@app.route("/chargingStations", methods=["GET"])
+def charging_stations():
+    """ค้นสถานีชาร์จจากข้อมูลในหน่วยความจำ
+
+    query: province, district, subdistrict, distributor, connectionType, power (ระบุซ้ำหรือคั่นด้วย , ได้)
+    และ lat/lng (เรียงตามระยะ ใกล้ไปไกล) กับ radiusKm (เฉพาะสถานีในรัศมี) แบ่งหน้าด้วย offset/limit
+    ผลแต่ละแถวมีคอลัมน์เดียวกับ /api/charging-stations (และ distanceKm เมื่อระบุ lat/lng)
+    """
+    try:
+        lat, lng, radius = _optional_float('lat'), _optional_float('lng'), _optional_float('radiusKm')
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', STATION_PAGE_SIZE)), STATION_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "พารามิเตอร์ต้องเป็นตัวเลข"}), 400
+    if (lat is None) != (lng is None) or (radius is not None and lat is None):
+        return jsonify({"error": "ต้องระบุ lat และ lng คู่กัน (และก่อนใช้ radiusKm)"}), 400
+    if offset < 0 or limit < 1 or (radius is not None and radius < 0):
+        return jsonify({"error": "offset, limit หรือ radiusKm ไม่ถูกต้อง"}), 400
+
+    try:
+        snapshot = station_cache.get()
+        index = get_station_index(snapshot)
+    except Exception as e:
+        logger.error("โหลดข้อมูลสถานีชาร์จไม่สำเร็จ: %s", e)
+        return jsonify({"error": "ไม่สามารถดึงข้อมูลสถานีชาร์จได้"}), 503
+
+    with span('station_query'):
+        powers = [p for value in request.args.getlist('power') for p in value.split(',') if p.strip()]
+        positions = index.filter(province=request.args.get('province'), district=request.args.get('district'),
+                                 subdistrict=request.args.get('subdistrict'),
+                                 distributor=request.args.get('distributor'),
+                                 connection_type=request.args.get('connectionType'), powers=powers)
+        distances = None
+        if lat is None:
+            total = index.size if positions is None else len(positions)
+            page = positions[offset:offset + limit] if positions is not None else range(offset, min(offset + limit, total))
+        elif radius is not None:
+            page, distances = index.within(lat, lng, radius, positions)
+            total = len(page)
+            page, distances = page[offset:offset + limit], distances[offset:offset + limit]
+        else:
+            # ทุกสถานีที่ผ่านเงื่อนไขและมีพิกัดเรียงตามระยะได้ จึงค้นเพียง offset + limit อันดับแรก
+            total = len(index.located) if positions is None else int(index.located_mask[positions].sum())
+            page, distances = index.nearest(lat, lng, offset + limit, positions)
+            page, distances = page[offset:], distances[offset:]
+        if distances is None:
+            stations = [index.records[p] for p in page]
+        else:
+            stations = [dict(index.records[p], distanceKm=round(float(d), 3)) for p, d in zip(page, distances)]
+    next_offset = offset + len(stations) if offset + len(stations) < total else None
+    return jsonify({'stations': stations, 'total': total, 'offset': offset, 'limit': limit,
+                    'nextOffset': next_offset, 'version': snapshot.version}), 200
+
+# =======================================================
+# ส่วน Metrics และ Profiler
+# =======================================================
+def cache_lookups():
+    lookups = {('catalog', 'hit'): catalog_cache.hits, ('catalog', 'miss'): catalog_cache.misses,
+               ('stations', 'hit'): station_cache.hits, ('stations', 'miss'): station_cache.misses,
+               ('ahp', 'hit'): ahp_cache_info().hits, ('ahp', 'miss'): ahp_cache_info().misses}
+    if result_cache is not None:
+        lookups.update({('result', 'hit'): result_cache.hits, ('result', 'shared_hit'): result_cache.shared_hits,
+                        ('result', 'miss'): result_cache.misses})
+    return lookups
+
+CACHE_LOOKUPS = CallbackCounter('ev_cache_lookups_total', 'จำนวนครั้งที่อ่าน cache แยกตามผล hit/miss', cache_lookups,
+                                ['cache', 'result'])
+RESULT_CACHE_EVENTS = CallbackCounter('ev_result_cache_events_total',
+                                      'จำนวน entry ของ result cache ที่ถูก evict / หมดอายุ / backend ร่วมผิดพลาด',
+                                      lambda: None if result_cache is None else {
+                                          ('eviction',): result_cache.evictions,
+                                          ('expiration',): result_cache.expirations,
+                                          ('shared_error',): result_cache.shared_errors},
+                                      ['event'])
+RESULT_CACHE_SIZE = Gauge('ev_result_cache_entries', 'จำนวน entry ใน result cache ของ worker นี้',
+                          lambda: None if result_cache is None else len(result_cache))
+QUEUE_DEPTH = Gauge('ev_write_behind_queue_depth', 'จำนวนแถวที่รอ flush ในคิว write-behind', lambda: write_sink.depth)
+MODEL_INFO = Gauge('ev_model_info', 'version ของแคตตาล็อก โมเดล clustering และตารางสถานีชาร์จที่ใช้อยู่',
+                   lambda: {('catalog', str(catalog_cache.version)): 1, ('cluster', str(cluster_store.version)): 1,
+                            ('stations', str(station_cache.version)): 1},
+                   ['kind', 'version'])
+NO_RESULT_TOTAL = Counter('ev_no_result_total', 'จำนวน request ที่ไม่มีรถผ่านเงื่อนไข')
+CALL_FALLBACKS = Counter('ev_call_fallbacks_total', 'จำนวนงานใน request ที่เกินเวลาหรือผิดพลาดแล้วใช้ค่า fallback',
+                         ['call', 'reason'])
+
+# sampling profiler ต่อ worker: เปิดด้วย PROFILER_ENABLED=1 แล้วสลับด้วย POST /debug/profiler
+# หรือ kill -USR2 <pid ของ worker> (ผลอยู่ใน PROFILER_OUTPUT_DIR)
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') in ('1', 'true', 'True')
+profiler = SamplingProfiler()
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """metric ของ worker นี้ในรูปแบบ Prometheus text"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route("/debug/profiler", methods=["POST"])
+def toggle_profiler():
+    """สลับเปิด/ปิด sampling profiler ของ worker ที่รับ request นี้"""
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "profiler ไม่ได้เปิดใช้งาน (PROFILER_ENABLED=1)"}), 404
+    path = profiler.toggle()
+    return jsonify({"pid": os.getpid(), "running": profiler.running, "output": path}), 200
+
 # =======================================================
 # ส่วนเริ่มต้นเซิร์ฟเวอร์
 # =======================================================
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""thread pool สำหรับเรียกงานที่อาจ block หลายงานพร้อมกันภายใน request เดียว โดยมี deadline ต่องาน
+
+งานที่ไม่ขึ้นต่อกัน (เช่นโหลดแคตตาล็อกกับทำนาย cluster) จึงใช้เวลารวมเท่ากับงานที่ช้าที่สุดแทนผลรวมของทุกงาน
+งานที่เกิน deadline หรือผิดพลาดถูกแทนด้วยค่า fallback ส่วนงานเดิมยังทำต่อเบื้องหลัง
+(ผลที่ได้ถูก cache ไว้ใน store ของงานนั้น ๆ ให้ request ถัดไปใช้)
+"""
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CallPool:
+    """ThreadPoolExecutor ต่อ process (สร้างใหม่อัตโนมัติหลัง fork) พร้อมการรอผลแบบมี deadline
+
+    on_fallback(name, reason) ถูกเรียกทุกครั้งที่ใช้ค่า fallback (reason เป็น 'timeout' หรือ 'error')
+    """
+
+    def __init__(self, max_workers=None, on_fallback=None):
+        self.max_workers = int(max_workers or os.environ.get('CALL_POOL_WORKERS', 8))
+        self.on_fallback = on_fallback
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # งานที่ยังไม่เสร็จของ submit_once ตาม key
+        self._inflight = {}
+
+    def _get_executor(self):
+        # thread ของ executor ไม่ถูกคัดลอกไปยัง process ลูกหลัง fork
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='call-pool')
+                    self._inflight = {}
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, fn, *args, inline=False):
+        """เริ่มงานใน pool คืน Future
+
+        inline=True (งานที่รู้ว่าไม่ block เช่นข้อมูลโหลดไว้แล้ว) เรียกทันทีใน thread นี้ เพราะการส่งงานข้ามไป
+        thread อื่นขณะ thread นี้ยังถือ GIL ทำงานอยู่ต้องรอการสลับ GIL ซึ่งช้ากว่างานเองมาก
+        """
+        if not inline:
+            return self._get_executor().submit(fn, *args)
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit_once(self, key, fn, *args, inline=False):
+        """เหมือน submit แต่ถ้างานของ key นี้ยังไม่เสร็จ คืน Future เดิมแทนการเริ่มงานใหม่
+
+        ใช้กับงานที่ทุก request รอผลเดียวกัน (เช่นโหลดแคตตาล็อกตอน cold): ถ้างานค้าง request ที่ตามมาไม่กิน
+        thread ของ pool เพิ่มจนเต็ม
+        """
+        if inline:
+            return self.submit(fn, *args, inline=True)
+        executor = self._get_executor()
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None or future.done():
+                future = executor.submit(fn, *args)
+                self._inflight[key] = future
+        return future
+
+    def result(self, name, future, deadline, fallback):
+        """ผลของ future ภายใน deadline (ค่าของ time.monotonic()) หรือ fallback หากเกินเวลาหรือผิดพลาด"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            reason = 'timeout'
+            logger.warning("%s ไม่เสร็จภายในเวลาที่กำหนด ใช้ค่า fallback", name)
+        except Exception as e:
+            reason = 'error'
+            logger.warning("%s ไม่สำเร็จ ใช้ค่า fallback: %s", name, e)
+        if self.on_fallback is not None:
+            self.on_fallback(name, reason)
+        return fallback
+
+    def shutdown(self):
+        """หยุดรับงานใหม่โดยไม่รองานที่ค้างอยู่"""
+        executor = self._executor
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
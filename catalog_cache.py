@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""แคชแคตตาล็อกรถ EV (ตาราง Model) ในหน่วยความจำ พร้อม version id"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def compute_catalog_version(df):
+    """คำนวณ version id จากเนื้อหาของ DataFrame (เนื้อหาเดิม = version เดิม)"""
+    import pandas as pd
+
+    digest = hashlib.sha1()
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:12]
+
+
+def catalog_records(df):
+    """ข้อมูลแต่ละแถวในรูป dict แบบ to_dict('records') โดยค่าว่างของคอลัมน์ datetime (NaT) เป็น None
+
+    ชนิดของค่าตรงกับ shared_catalog.SharedCatalogView[i]: Timestamp, int / None ของคอลัมน์ nullable
+    ผลลัพธ์ JSON จึงเหมือนกันไม่ว่าจะใช้แคตตาล็อกร่วมหรือไม่
+    """
+    records = df.to_dict('records')
+    datetime_columns = [c for c in df.columns if df[c].dtype.kind == 'M' and df[c].hasnans]
+    if datetime_columns:
+        for record in records:
+            for column in datetime_columns:
+                if record[column] is not None and record[column] != record[column]:
+                    record[column] = None
+    return records
+
+
+class CatalogSnapshot:
+    """ข้อมูลแคตตาล็อก ณ version หนึ่ง (ห้ามแก้ไข df โดยตรง)
+
+    view คือแคตตาล็อกที่เผยแพร่ร่วมกันทุก worker (shared_catalog.SharedCatalogView) ถ้ามี
+    ในกรณีนั้น df ถูกสร้างจาก view เมื่อถูกเรียกใช้ครั้งแรกเท่านั้น
+    """
+
+    def __init__(self, df, version, marker=None, view=None):
+        self._df = df
+        self.view = view
+        self.version = version
+        self.marker = marker
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def df(self):
+        if self._df is None and self.view is not None:
+            self._df = self.derived('df', lambda snap: snap.view.to_dataframe())
+        return self._df
+
+    def derived(self, name, builder):
+        """คืนค่าที่คำนวณล่วงหน้าจาก snapshot นี้ (คำนวณครั้งเดียวต่อ version)"""
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = builder(self)
+                    self._derived[name] = value
+        return value
+
+
+class CatalogCache:
+    """เก็บแคตตาล็อกที่ทำความสะอาดแล้วในหน่วยความจำ และรีเฟรชเบื้องหลังตาม TTL หรือ change marker
+
+    - get() จะรอโหลดเฉพาะครั้งแรก (cold) หลังจากนั้นคืน snapshot ปัจจุบันทันทีเสมอ
+    - marker เป็นฟังก์ชันที่คืนค่าราคาถูกสำหรับตรวจว่าตารางเปลี่ยน (เช่นเวลาแก้ไขตาราง)
+    - shared (shared_catalog.SharedCatalogStore) ถ้ากำหนด: process เดียวโหลดและเผยแพร่ต่อ version
+      process อื่น attach ไฟล์เดิม และสลับ version เมื่อ pointer เปลี่ยน
+    """
+
+    def __init__(self, loader, ttl=None, marker=None, marker_interval=None, shared=None):
+        self.loader = loader
+        self.marker = marker
+        self.shared = shared
+        self.ttl = float(ttl if ttl is not None else os.environ.get('CATALOG_TTL_SECONDS', 900))
+        self.marker_interval = float(marker_interval if marker_interval is not None
+                                     else os.environ.get('CATALOG_MARKER_INTERVAL', 60))
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        # แยกจาก _load_lock ซึ่งถูกถือตลอดการโหลด: get() ที่สั่งรีเฟรชเบื้องหลังต้องไม่รอการโหลดที่ค้างอยู่
+        self._refresh_flag_lock = threading.Lock()
+        self._refreshing = False
+        self._listeners = []
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        # สถิติของ get(): hit = มี snapshot อยู่แล้ว, miss = ต้องโหลดแบบ blocking
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def add_listener(self, callback):
+        """ลงทะเบียน callback(old_version, new_snapshot) เมื่อ version เปลี่ยน"""
+        self._listeners.append(callback)
+
+    def get(self):
+        """คืน snapshot ปัจจุบัน (โหลดแบบ blocking เฉพาะตอนยังไม่มีข้อมูล)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.misses += 1
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._refresh_locked()
+                snapshot = self._snapshot
+            return snapshot
+        self.hits += 1
+        if time.time() - snapshot.loaded_at > self.ttl:
+            self.refresh_async()
+        return snapshot
+
+    def refresh(self):
+        """โหลดแคตตาล็อกใหม่แบบ blocking แล้วคืน snapshot ล่าสุด"""
+        with self._load_lock:
+            self._refresh_locked()
+        return self._snapshot
+
+    def refresh_async(self):
+        """สั่งรีเฟรชเบื้องหลังหากยังไม่มีการรีเฟรชค้างอยู่ (ไม่ block)"""
+        with self._refresh_flag_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name='catalog-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("รีเฟรชแคตตาล็อกไม่สำเร็จ (ใช้ข้อมูลเดิมต่อ): %s", e)
+        finally:
+            self._refreshing = False
+
+    def _refresh_locked(self):
+        marker = self._read_marker()
+        df, view, loaded_at = None, None, time.time()
+        if self.shared is not None:
+            try:
+                view, loaded_at = self.shared.acquire(self.loader, marker, self.ttl)
+            except Exception as e:
+                logger.warning("ใช้แคตตาล็อกร่วมไม่ได้ โหลดเฉพาะ process นี้: %s", e)
+                loaded_at = time.time()
+        if view is None:
+            df = self.loader()
+            version = compute_catalog_version(df)
+        else:
+            version = view.version
+        old = self._snapshot
+        if old is not None and old.version == version:
+            # เนื้อหาไม่เปลี่ยน: ต่ออายุ snapshot เดิมเพื่อเก็บค่าที่คำนวณไว้แล้ว
+            old.loaded_at = loaded_at
+            old.marker = marker
+            return
+        snapshot = CatalogSnapshot(df, version, marker, view)
+        # อายุนับจากเวลาที่เผยแพร่ ทุก worker จึงหมดอายุพร้อมกันและโหลดจากแหล่งข้อมูลเพียงครั้งเดียว
+        snapshot.loaded_at = loaded_at
+        self._snapshot = snapshot
+        for callback in self._listeners:
+            try:
+                callback(old.version if old is not None else None, self._snapshot)
+            except Exception as e:
+                logger.exception("catalog listener error: %s", e)
+
+    def _read_marker(self):
+        if self.marker is None:
+            return None
+        try:
+            return self.marker()
+        except Exception as e:
+            logger.warning("อ่าน change marker ของแคตตาล็อกไม่สำเร็จ: %s", e)
+            return None
+
+    def start(self):
+        """เริ่ม thread ตรวจ TTL / change marker (เรียกซ้ำได้ และเรียกใหม่หลัง fork ได้)"""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._watch, name='catalog-watch', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.marker_interval):
+            snapshot = self._snapshot
+            if snapshot is None:
+                continue
+            try:
+                expired = time.time() - snapshot.loaded_at > self.ttl
+                changed = self.marker is not None and self._read_marker() != snapshot.marker
+                # process อื่นเผยแพร่ version ใหม่แล้ว (เช่นหลังรีเฟรชตาม TTL)
+                published = self.shared is not None and self.shared.current_version() not in (None, snapshot.version)
+                if expired or changed or published:
+                    self.refresh()
+            except Exception as e:
+                logger.warning("รีเฟรชแคตตาล็อกไม่สำเร็จ (ใช้ข้อมูลเดิมต่อ): %s", e)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""ดัชนีแคตตาล็อกตาม (จำนวนที่นั่ง, ระบบขับเคลื่อน) และการเลือก top-k ด้วย argpartition"""
+import numpy as np
+
+# ถ้าผลกรองแบบ AND มีน้อยกว่านี้ ให้ใช้ผลกรองแบบ OR แทน (กติกาเดิมของ calculate_ahp_topsis)
+MIN_EXACT_MATCHES = 3
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def normalize_seats(seats):
+    """แปลงจำนวนที่นั่งเป็น int เมื่อทำได้ (เช่น '5', 5.0 -> 5)"""
+    try:
+        return int(float(seats))
+    except (TypeError, ValueError):
+        return seats
+
+
+def normalize_drive(drive_config):
+    """แปลงระบบขับเคลื่อนเป็นตัวพิมพ์เล็กไม่มีช่องว่างหัวท้าย"""
+    return str(drive_config).strip().lower() if drive_config is not None else ''
+
+
+def _group_positions(keys):
+    groups = {}
+    for position, key in enumerate(keys):
+        groups.setdefault(key, []).append(position)
+    return {key: np.array(positions, dtype=np.intp) for key, positions in groups.items()}
+
+
+class CatalogIndex:
+    """map (seats, driveconfiguration) ที่ normalize แล้วไปยังตำแหน่งแถวในแคตตาล็อก
+
+    สร้างครั้งเดียวต่อ catalog version รวมถึงชุด union (seats OR drive) ของทุกคู่ค่าที่มีในแคตตาล็อก
+    สำหรับกติกา fallback ทำให้ขั้นกรองไม่ต้องสแกนทั้งแคตตาล็อกทุก request
+    """
+
+    def __init__(self, seats, drive_configs):
+        seats_keys = [normalize_seats(s) for s in seats]
+        drive_keys = [normalize_drive(d) for d in drive_configs]
+        self.size = len(seats_keys)
+        self.by_seats = _group_positions(seats_keys)
+        self.by_drive = _group_positions(drive_keys)
+        self.exact = _group_positions(zip(seats_keys, drive_keys))
+        self.union = {
+            (s, d): np.union1d(seat_rows, drive_rows)
+            for s, seat_rows in self.by_seats.items()
+            for d, drive_rows in self.by_drive.items()
+        }
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(df['seats'].tolist(), df['driveconfiguration'].tolist())
+
+    def candidates(self, drive_config, seats):
+        """ตำแหน่งแถวที่ผ่านเงื่อนไข: ตรงทั้งสองค่า หรือถ้าน้อยกว่า 3 แถว ให้ตรงค่าใดค่าหนึ่ง"""
+        key = (normalize_seats(seats), normalize_drive(drive_config))
+        exact = self.exact.get(key, _EMPTY)
+        if len(exact) >= MIN_EXACT_MATCHES:
+            return exact
+        union = self.union.get(key)
+        if union is None:
+            # ค่าที่ไม่มีในแคตตาล็อก: union คือฝั่งที่มีอยู่เพียงฝั่งเดียว
+            union = np.union1d(self.by_seats.get(key[0], _EMPTY), self.by_drive.get(key[1], _EMPTY))
+        return union
+
+
+def top_k_positions(scores, k):
+    """ตำแหน่ง (ใน scores) ของ k ค่าสูงสุดเรียงจากมากไปน้อย โดยใช้ argpartition แทนการ sort ทั้งหมด"""
+    n = len(scores)
+    if n == 0:
+        return _EMPTY
+    # NaN ให้อยู่ท้ายสุดเหมือน sort_values
+    keys = np.where(np.isnan(scores), -np.inf, scores)
+    if n > k:
+        part = np.argpartition(-keys, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-keys[part], kind='stable')]
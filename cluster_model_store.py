@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""เก็บโมเดล clustering ผู้ใช้ที่ train แล้วเป็นไฟล์ artifact พร้อม version และสลับโมเดลแบบ atomic"""
+import datetime
+import fcntl
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterModel:
+    """โมเดล clustering หนึ่ง version (Pipeline ที่ fit แล้ว + metadata)"""
+
+    def __init__(self, pipeline, version, trained_at, n_samples=0, extra=None):
+        self.pipeline = pipeline
+        self.version = version
+        self.trained_at = trained_at
+        self.n_samples = n_samples
+        self.extra = extra or {}
+
+    def predict(self, user_df):
+        return self.pipeline.predict(user_df)
+
+
+def new_model_version():
+    """สร้าง version id จากเวลาที่ train (เรียงตามเวลาได้)"""
+    return datetime.datetime.now().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+
+
+def save_model_artifact(model, path):
+    """บันทึก artifact แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว os.replace)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({
+            'pipeline': model.pipeline,
+            'version': model.version,
+            'trained_at': model.trained_at,
+            'n_samples': model.n_samples,
+            'extra': model.extra,
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_model_artifact(path):
+    """โหลด artifact ที่บันทึกด้วย save_model_artifact"""
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    return ClusterModel(data['pipeline'], data['version'], data['trained_at'],
+                        data.get('n_samples', 0), data.get('extra'))
+
+
+class ClusterModelStore:
+    """ถือโมเดล clustering ปัจจุบันของ process
+
+    - โหลด artifact ครั้งเดียวตอนเริ่ม ถ้ายังไม่มีไฟล์ get() ไม่ train เอง แต่ปลุก thread เบื้องหลังให้ train
+      (warmup ใช้ prepare() ซึ่ง train แบบ blocking ได้) request จึงไม่ต้องรอการ train ทั้งตาราง
+    - train ใหม่เบื้องหลังตามรอบ retrain_interval โดยมีเพียง process เดียวที่ได้ lock เป็นผู้ train
+    - process อื่นตรวจเวลาแก้ไขไฟล์ artifact แล้วสลับโมเดลใหม่เข้ามาแบบ atomic
+    - train ไม่สำเร็จ (trainer คืน None หรือ raise) จะเว้นระยะก่อนลองใหม่แบบ exponential backoff
+      เริ่มที่ retry_interval และไม่เกิน retrain_interval (บันทึกในไฟล์ .attempts ข้าง artifact จึงใช้ร่วมทุก worker)
+    """
+
+    def __init__(self, trainer, path=None, retrain_interval=None, poll_interval=None, retry_interval=None):
+        self.trainer = trainer
+        self.path = path or os.environ.get('CLUSTER_MODEL_PATH', 'artifacts/user_clustering.pkl')
+        self.retrain_interval = float(retrain_interval if retrain_interval is not None
+                                      else os.environ.get('CLUSTER_RETRAIN_INTERVAL', 6 * 3600))
+        self.poll_interval = float(poll_interval if poll_interval is not None
+                                   else os.environ.get('CLUSTER_MODEL_POLL_INTERVAL', 30))
+        self.retry_interval = float(retry_interval if retry_interval is not None
+                                    else os.environ.get('CLUSTER_RETRAIN_RETRY_INTERVAL', 300))
+        self._model = None
+        self._artifact_mtime = None
+        self._load_lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    @property
+    def version(self):
+        model = self._model
+        return model.version if model is not None else None
+
+    @property
+    def current(self):
+        """โมเดลที่ใช้อยู่ตอนนี้โดยไม่โหลดหรือ train (None หากยังไม่มี) ใช้ใน trainer ที่ต่อยอดจากโมเดลเดิม"""
+        return self._model
+
+    def add_listener(self, callback):
+        """ลงทะเบียน callback(old_version, new_model) เมื่อมีการสลับโมเดล"""
+        self._listeners.append(callback)
+
+    def get(self):
+        """คืนโมเดลปัจจุบัน โหลดจากไฟล์ถ้ายังไม่มี (ไม่ train: คืน None แล้วให้ thread เบื้องหลัง train ตาม backoff)"""
+        model = self._model
+        if model is None:
+            with self._load_lock:
+                if self._model is None and not self._load_artifact():
+                    self._wake.set()
+                model = self._model
+        return model
+
+    def prepare(self):
+        """โหลด artifact หรือ train แบบ blocking ถ้ายังไม่มีไฟล์ (ใช้ใน warmup) โดยเคารพ backoff ของการ train ที่ล้มเหลว"""
+        if self.get() is None:
+            try:
+                self._retrain_if_leader()
+            except Exception as e:
+                logger.warning("train โมเดลคลัสเตอร์ตอนเริ่มไม่สำเร็จ: %s", e)
+        return self._model
+
+    def predict(self, user_df):
+        """ทำนาย cluster ของผู้ใช้หนึ่งคน (คืน None หากยังไม่มีโมเดล)"""
+        model = self.get()
+        if model is None:
+            logger.warning("ยังไม่มีโมเดลคลัสเตอร์ ใช้ค่าน้ำหนักเริ่มต้นของ cluster แทน")
+            return None
+        return int(model.predict(user_df)[0])
+
+    def _swap(self, model):
+        old = self._model
+        self._model = model
+        for callback in self._listeners:
+            try:
+                callback(old.version if old is not None else None, model)
+            except Exception as e:
+                logger.exception("cluster model listener error: %s", e)
+
+    def _load_artifact(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        try:
+            model = load_model_artifact(self.path)
+        except Exception as e:
+            logger.warning("โหลดโมเดลคลัสเตอร์จากไฟล์ไม่สำเร็จ: %s", e)
+            return False
+        self._artifact_mtime = mtime
+        if self._model is None or model.version != self._model.version:
+            self._swap(model)
+        return True
+
+    def retrain(self):
+        """train โมเดลใหม่ บันทึก artifact แล้วสลับเข้ามาใช้งาน"""
+        with self._load_lock:
+            return self._retrain_locked()
+
+    def _retrain_locked(self):
+        result = self.trainer()
+        if result is None:
+            return None
+        if isinstance(result, ClusterModel):
+            model = result
+        else:
+            scaler = getattr(result, 'named_steps', {}).get('scaler')
+            n_samples = int(getattr(scaler, 'n_samples_seen_', 0))
+            model = ClusterModel(result, new_model_version(), datetime.datetime.now().isoformat(), n_samples)
+        try:
+            save_model_artifact(model, self.path)
+            self._artifact_mtime = os.path.getmtime(self.path)
+        except Exception as e:
+            logger.error("บันทึกโมเดลคลัสเตอร์ไม่สำเร็จ: %s", e)
+        self._swap(model)
+        return model
+
+    def start(self):
+        """เริ่ม thread ตรวจไฟล์ artifact และ train ตามรอบ (เรียกซ้ำได้ และเรียกใหม่หลัง fork ได้)"""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._watch, name='cluster-model-watch', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _watch(self):
+        while True:
+            # รอครบรอบ หรือถูกปลุกโดย get() เมื่อยังไม่มีโมเดล
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                try:
+                    mtime = os.path.getmtime(self.path)
+                except OSError:
+                    mtime = None
+                if mtime is not None and mtime != self._artifact_mtime:
+                    with self._load_lock:
+                        self._load_artifact()
+                if self._model is None or (self.retrain_interval > 0 and self._is_due()):
+                    self._retrain_if_leader()
+            except Exception as e:
+                logger.warning("อัปเดตโมเดลคลัสเตอร์ไม่สำเร็จ (ใช้โมเดลเดิมต่อ): %s", e)
+
+    def _is_due(self):
+        model = self._model
+        if model is None:
+            return True
+        try:
+            trained_at = datetime.datetime.fromisoformat(model.trained_at)
+        except (TypeError, ValueError):
+            return True
+        return (datetime.datetime.now() - trained_at).total_seconds() >= self.retrain_interval
+
+    def _retrain_if_leader(self):
+        """train ใหม่เฉพาะเมื่อได้ file lock (กันหลาย worker train พร้อมกัน)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            try:
+                # worker อื่นอาจเพิ่ง train เสร็จระหว่างรอ lock
+                with self._load_lock:
+                    self._load_artifact()
+                if not self._is_due():
+                    return
+                failures, attempted_at = self._read_attempts()
+                wait = self._backoff(failures) - (time.time() - attempted_at)
+                if failures and wait > 0:
+                    return
+                model = None
+                try:
+                    model = self.retrain()
+                finally:
+                    failures = 0 if model is not None else failures + 1
+                    self._write_attempts(failures, time.time())
+                    if failures:
+                        logger.warning("train โมเดลคลัสเตอร์ไม่สำเร็จ %d ครั้งติดกัน จะลองใหม่ในอีก %.0f วินาที",
+                                       failures, self._backoff(failures))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _backoff(self, failures):
+        """ระยะรอก่อน train ใหม่หลังล้มเหลว failures ครั้งติดกัน"""
+        if failures <= 0:
+            return 0.0
+        backoff = self.retry_interval * 2 ** min(failures - 1, 30)
+        return min(backoff, self.retrain_interval) if self.retrain_interval > 0 else backoff
+
+    @property
+    def _attempts_path(self):
+        return self.path + '.attempts'
+
+    def _read_attempts(self):
+        """(จำนวนครั้งที่ train ล้มเหลวติดกัน, เวลาที่ลองครั้งล่าสุด) ของทุก worker"""
+        try:
+            with open(self._attempts_path, encoding='utf-8') as f:
+                data = json.load(f)
+            return int(data['failures']), float(data['attempted_at'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, 0.0
+
+    def _write_attempts(self, failures, attempted_at):
+        try:
+            with open(self._attempts_path, 'w', encoding='utf-8') as f:
+                json.dump({'failures': failures, 'attempted_at': attempted_at}, f)
+        except OSError as e:
+            logger.warning("บันทึกสถานะการ train ไม่สำเร็จ: %s", e)
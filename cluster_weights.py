@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""ค่าเฉลี่ยน้ำหนักของแต่ละ cluster แบบ running sum/count ในหน่วยความจำ (แทน AVG query ทุก request)"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# เกณฑ์ -> คอลัมน์น้ำหนักในตาราง UserProfiles
+WEIGHT_COLUMNS = {
+    'battery': 'battery_weight',
+    'range': 'range_weight',
+    'accelarate': 'accelarate_weight',
+    'topspeed': 'topspeed_weight',
+    'efficiency': 'efficiency_weight',
+    'fastcharge': 'fastcharge_weight',
+    'estimatedthbvalue': 'price_weight',
+}
+CRITERIA = list(WEIGHT_COLUMNS)
+
+
+def aggregate_cluster_weights(labels, weights_df):
+    """สรุป sum/count ต่อ cluster จาก label และ DataFrame คอลัมน์ *_weight
+
+    คืน dict {cluster_id(str): {'count': [...], 'sum': [...]}} ตามลำดับ CRITERIA
+    (นับแยกรายคอลัมน์เพื่อให้เหมือน AVG ที่ไม่นับค่า NULL)
+    """
+    values = weights_df[[WEIGHT_COLUMNS[c] for c in CRITERIA]].apply(
+        lambda col: col.astype(float)).to_numpy()
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+    labels = np.asarray(labels)
+    result = {}
+    for cluster_id in np.unique(labels):
+        mask = labels == cluster_id
+        result[str(cluster_id)] = {
+            'count': present[mask].sum(axis=0).tolist(),
+            'sum': values[mask].sum(axis=0).tolist(),
+        }
+    return result
+
+
+def merge_cluster_weights(total, addition):
+    """รวมผลของ aggregate_cluster_weights สองชุด (เช่นทีละ chunk) คืน dict ใหม่"""
+    merged = {cluster_id: {'count': list(agg['count']), 'sum': list(agg['sum'])} for cluster_id, agg in total.items()}
+    for cluster_id, agg in addition.items():
+        current = merged.get(str(cluster_id))
+        if current is None:
+            merged[str(cluster_id)] = {'count': list(agg['count']), 'sum': list(agg['sum'])}
+        else:
+            current['count'] = [x + y for x, y in zip(current['count'], agg['count'])]
+            current['sum'] = [x + y for x, y in zip(current['sum'], agg['sum'])]
+    return merged
+
+
+class ClusterWeightStore:
+    """เก็บผลรวมและจำนวนของน้ำหนักทั้ง 7 เกณฑ์ต่อ cluster
+
+    ข้อมูลมาจากสองส่วน:
+    - baseline: สรุปจากข้อมูลที่ใช้ train โมเดลปัจจุบัน (label ตามโมเดลนี้) ไม่เปลี่ยนจนกว่าจะ train ใหม่
+    - ส่วนเพิ่ม: แถวที่บันทึกหลังโมเดลถูก train ดึงจาก warehouse ตอน reconcile
+      และบวกเพิ่มใน process ทุกครั้งที่ save_user_result บันทึกผู้ใช้ใหม่
+
+    loader(since) ต้องคืน DataFrame ที่มีคอลัมน์ cluster_id, <เกณฑ์>_count, <เกณฑ์>_sum
+    ของแถวที่ timestamp >= since (ทุกแถวหาก since เป็น None)
+
+    averages() อ่านจากหน่วยความจำเท่านั้น การโหลดจาก warehouse เกิดใน seed() (warmup) และ thread เบื้องหลังเสมอ
+    ระหว่างที่ยังโหลดไม่สำเร็จ averages() ใช้เฉพาะ baseline ของโมเดลและแถวที่ process นี้บันทึกเอง
+    """
+
+    # ถ้าโหลดไม่สำเร็จ ลองใหม่ทุกกี่วินาที (แทนรอบ reconcile ปกติ)
+    SEED_RETRY_INTERVAL = 30
+
+    def __init__(self, loader, reconcile_interval=None):
+        self.loader = loader
+        self.reconcile_interval = float(reconcile_interval if reconcile_interval is not None
+                                        else os.environ.get('CLUSTER_WEIGHTS_RECONCILE_INTERVAL', 600))
+        self._lock = threading.Lock()
+        self._baseline = {}
+        self._since = None
+        self._model_version = None
+        self._counts = {}
+        self._sums = {}
+        self._seeded = False
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        # ปลุก thread เบื้องหลังให้โหลดทันที (เช่นหลังโมเดลเปลี่ยน)
+        self._wake = threading.Event()
+
+    def reset(self, model):
+        """เริ่มนับใหม่เมื่อโมเดล clustering เปลี่ยน (cluster id เดิมไม่มีความหมายแล้ว)"""
+        baseline = {}
+        since = None
+        if model is not None and model.extra.get('cluster_weights') is not None:
+            for cluster_id, agg in model.extra['cluster_weights'].items():
+                baseline[str(cluster_id)] = (np.array(agg['count'], dtype=float), np.array(agg['sum'], dtype=float))
+            since = model.trained_at
+        with self._lock:
+            self._baseline = baseline
+            self._since = since
+            self._model_version = model.version if model is not None else None
+            self._counts = {k: c.copy() for k, (c, s) in baseline.items()}
+            self._sums = {k: s.copy() for k, (c, s) in baseline.items()}
+            self._seeded = False
+        self._wake.set()
+
+    def reconcile(self):
+        """โหลดส่วนเพิ่มจาก warehouse ใหม่แล้วแทนที่ค่าที่สะสมใน process"""
+        with self._lock:
+            since = self._since
+            model_version = self._model_version
+            baseline = self._baseline
+        frame = self.loader(since)
+        counts = {k: c.copy() for k, (c, s) in baseline.items()}
+        sums = {k: s.copy() for k, (c, s) in baseline.items()}
+        for row in frame.to_dict('records'):
+            cluster_id = str(row['cluster_id'])
+            count = np.array([row.get(f'{c}_count') or 0 for c in CRITERIA], dtype=float)
+            total = np.array([row.get(f'{c}_sum') or 0 for c in CRITERIA], dtype=float)
+            counts[cluster_id] = counts.get(cluster_id, np.zeros(len(CRITERIA))) + count
+            sums[cluster_id] = sums.get(cluster_id, np.zeros(len(CRITERIA))) + np.nan_to_num(total)
+        with self._lock:
+            # โมเดลถูกสลับระหว่างโหลด: ทิ้งผลนี้ไป
+            if model_version != self._model_version:
+                return
+            self._counts = counts
+            self._sums = sums
+            self._seeded = True
+
+    @property
+    def ready(self):
+        """โหลดส่วนเพิ่มจาก warehouse ของโมเดลปัจจุบันสำเร็จแล้ว"""
+        return self._seeded
+
+    def seed(self):
+        """โหลดจาก warehouse หากยังไม่เคยโหลดสำเร็จ (คืน True เมื่อพร้อม) ใช้ใน warmup"""
+        if self._seeded:
+            return True
+        try:
+            self.reconcile()
+        except Exception as e:
+            logger.warning("โหลดค่าน้ำหนักเฉลี่ยของ cluster ไม่สำเร็จ: %s", e)
+        return self._seeded
+
+    def add(self, cluster_id, user_weights):
+        """บวกน้ำหนักของผู้ใช้ใหม่หนึ่งคนเข้าใน cluster (ค่า None ไม่นับ เหมือน AVG)"""
+        count = np.array([0.0 if user_weights.get(c) is None else 1.0 for c in CRITERIA])
+        total = np.array([float(user_weights.get(c) or 0) for c in CRITERIA])
+        cluster_id = str(cluster_id)
+        with self._lock:
+            self._counts[cluster_id] = self._counts.get(cluster_id, np.zeros(len(CRITERIA))) + count
+            self._sums[cluster_id] = self._sums.get(cluster_id, np.zeros(len(CRITERIA))) + total
+
+    def averages(self, cluster_id):
+        """ค่าเฉลี่ยน้ำหนักของ cluster เป็น dict ตามเกณฑ์ (None หากไม่มีข้อมูล เกณฑ์ที่ไม่มีข้อมูลเป็น NaN)
+
+        อ่านจากหน่วยความจำเท่านั้น ไม่ query warehouse
+        """
+        cluster_id = str(cluster_id)
+        with self._lock:
+            counts = self._counts.get(cluster_id)
+            sums = self._sums.get(cluster_id)
+        if counts is None or not counts.any():
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        return dict(zip(CRITERIA, means.tolist()))
+
+    def start(self):
+        """เริ่ม thread reconcile ตามรอบ (เรียกซ้ำได้ และเรียกใหม่หลัง fork ได้)"""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._watch, name='cluster-weights-reconcile', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            if self._seeded:
+                self._wake.wait(self.reconcile_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.warning("reconcile ค่าน้ำหนักเฉลี่ยของ cluster ไม่สำเร็จ: %s", e)
+                # ยังไม่มีข้อมูลส่วนเพิ่ม: ลองใหม่เร็วกว่ารอบปกติ
+                if not self._seeded:
+                    self._wake.wait(self.SEED_RETRY_INTERVAL)
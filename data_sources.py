@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""ชั้นแหล่งข้อมูล: BigQuery หรือไฟล์ Parquet ในเครื่อง (เลือกด้วย DATA_SOURCE)"""
+import abc
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+from cluster_weights import WEIGHT_COLUMNS
+
+# ไฟล์ service account เดิมของเครื่องพัฒนา (ใช้เมื่อไม่ได้กำหนด BQ_CREDENTIALS_FILE และไฟล์มีอยู่จริง)
+DEFAULT_CREDENTIALS_FILE = "C:/senior_project/config/bit15-ev-decision-support-2cef27def9c2.json"
+DEFAULT_CHUNK_SIZE = 50000
+# เวลารอสูงสุด (วินาที) ของแต่ละการเรียก BigQuery (0 = ไม่จำกัด)
+DEFAULT_QUERY_TIMEOUT = 120
+
+
+def filter_since(df, since):
+    """เฉพาะแถวที่คอลัมน์ timestamp >= since (ทุกแถวหาก since เป็น None)"""
+    if not since:
+        return df
+    import pandas as pd
+
+    timestamps = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+    if getattr(timestamps.dt, 'tz', None) is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    return df[(timestamps >= pd.Timestamp(since)).to_numpy()]
+
+
+class DataSource(abc.ABC):
+    """interface ของแหล่งข้อมูลที่ service ใช้ (subclass ต้อง implement ทุก abstractmethod)"""
+
+    @abc.abstractmethod
+    def load_table(self, table, columns=None):
+        """โหลดตารางทั้งตาราง (หรือเฉพาะคอลัมน์ที่ระบุ) เป็น DataFrame"""
+
+    def iter_table(self, table, columns=None, chunk_size=None, since=None):
+        """อ่านตารางทีละ chunk (DataFrame ละไม่เกิน chunk_size แถว) เฉพาะแถวที่ timestamp >= since ถ้าระบุ
+
+        ค่าเริ่มต้นโหลดทั้งตารางแล้วแบ่ง แหล่งข้อมูลที่อ่านแบบ stream ได้ควร override
+        """
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        read_columns = columns
+        if since and columns is not None and 'timestamp' not in columns:
+            read_columns = list(columns) + ['timestamp']
+        df = filter_since(self.load_table(table, read_columns), since)
+        if read_columns is not columns:
+            df = df[list(columns)]
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+    @abc.abstractmethod
+    def table_marker(self, table):
+        """ค่าราคาถูกที่เปลี่ยนเมื่อข้อมูลในตารางเปลี่ยน (ใช้ตรวจว่าต้องโหลดใหม่)"""
+
+    @abc.abstractmethod
+    def cluster_weight_aggregates(self, table, since=None):
+        """count/sum ของคอลัมน์น้ำหนักต่อ cluster_id (เฉพาะแถวที่ timestamp >= since ถ้าระบุ)
+
+        คืน DataFrame คอลัมน์ cluster_id, <เกณฑ์>_count, <เกณฑ์>_sum
+        """
+
+    @abc.abstractmethod
+    def insert_rows(self, table, rows, row_ids):
+        """เพิ่มแถวลงตาราง (row_ids ใช้กันแถวซ้ำ) คืนรายการ error ของแถวที่ไม่ถูกต้อง"""
+
+    def after_fork(self):
+        """เรียกใน worker หลัง fork เพื่อทิ้ง connection ที่สร้างไว้ใน process แม่"""
+
+
+class BigQuerySource(DataSource):
+    """แหล่งข้อมูล BigQuery (สร้าง client ครั้งแรกที่ใช้งาน)
+
+    ทุกการเรียกมี timeout (query_timeout หรือ BQ_QUERY_TIMEOUT): query ที่ค้างจะถูก cancel และ raise
+    แทนการถือ lock ของผู้เรียก (เช่น CatalogCache._load_lock) ไว้ตลอดไป
+    """
+
+    def __init__(self, project_id, dataset_id, credentials_file=None, client=None, query_timeout=None):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.credentials_file = credentials_file
+        timeout = float(query_timeout if query_timeout is not None
+                        else os.environ.get('BQ_QUERY_TIMEOUT', DEFAULT_QUERY_TIMEOUT))
+        self.query_timeout = timeout if timeout > 0 else None
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def after_fork(self):
+        # gRPC/HTTP session ของ client ใช้ข้าม fork ไม่ได้ ให้สร้างใหม่ใน worker
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _create_client(self):
+        """สร้าง BigQuery Client จาก service account file (ถ้ามี) หรือ default credentials"""
+        from google.cloud import bigquery
+
+        if self.credentials_file and os.path.exists(self.credentials_file):
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_file(self.credentials_file)
+            return bigquery.Client(credentials=credentials, project=os.environ.get("GCP_PROJECT"))
+        return bigquery.Client(project=os.environ.get("GCP_PROJECT", self.project_id))
+
+    def _table_id(self, table):
+        return f"{self.project_id}.{self.dataset_id}.{table}"
+
+    def _query(self, query, page_size=None):
+        """รัน query แล้วรอผลไม่เกิน query_timeout (เกินเวลาแล้ว cancel job ฝั่ง BigQuery ด้วย)"""
+        job = self.client.query(query, timeout=self.query_timeout)
+        try:
+            return job.result(page_size=page_size, timeout=self.query_timeout)
+        except concurrent.futures.TimeoutError:
+            try:
+                job.cancel()
+            except Exception:
+                pass
+            raise
+
+    def load_table(self, table, columns=None):
+        select = ', '.join(columns) if columns else '*'
+        query = f"SELECT {select} FROM `{self._table_id(table)}`"
+        return self._query(query).to_dataframe()
+
+    def iter_table(self, table, columns=None, chunk_size=None, since=None):
+        select = ', '.join(columns) if columns else '*'
+        where = f"WHERE timestamp >= '{since}'" if since else ''
+        query = f"SELECT {select} FROM `{self._table_id(table)}` {where}"
+        rows = self._query(query, page_size=chunk_size or DEFAULT_CHUNK_SIZE)
+        yield from rows.to_dataframe_iterable()
+
+    def table_marker(self, table):
+        return self.client.get_table(self._table_id(table), timeout=self.query_timeout).modified
+
+    def cluster_weight_aggregates(self, table, since=None):
+        aggregates = ',\n            '.join(
+            f"COUNT({column}) AS {criterion}_count, SUM({column}) AS {criterion}_sum"
+            for criterion, column in WEIGHT_COLUMNS.items()
+        )
+        where = f"WHERE timestamp >= '{since}'" if since else ''
+        query = f"""
+        SELECT
+            CAST(cluster_id AS STRING) AS cluster_id,
+            {aggregates}
+        FROM `{self._table_id(table)}`
+        {where}
+        GROUP BY cluster_id
+        """
+        return self._query(query).to_dataframe()
+
+    def insert_rows(self, table, rows, row_ids):
+        return self.client.insert_rows_json(self._table_id(table), rows, row_ids=row_ids, skip_invalid_rows=True,
+                                            timeout=self.query_timeout)
+
+
+class LocalSource(DataSource):
+    """แหล่งข้อมูลในเครื่อง: <directory>/<table>.parquet (อ่านผ่าน Arrow แบบ memory-map)
+
+    แถวที่ insert เพิ่มจะต่อท้าย <directory>/<table>.jsonl และถูกรวมตอนอ่าน (ตัดแถวซ้ำด้วย row_id)
+    เหมาะกับการรันแบบ offline, benchmark และ cold start ด้วย snapshot ที่ติดไปกับ deployment
+    """
+
+    ROW_ID_COLUMN = '_row_id'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._write_lock = threading.Lock()
+
+    def _parquet_path(self, table):
+        return os.path.join(self.directory, f"{table}.parquet")
+
+    def _jsonl_path(self, table):
+        return os.path.join(self.directory, f"{table}.jsonl")
+
+    def _read_parquet(self, table, columns=None):
+        import pyarrow.parquet as pq
+
+        path = self._parquet_path(table)
+        if not os.path.exists(path):
+            return None
+        if columns is not None:
+            available = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in available]
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    def _read_appended(self, table, columns=None):
+        import pandas as pd
+
+        path = self._jsonl_path(table)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        if not rows:
+            return None
+        df = pd.DataFrame(rows).drop_duplicates(subset=[self.ROW_ID_COLUMN], keep='first')
+        df = df.drop(columns=[self.ROW_ID_COLUMN])
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        return df
+
+    def load_table(self, table, columns=None):
+        import pandas as pd
+
+        frames = [df for df in (self._read_parquet(table, columns), self._read_appended(table, columns))
+                  if df is not None]
+        if not frames:
+            raise FileNotFoundError(f"ไม่พบข้อมูลตาราง {table} ใน {self.directory}")
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        return df
+
+    def iter_table(self, table, columns=None, chunk_size=None, since=None):
+        import pyarrow.parquet as pq
+
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        read_columns = columns
+        if since and columns is not None and 'timestamp' not in columns:
+            read_columns = list(columns) + ['timestamp']
+        path = self._parquet_path(table)
+        if os.path.exists(path):
+            parquet = pq.ParquetFile(path, memory_map=True)
+            available = set(parquet.schema_arrow.names)
+            batch_columns = None if read_columns is None else [c for c in read_columns if c in available]
+            for batch in parquet.iter_batches(batch_size=chunk_size, columns=batch_columns):
+                df = batch.to_pandas()
+                if read_columns is not None:
+                    df = df.reindex(columns=read_columns)
+                df = filter_since(df, since)
+                if len(df):
+                    yield (df if read_columns is columns else df[list(columns)]).reset_index(drop=True)
+        appended = self._read_appended(table, read_columns)
+        if appended is not None:
+            appended = filter_since(appended, since)
+            if read_columns is not columns:
+                appended = appended[list(columns)]
+            for start in range(0, len(appended), chunk_size):
+                yield appended.iloc[start:start + chunk_size].reset_index(drop=True)
+
+    def table_marker(self, table):
+        marker = []
+        for path in (self._parquet_path(table), self._jsonl_path(table)):
+            try:
+                stat = os.stat(path)
+                marker.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                marker.append(None)
+        return tuple(marker)
+
+    def cluster_weight_aggregates(self, table, since=None):
+        import pandas as pd
+
+        columns = ['cluster_id', 'timestamp'] + list(WEIGHT_COLUMNS.values())
+        try:
+            df = self.load_table(table, columns)
+        except FileNotFoundError:
+            df = pd.DataFrame(columns=columns)
+        df = filter_since(df, since)
+        grouped = df.groupby(df['cluster_id'].astype(str))
+        result = pd.DataFrame({'cluster_id': list(grouped.groups)})
+        for criterion, column in WEIGHT_COLUMNS.items():
+            values = pd.to_numeric(df[column], errors='coerce').groupby(df['cluster_id'].astype(str))
+            result[f'{criterion}_count'] = values.count().reindex(result['cluster_id']).to_numpy()
+            result[f'{criterion}_sum'] = values.sum().reindex(result['cluster_id']).to_numpy()
+        return result
+
+    def insert_rows(self, table, rows, row_ids):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._write_lock, open(self._jsonl_path(table), 'a', encoding='utf-8') as f:
+            for row, row_id in zip(rows, row_ids):
+                f.write(json.dumps({**row, self.ROW_ID_COLUMN: row_id}, ensure_ascii=False, default=str) + '\n')
+        return []
+
+
+class WrappedSource(DataSource):
+    """ส่งต่อทุกการเรียกไปยังแหล่งข้อมูลอื่นผ่าน _call (ใช้เป็นฐานของตัวห่อที่เพิ่มพฤติกรรมรอบการเรียก)"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def _call(self, method, table, *args):
+        return getattr(self.source, method)(table, *args)
+
+    def load_table(self, table, columns=None):
+        return self._call('load_table', table, columns)
+
+    def iter_table(self, table, columns=None, chunk_size=None, since=None):
+        return self._call('iter_table', table, columns, chunk_size, since)
+
+    def table_marker(self, table):
+        return self._call('table_marker', table)
+
+    def cluster_weight_aggregates(self, table, since=None):
+        return self._call('cluster_weight_aggregates', table, since)
+
+    def insert_rows(self, table, rows, row_ids):
+        return self._call('insert_rows', table, rows, row_ids)
+
+    def after_fork(self):
+        self.source.after_fork()
+
+
+class SimulatedLatencySource(WrappedSource):
+    """หน่วงเวลาทุกการเรียก เพื่อจำลอง round-trip ของ BigQuery ตอน benchmark แบบ offline"""
+
+    def __init__(self, source, latency):
+        super().__init__(source)
+        self.latency = latency
+
+    def _call(self, method, table, *args):
+        time.sleep(self.latency)
+        return super()._call(method, table, *args)
+
+
+class InstrumentedSource(WrappedSource):
+    """จับเวลาทุกการเรียกลง histogram ที่มี label (operation, table)"""
+
+    def __init__(self, source, histogram):
+        super().__init__(source)
+        self.histogram = histogram
+
+    def _call(self, method, table, *args):
+        with self.histogram.time(method, table):
+            return super()._call(method, table, *args)
+
+    def iter_table(self, table, columns=None, chunk_size=None, since=None):
+        # generator: จับเวลาการดึงแต่ละ chunk แทนการสร้าง generator
+        chunks = iter(self.source.iter_table(table, columns, chunk_size, since))
+        while True:
+            with self.histogram.time('iter_table', table):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+
+def make_data_source(project_id, dataset_id):
+    """สร้างแหล่งข้อมูลตาม configuration
+
+    - DATA_SOURCE=bigquery (ค่าเริ่มต้น): ใช้ BQ_CREDENTIALS_FILE ถ้ามีไฟล์ ไม่เช่นนั้นใช้ default credentials
+      BQ_QUERY_TIMEOUT (วินาที ค่าเริ่มต้น 120, 0 = ไม่จำกัด) จำกัดเวลาของแต่ละการเรียก
+    - DATA_SOURCE=local: อ่าน/เขียนไฟล์ใน LOCAL_DATA_DIR (ค่าเริ่มต้น data)
+      LOCAL_DATA_LATENCY_MS > 0 จะหน่วงทุกการเรียกเพื่อจำลอง latency ของ BigQuery
+    """
+    kind = os.environ.get('DATA_SOURCE', 'bigquery').lower()
+    if kind == 'local':
+        source = LocalSource(os.environ.get('LOCAL_DATA_DIR', 'data'))
+        latency_ms = float(os.environ.get('LOCAL_DATA_LATENCY_MS', 0))
+        return SimulatedLatencySource(source, latency_ms / 1000) if latency_ms > 0 else source
+    if kind == 'bigquery':
+        return BigQuerySource(project_id, dataset_id, os.environ.get('BQ_CREDENTIALS_FILE', DEFAULT_CREDENTIALS_FILE))
+    raise ValueError(f"ไม่รู้จัก DATA_SOURCE={kind}")
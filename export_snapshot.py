@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""ส่งออกตารางจาก BigQuery เป็นไฟล์ Parquet สำหรับ DATA_SOURCE=local
+
+ใช้งาน: python export_snapshot.py [ตาราง ...]  (ค่าเริ่มต้น: ตาราง Model, เขียนลง LOCAL_DATA_DIR)
+"""
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_sources import DEFAULT_CREDENTIALS_FILE, BigQuerySource
+
+if __name__ == "__main__":
+    project_id = os.environ.get('PROJECT_ID', 'bit15-ev-decision-support')
+    dataset_id = os.environ.get('DATASET_ID', 'EV_Dataset')
+    tables = sys.argv[1:] or [os.environ.get('MODEL_TABLE_ID', 'Model')]
+    directory = os.environ.get('LOCAL_DATA_DIR', 'data')
+    os.makedirs(directory, exist_ok=True)
+
+    source = BigQuerySource(project_id, dataset_id, os.environ.get('BQ_CREDENTIALS_FILE', DEFAULT_CREDENTIALS_FILE))
+    for table in tables:
+        df = source.load_table(table)
+        path = os.path.join(directory, f"{table}.parquet")
+        tmp_path = path + '.tmp'
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+        print(f"{table}: {len(df)} แถว -> {path}")
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""คำนวณน้ำหนัก AHP และ consistency ratio แบบเร็ว (ผลลัพธ์เทียบเท่า ahpy.Compare)
+
+- ถ้า matrix เปรียบเทียบคู่สร้างจากอัตราส่วนของเวกเตอร์น้ำหนักเดียว (a_ij = w_i / w_j)
+  matrix นั้น consistent เสมอ: eigenvector หลักคือ w ที่ normalize แล้ว และ CR = 0
+- ใช้ eigenvector solver เฉพาะ matrix ที่ผู้ใช้กรอกเองและไม่ consistent
+"""
+import bisect
+import functools
+import math
+
+import numpy as np
+
+# random index ของ Donegan & Dodd (ค่าเดียวกับ random_index='dd' ใน ahpy)
+RANDOM_INDEX = {3: 0.4914, 4: 0.8286, 5: 1.0591, 6: 1.1797, 7: 1.2519,
+                8: 1.3171, 9: 1.3733, 10: 1.4055, 11: 1.4213, 12: 1.4497,
+                13: 1.4643, 14: 1.4822, 15: 1.4969, 16: 1.5078, 17: 1.5153,
+                18: 1.5262, 19: 1.5313, 20: 1.5371, 25: 1.5619, 30: 1.5772,
+                40: 1.5976, 50: 1.6102, 60: 1.6178, 70: 1.6237, 80: 1.6277,
+                90: 1.6213, 100: 1.6339}
+
+# ความละเอียดของ key ที่ใช้ memoize (สัดส่วนน้ำหนัก)
+QUANTIZE_DECIMALS = 6
+
+
+def random_index(size):
+    """random index ของ matrix ขนาด size (ประมาณค่าเชิงเส้นระหว่างค่าที่มีในตาราง)"""
+    if size in RANDOM_INDEX:
+        return RANDOM_INDEX[size]
+    sizes = tuple(RANDOM_INDEX)
+    smaller = sizes[bisect.bisect_left(sizes, size) - 1]
+    larger = sizes[bisect.bisect_right(sizes, size)]
+    estimate = (RANDOM_INDEX[larger] - RANDOM_INDEX[smaller]) / (larger - smaller)
+    return estimate * (size - smaller) + RANDOM_INDEX[smaller]
+
+
+def ahp_weights(weights, precision=4):
+    """น้ำหนัก AHP จาก dict น้ำหนักของแต่ละเกณฑ์ (คืน (dict น้ำหนัก, consistency_ratio))
+
+    เทียบเท่ากับ Compare(name, {(k1, k2): w[k1] / w[k2], ...}).target_weights / consistency_ratio
+    แต่ dict ที่คืนเรียงตามลำดับเกณฑ์เดิม ไม่ใช่เรียงตามค่าน้ำหนัก
+    """
+    keys = tuple(weights)
+    values = [float(weights[k]) for k in keys]
+    if not all(v > 0 and math.isfinite(v) for v in values):
+        raise ValueError("ค่าน้ำหนักต้องเป็นจำนวนบวก")
+    total = sum(values)
+    quantized = tuple(round(v / total, QUANTIZE_DECIMALS) for v in values)
+    return dict(zip(keys, _ahp_weights_quantized(quantized, precision))), 0.0
+
+
+@functools.lru_cache(maxsize=4096)
+def _ahp_weights_quantized(quantized, precision):
+    total = sum(quantized)
+    return tuple(round(v / total, precision) for v in quantized)
+
+
+def ahp_cache_info():
+    """สถิติ hit/miss ของ cache น้ำหนัก AHP ใน process นี้ (functools cache_info)"""
+    return _ahp_weights_quantized.cache_info()
+
+
+def matrix_from_comparisons(comparisons):
+    """สร้าง matrix เปรียบเทียบคู่แบบ reciprocal จาก dict {(a, b): ค่า} (คืน (elements, matrix))"""
+    elements = []
+    for key in comparisons:
+        for element in key:
+            if element not in elements:
+                elements.append(element)
+    position = {element: i for i, element in enumerate(elements)}
+    matrix = np.ones((len(elements), len(elements)))
+    for (a, b), value in comparisons.items():
+        matrix[position[a], position[b]] = float(value)
+        matrix[position[b], position[a]] = 1.0 / float(value)
+    return elements, matrix
+
+
+def is_consistent(matrix, rtol=1e-9):
+    """ตรวจว่า matrix consistent สมบูรณ์ (a_ij = w_i / w_j) หรือไม่ คืน w หากใช่"""
+    # ถ้า consistent ทุกคอลัมน์จะเป็นสัดส่วนเดียวกัน และคอลัมน์แรก normalize แล้วคือ w
+    w = matrix[:, 0] / matrix[:, 0].sum()
+    if np.allclose(matrix, np.outer(w, 1.0 / w), rtol=rtol, atol=0):
+        return w
+    return None
+
+
+def comparison_weights(comparisons, precision=4):
+    """น้ำหนักและ consistency ratio จาก matrix เปรียบเทียบคู่ที่ผู้ใช้กรอก (ครบทุกคู่)"""
+    elements, matrix = matrix_from_comparisons(comparisons)
+    n = len(elements)
+    if len(comparisons) < n * (n - 1) // 2:
+        raise ValueError("ต้องมีค่าเปรียบเทียบครบทุกคู่")
+    w = is_consistent(matrix)
+    if w is not None:
+        return dict(zip(elements, (float(v) for v in w.round(precision)))), 0.0
+
+    eigenvalues, eigenvectors = np.linalg.eig(matrix)
+    principal = int(np.argmax(np.real(eigenvalues)))
+    vector = np.abs(np.real(eigenvectors[:, principal]))
+    w = vector / vector.sum()
+    if n < 3:
+        consistency_ratio = 0.0
+    else:
+        lambda_max = np.real(eigenvalues[principal])
+        consistency_index = (lambda_max - n) / (n - 1)
+        consistency_ratio = float(abs(round(consistency_index / random_index(n), precision)))
+    return dict(zip(elements, (float(v) for v in w.round(precision)))), consistency_ratio
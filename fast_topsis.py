@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""TOPSIS แบบ vectorized ด้วย NumPy โดยคำนวณ normalized matrix ล่วงหน้าครั้งเดียวต่อ catalog version"""
+import warnings
+
+import numpy as np
+
+# เกณฑ์ที่ใช้จัดอันดับ (ชื่อคอลัมน์หลังทำความสะอาด) และเกณฑ์ที่ยิ่งน้อยยิ่งดี (Objective.MIN)
+CRITERIA = ['range', 'topspeed', 'accelarate', 'efficiency', 'battery', 'estimatedthbvalue', 'fastcharge']
+COST_CRITERIA = ('accelarate', 'estimatedthbvalue', 'efficiency')
+
+
+class TopsisEngine:
+    """คำนวณคะแนน TOPSIS (closeness / similarity) ของทุกทางเลือกในแคตตาล็อก
+
+    ค่าที่ไม่ขึ้นกับน้ำหนักถูกคำนวณไว้ตอนสร้าง:
+    - normalized matrix แบบ vector normalization (x / ||x|| รายคอลัมน์)
+    - ideal / anti-ideal ต่อคอลัมน์ตามทิศทาง MIN/MAX
+    - ผลต่างกำลังสองจาก ideal และ anti-ideal ของทุกแถว
+
+    เนื่องจากน้ำหนักเป็นบวก ideal ของ matrix ที่คูณน้ำหนักแล้วคือ w * ideal ของ normalized matrix
+    ดังนั้นระยะทางจึงเป็นเพียง sqrt(D @ w**2) ต่อ request
+
+    ค่า NaN ไม่ถูกนับใน norm และ ideal จึงมีผลเฉพาะแถวของตัวเอง (คะแนนเป็น NaN) คอลัมน์ที่ norm เป็น 0
+    ไม่มีผลต่อระยะทาง และแถวที่ตรงกับทั้ง ideal และ anti-ideal (เช่นแคตตาล็อกมีแถวเดียว) ได้คะแนน NaN
+    """
+
+    def __init__(self, matrix, criteria=None, cost_criteria=COST_CRITERIA):
+        self.criteria = list(criteria or CRITERIA)
+        matrix = np.asarray(matrix, dtype=float)
+        norms = np.sqrt(np.nansum(matrix ** 2, axis=0))
+        norms[norms == 0] = 1.0
+        self.normalized = matrix / norms
+        self.is_benefit = np.array([c not in cost_criteria for c in self.criteria])
+        with warnings.catch_warnings():
+            # คอลัมน์ที่เป็น NaN ทั้งคอลัมน์ได้ ideal เป็น NaN (ทุกแถวได้คะแนน NaN)
+            warnings.simplefilter('ignore', RuntimeWarning)
+            col_max = np.nanmax(self.normalized, axis=0)
+            col_min = np.nanmin(self.normalized, axis=0)
+        self.ideal = np.where(self.is_benefit, col_max, col_min)
+        self.anti_ideal = np.where(self.is_benefit, col_min, col_max)
+        self._sq_to_ideal = (self.normalized - self.ideal) ** 2
+        self._sq_to_anti_ideal = (self.normalized - self.anti_ideal) ** 2
+
+    # array ที่คำนวณตอนสร้าง (ชื่อ attribute) ซึ่งเพียงพอสำหรับสร้าง engine ใหม่ผ่าน from_arrays
+    _ARRAY_ATTRIBUTES = ('normalized', 'is_benefit', 'ideal', 'anti_ideal', '_sq_to_ideal', '_sq_to_anti_ideal')
+
+    @classmethod
+    def array_names(cls):
+        return [name.lstrip('_') for name in cls._ARRAY_ATTRIBUTES]
+
+    def to_arrays(self):
+        """array ที่คำนวณไว้ทั้งหมด (ชื่อ -> ndarray) สำหรับเผยแพร่ให้ process อื่นใช้ผ่าน from_arrays"""
+        return {name.lstrip('_'): getattr(self, name) for name in self._ARRAY_ATTRIBUTES}
+
+    @classmethod
+    def from_arrays(cls, arrays, criteria=None):
+        """สร้าง engine จาก array ที่คำนวณไว้แล้ว (เช่น view แบบ read-only ของไฟล์ที่ map ไว้) โดยไม่คำนวณหรือคัดลอก"""
+        engine = cls.__new__(cls)
+        engine.criteria = list(criteria or CRITERIA)
+        for name in cls._ARRAY_ATTRIBUTES:
+            setattr(engine, name, arrays[name.lstrip('_')])
+        return engine
+
+    @classmethod
+    def from_dataframe(cls, df, criteria=None, cost_criteria=COST_CRITERIA):
+        criteria = list(criteria or CRITERIA)
+        return cls(df[criteria].to_numpy(dtype=float), criteria, cost_criteria)
+
+    def __len__(self):
+        return self.normalized.shape[0]
+
+    def weight_vector(self, weights):
+        """แปลงน้ำหนัก (dict ตามชื่อเกณฑ์ หรือ sequence ตามลำดับ criteria) เป็น array"""
+        if isinstance(weights, dict):
+            weights = [weights[c] for c in self.criteria]
+        return np.asarray(weights, dtype=float)
+
+    def score(self, weights, rows=None):
+        """คะแนน TOPSIS ของแถวที่ระบุ (ทั้งแคตตาล็อกหาก rows เป็น None)"""
+        w2 = self.weight_vector(weights) ** 2
+        sq_ideal = self._sq_to_ideal if rows is None else self._sq_to_ideal[rows]
+        sq_anti = self._sq_to_anti_ideal if rows is None else self._sq_to_anti_ideal[rows]
+        d_better = np.sqrt(sq_ideal @ w2)
+        d_worst = np.sqrt(sq_anti @ w2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return d_worst / (d_better + d_worst)
+
+    def score_many(self, weight_matrix, rows=None):
+        """คะแนน TOPSIS ของน้ำหนัก N ชุดพร้อมกัน (weight_matrix ขนาด N x เกณฑ์) คืน matrix N x แถว"""
+        w2 = np.asarray(weight_matrix, dtype=float) ** 2
+        sq_ideal = self._sq_to_ideal if rows is None else self._sq_to_ideal[rows]
+        sq_anti = self._sq_to_anti_ideal if rows is None else self._sq_to_anti_ideal[rows]
+        d_better = np.sqrt(w2 @ sq_ideal.T)
+        d_worst = np.sqrt(w2 @ sq_anti.T)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return d_worst / (d_better + d_worst)
+
+    def top_k(self, weights, k=10, rows=None):
+        """คืน (ตำแหน่งแถว, คะแนน) ของ k อันดับแรกเรียงจากมากไปน้อย"""
+        scores = self.score(weights, rows)
+        order = np.argsort(-scores, kind='stable')[:k]
+        positions = order if rows is None else np.asarray(rows)[order]
+        return positions, scores[order]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""ค่าตั้งของ gunicorn: gunicorn -c gunicorn.conf.py bit15_model_app:app
+
+- preload_app (ค่าเริ่มต้นเปิด, ปิดด้วย GUNICORN_PRELOAD=0): master import แอปและเรียก warmup() ครั้งเดียว
+  แล้ว gc.freeze() ก่อน fork ทำให้ worker ใช้แคตตาล็อก โมเดล และ TOPSIS matrix ร่วมกันแบบ copy-on-write
+- SHARED_CATALOG_DIR (เช่น /dev/shm/ev-catalog): แคตตาล็อกแต่ละ version ถูกเผยแพร่เป็นไฟล์ memory-mapped ครั้งเดียว
+  ทุก worker attach แบบ read-only และสลับ version ใหม่เองโดยไม่ต้อง restart (ดู shared_catalog.py)
+- post_fork: worker ทิ้ง connection ของ master แล้วเริ่ม thread เบื้องหลังของตัวเอง
+- SUBMIT_CLUSTER_TIMEOUT / SUBMIT_CATALOG_TIMEOUT: เวลารอสูงสุดของงานที่ /handleSubmit ทำพร้อมกันใน call_pool
+- HYBRID_CLUSTER_SHARE (ค่าเริ่มต้น 0): สัดส่วนค่าเฉลี่ยของ cluster ใน hybrid weights เมื่อเป็น 0 worker ไม่ seed/reconcile ค่าเฉลี่ยเลย
+- PROFILER_ENABLED=1: kill -USR2 <pid ของ worker> สลับเปิด/ปิด sampling profiler เฉพาะ worker นั้น
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') not in ('0', 'false', 'False')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import bit15_model_app
+
+    try:
+        bit15_model_app.warmup()
+    except Exception as e:
+        # warmup ไม่สำเร็จ worker จะโหลดเองตอน request แรก
+        server.log.warning(f"warmup ไม่สำเร็จ: {str(e)}")
+    # ย้าย object ที่มีอยู่ออกจากการสแกนของ GC เพื่อไม่ให้ refcount/GC ใน worker แตะหน้า memory ที่แชร์ไว้
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import bit15_model_app
+
+    bit15_model_app.after_fork()
+
+
+def post_worker_init(worker):
+    # ติดตั้งหลัง worker ตั้งค่า signal ของตัวเองแล้ว (ก่อนหน้านั้น SIGUSR2 ถูก reset เป็นค่าเริ่มต้น)
+    import bit15_model_app
+
+    if bit15_model_app.PROFILER_ENABLED:
+        bit15_model_app.profiler.install_signal_toggle()
+
+
+def worker_exit(server, worker):
+    import bit15_model_app
+
+    bit15_model_app.call_pool.shutdown()
+    bit15_model_app.write_sink.close()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""clustering ผู้ใช้แบบ incremental: encoder / StandardScaler / MiniBatchKMeans ที่ partial_fit ทีละ chunk
+
+ต้นทุนการ train จำกัดด้วยขนาด sample ไม่ใช่จำนวนผู้ใช้ทั้งหมด:
+- อ่านตารางแบบ stream ทีละ chunk ไม่ต้องถือทั้งตารางในหน่วยความจำ
+- เลือกจำนวน cluster จาก reservoir sample ขนาดคงที่ และ silhouette แบบสุ่มตัวอย่าง (ไม่ใช่ O(n²) ของทั้งตาราง)
+- อัปเดตโมเดลเดิมด้วยเฉพาะแถวใหม่ โดย cluster id เดิมยังมีความหมายเหมือนเดิม
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from cluster_weights import aggregate_cluster_weights, merge_cluster_weights
+
+SELECTION_SAMPLE = int(os.environ.get('CLUSTER_SELECTION_SAMPLE', 20000))
+SILHOUETTE_SAMPLE = int(os.environ.get('CLUSTER_SILHOUETTE_SAMPLE', 5000))
+MAX_CLUSTERS = 10
+MIN_ROWS_FOR_SELECTION = 10
+
+
+# key ของค่าว่างทุกแบบ (None, NaN, pd.NA, NaT)
+MISSING_CATEGORY = '<missing>'
+# ข้อความที่ encoder รุ่นก่อน (str(value)) ได้จากค่าว่าง ใช้แปลง artifact เดิม
+_LEGACY_MISSING = ('None', 'nan', '<NA>', 'NaT')
+
+
+def category_key(value):
+    """key ของหมวดหมู่: ตัวเลขที่มีค่าเท่ากันเป็นหมวดเดียวกัน (5, 5.0, '5', np.int64(5)) และค่าว่างทุกแบบเป็น MISSING_CATEGORY"""
+    if value is None or type(value).__name__ in ('NAType', 'NaTType'):
+        return MISSING_CATEGORY
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            return text
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float)):
+        if math.isnan(value):
+            return MISSING_CATEGORY
+        if math.isfinite(value) and value == int(value):
+            return str(int(value))
+        return repr(float(value))
+    return str(value)
+
+
+class IncrementalOrdinalEncoder:
+    """ordinal encoder ที่เพิ่มหมวดหมู่ใหม่ได้ทีละ chunk
+
+    รหัสของหมวดหมู่ที่เคยเห็นแล้วไม่เปลี่ยน (หมวดหมู่ใหม่ได้รหัสต่อท้าย) จึง partial_fit ต่อได้โดยไม่ทำให้
+    centroid เดิมผิดความหมาย ค่าที่ไม่เคยเห็นได้รหัส -1 เหมือน handle_unknown='use_encoded_value'
+    ค่าถูกเทียบด้วย category_key (5, 5.0 และ '5' เป็นหมวดเดียวกัน ค่าว่างทุกแบบเป็นหมวดเดียวกัน)
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.categories_ = [{} for _ in self.columns]
+        self.normalized_keys_ = True
+
+    def __setstate__(self, state):
+        # artifact ที่บันทึกจากรุ่นที่ใช้ str(value) เป็น key: แปลง key เดิมด้วย category_key
+        # (key ที่กลายเป็นหมวดเดียวกันใช้รหัสที่ได้ก่อน เพื่อให้ centroid เดิมยังมีความหมาย)
+        self.__dict__.update(state)
+        if not state.get('normalized_keys_'):
+            self.categories_ = [self._normalize_legacy(mapping) for mapping in self.categories_]
+        self.normalized_keys_ = True
+
+    @staticmethod
+    def _normalize_legacy(mapping):
+        normalized = {}
+        for value, code in sorted(mapping.items(), key=lambda item: item[1]):
+            key = MISSING_CATEGORY if value in _LEGACY_MISSING else category_key(value)
+            normalized.setdefault(key, code)
+        return normalized
+
+    @staticmethod
+    def _factorize(series):
+        """(รหัสต่อแถว, key ของค่าที่ไม่ซ้ำ) โดยค่าว่างได้รหัส -1"""
+        labels, uniques = pd.factorize(series, use_na_sentinel=True)
+        return labels, [category_key(value) for value in uniques]
+
+    def partial_fit(self, df):
+        for mapping, column in zip(self.categories_, self.columns):
+            labels, keys = self._factorize(df[column])
+            if (labels < 0).any():
+                keys.append(MISSING_CATEGORY)
+            for key in keys:
+                if key not in mapping:
+                    mapping[key] = len(mapping)
+        return self
+
+    def transform(self, df):
+        encoded = np.empty((len(df), len(self.columns)), dtype=float)
+        for j, (mapping, column) in enumerate(zip(self.categories_, self.columns)):
+            labels, keys = self._factorize(df[column])
+            # ตำแหน่งสุดท้ายของตารางคือรหัสของค่าว่าง (labels = -1)
+            table = np.array([mapping.get(key, -1) for key in keys] + [mapping.get(MISSING_CATEGORY, -1)], dtype=float)
+            encoded[:, j] = table[labels]
+        return encoded
+
+
+class IncrementalClusterPipeline:
+    """encoder -> scaler -> MiniBatchKMeans ที่ fit ทีละ chunk ได้ (ใช้แทน sklearn Pipeline ใน ClusterModel)"""
+
+    def __init__(self, columns, kmeans=None):
+        self.encoder = IncrementalOrdinalEncoder(columns)
+        self.scaler = StandardScaler()
+        self.kmeans = kmeans
+
+    @property
+    def named_steps(self):
+        return {'preprocessor': self.encoder, 'scaler': self.scaler, 'cluster': self.kmeans}
+
+    def partial_fit_preprocessing(self, df):
+        """อัปเดตหมวดหมู่ของ encoder และสถิติ mean/var ของ scaler ด้วย chunk นี้ คืนค่าที่ encode แล้ว"""
+        self.encoder.partial_fit(df)
+        encoded = self.encoder.transform(df)
+        self.scaler.partial_fit(encoded)
+        return encoded
+
+    def transform(self, df):
+        return self.scaler.transform(self.encoder.transform(df))
+
+    def partial_fit(self, df):
+        """อัปเดตทุกขั้นด้วย chunk ใหม่ (ต้องมี kmeans ที่ fit แล้ว)"""
+        self.partial_fit_preprocessing(df)
+        self.kmeans.partial_fit(self.transform(df))
+        return self
+
+    def predict(self, df):
+        return self.kmeans.predict(self.transform(df))
+
+
+def reservoir_update(sample, seen, rows, size, rng):
+    """เพิ่ม rows ลง reservoir sample ขนาดไม่เกิน size (algorithm R แบบทีละ chunk) คืน (sample, seen ใหม่)"""
+    if sample is None:
+        sample = np.empty((0, rows.shape[1]), dtype=rows.dtype)
+    room = max(0, size - len(sample))
+    if room:
+        sample = np.vstack([sample, rows[:room]])
+    rest = rows[room:]
+    if len(rest):
+        positions = seen + room + np.arange(len(rest))
+        slots = (rng.random(len(rest)) * (positions + 1)).astype(np.int64)
+        keep = slots < size
+        sample[slots[keep]] = rest[keep]
+    return sample, seen + len(rows)
+
+
+def _kmeans(n_clusters, batch_size, random_state):
+    return MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=random_state)
+
+
+def select_kmeans(sample, batch_size=1024, random_state=0, silhouette_sample=None):
+    """เลือกจำนวน cluster จาก sample ด้วย silhouette แบบสุ่มตัวอย่าง คืน (MiniBatchKMeans ที่ fit แล้ว, scores)
+
+    กติกาเดียวกับโหมด batch: 2 cluster เมื่อข้อมูลน้อยกว่า 10 แถว ไม่เช่นนั้นลอง k = 2..min(10, n // 2)
+    """
+    silhouette_sample = silhouette_sample or SILHOUETTE_SAMPLE
+    n = len(sample)
+    if n < MIN_ROWS_FOR_SELECTION:
+        return _kmeans(2, batch_size, random_state).fit(sample), {}
+    best, best_score, scores = None, -np.inf, {}
+    for k in range(2, min(MAX_CLUSTERS, n // 2) + 1):
+        kmeans = _kmeans(k, batch_size, random_state).fit(sample)
+        try:
+            score = silhouette_score(sample, kmeans.labels_, sample_size=min(silhouette_sample, n),
+                                     random_state=random_state)
+        except ValueError:
+            # ได้ cluster เดียว (ข้อมูลซ้ำกันมาก) ถือว่าแย่ที่สุด
+            score = -1.0
+        scores[k] = float(score)
+        if score > best_score:
+            best, best_score = kmeans, score
+    return best, scores
+
+
+def fit_streaming(read_chunks, columns, aggregate_weights=False, sample_size=None, batch_size=1024, random_state=0):
+    """train โมเดลใหม่จาก read_chunks() (ฟังก์ชันที่คืน iterator ของ DataFrame เรียกได้หลายครั้ง)
+
+    รอบแรก: อัปเดต encoder/scaler และเก็บ reservoir sample; เลือก k จาก sample
+    รอบสอง: partial_fit MiniBatchKMeans ทีละ chunk แล้วสรุปน้ำหนักต่อ cluster (เมื่อ aggregate_weights)
+    คืน (pipeline, จำนวนแถว, cluster_weights, silhouette scores) หรือ None หากข้อมูลน้อยกว่า 2 แถว
+    """
+    rng = np.random.default_rng(random_state)
+    pipeline = IncrementalClusterPipeline(columns)
+    sample, seen = None, 0
+    for chunk in read_chunks():
+        if len(chunk):
+            encoded = pipeline.partial_fit_preprocessing(chunk)
+            sample, seen = reservoir_update(sample, seen, encoded, sample_size or SELECTION_SAMPLE, rng)
+    if seen < 2:
+        return None
+    pipeline.kmeans, scores = select_kmeans(pipeline.scaler.transform(sample), batch_size, random_state)
+
+    cluster_weights = {}
+    for chunk in read_chunks():
+        if not len(chunk):
+            continue
+        features = pipeline.transform(chunk)
+        pipeline.kmeans.partial_fit(features)
+        if aggregate_weights:
+            labels = pipeline.kmeans.predict(features)
+            cluster_weights = merge_cluster_weights(cluster_weights, aggregate_cluster_weights(labels, chunk))
+    return pipeline, seen, cluster_weights, scores
+
+
+def update_streaming(pipeline, chunks, cluster_weights=None, aggregate_weights=False):
+    """partial_fit โมเดลเดิมด้วยแถวใหม่ (แก้ไข pipeline โดยตรง) คืน (จำนวนแถวใหม่, cluster_weights ที่รวมแล้ว)"""
+    cluster_weights = cluster_weights or {}
+    n_rows = 0
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        pipeline.partial_fit(chunk)
+        if aggregate_weights:
+            cluster_weights = merge_cluster_weights(
+                cluster_weights, aggregate_cluster_weights(pipeline.predict(chunk), chunk))
+        n_rows += len(chunk)
+    return n_rows, cluster_weights
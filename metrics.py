@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""metric แบบเบาในหน่วยความจำ (histogram / counter / gauge) และ export เป็น Prometheus text format
+
+ค่าทั้งหมดเป็นของ process เดียว: เมื่อรันหลาย worker ให้ scrape แยกแต่ละ worker หรือดูเป็นค่าตัวอย่างต่อ worker
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# ขอบบนของ bucket (วินาที) ครอบคลุมตั้งแต่ขั้นตอน NumPy ระดับ 10 µs ถึง query ของ warehouse หลายวินาที
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """histogram แบบ cumulative bucket ต่อชุด label"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        """จับเวลาช่วงโค้ดใน with แล้วบันทึกลง histogram (บันทึกแม้เกิด exception)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def collect(self):
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = []
+        for labels, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Counter:
+    """ตัวนับที่เพิ่มขึ้นอย่างเดียวต่อชุด label"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+
+class Gauge:
+    """ค่าที่อ่านจาก callback ตอน scrape (เช่นความยาวคิว) callback คืนตัวเลข หรือ dict {label tuple: ตัวเลข}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        _register(self)
+
+    def collect(self):
+        value = self.callback()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+                for labels, v in sorted(value.items()) if v is not None]
+
+
+class CallbackCounter(Gauge):
+    """counter ที่อ่านค่าสะสมจาก callback ตอน scrape (ค่าที่ object อื่นนับไว้เอง เช่นสถิติ hit/miss ของ cache)
+
+    callback ต้องคืนค่าที่เพิ่มขึ้นอย่างเดียวตลอดอายุ process
+    """
+
+    kind = 'counter'
+
+
+STAGE_SECONDS = Histogram('ev_stage_seconds', 'เวลาของแต่ละขั้นตอนใน request', ['stage'])
+DATA_SOURCE_SECONDS = Histogram('ev_data_source_seconds', 'เวลาของการเรียกแหล่งข้อมูล (BigQuery / local)',
+                                ['operation', 'table'])
+REQUEST_SECONDS = Histogram('ev_request_seconds', 'เวลาตอบ request ทั้งหมดต่อ endpoint', ['endpoint', 'status'])
+PROCESS_INFO = Gauge('ev_process_info', 'pid ของ worker ที่ตอบ scrape นี้', lambda: {(str(os.getpid()),): 1}, ['pid'])
+
+
+def span(stage):
+    """จับเวลาขั้นตอนหนึ่งของ request: with span('topsis'): ..."""
+    return STAGE_SECONDS.time(stage)
+
+
+def render():
+    """metric ทั้งหมดของ process นี้ในรูปแบบ Prometheus text exposition (version 0.0.4)"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            samples = metric.collect()
+        except Exception as e:
+            samples = []
+            lines.append(f"# {metric.name} collect error: {str(e)}")
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
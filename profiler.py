@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""sampling profiler แบบเบา: สุ่มอ่าน stack ของทุก thread เป็นระยะแล้วนับเป็น collapsed stack (ใช้กับ flamegraph.pl / speedscope)
+
+เปิด/ปิดได้ขณะรันต่อ process เดียว (เช่นส่ง SIGUSR2 ไปยัง pid ของ worker ที่ต้องการ) ไม่มี overhead เมื่อปิดอยู่
+"""
+import os
+import signal
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """เก็บตัวอย่าง stack ทุก interval วินาทีใน thread เบื้องหลังจนกว่าจะ stop()"""
+
+    def __init__(self, interval=None, output_dir=None):
+        self.interval = float(interval if interval is not None else os.environ.get('PROFILER_INTERVAL', 0.005))
+        self.output_dir = output_dir or os.environ.get('PROFILER_OUTPUT_DIR', 'artifacts/profiles')
+        self._counts = {}
+        self._samples = 0
+        self._started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """เริ่มเก็บตัวอย่างใหม่ (ล้างผลเดิม) คืน False หากกำลังทำงานอยู่แล้ว"""
+        with self._lock:
+            if self.running:
+                return False
+            self._counts = {}
+            self._samples = 0
+            self._started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """หยุดเก็บตัวอย่าง คืนผลแบบ collapsed stack"""
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None:
+            thread.join()
+        return self.collapsed()
+
+    def toggle(self):
+        """สลับเปิด/ปิด เมื่อปิดจะเขียนผลลงไฟล์และคืน path (คืน None ตอนเปิด)"""
+        if not self.running:
+            self.start()
+            return None
+        self.stop()
+        return self.dump()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self._counts[key] = self._counts.get(key, 0) + 1
+            self._samples += 1
+
+    def collapsed(self):
+        """ผลลัพธ์แบบ 'frame;frame;frame จำนวน' ต่อบรรทัด เรียงจากมากไปน้อย"""
+        counts = dict(self._counts)
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+    def dump(self):
+        """เขียนผลลงไฟล์ <output_dir>/profile.<pid>.<เวลาเริ่ม>.txt แล้วคืน path"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile.{os.getpid()}.{int(self._started_at or time.time())}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed() + '\n')
+        return path
+
+    def install_signal_toggle(self, signum=signal.SIGUSR2):
+        """ให้ signal (ค่าเริ่มต้น SIGUSR2) สลับเปิด/ปิด profiler ของ process นี้ (ต้องเรียกจาก main thread)"""
+        def handler(signum, frame):
+            # ไม่ join thread ใน signal handler: ให้ thread อื่นหยุดและเขียนไฟล์แทน
+            threading.Thread(target=self.toggle, name='sampling-profiler-toggle', daemon=True).start()
+        signal.signal(signum, handler)
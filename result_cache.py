@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""cache ผลจัดอันดับ AHP-TOPSIS แบบ LRU + TTL โดย key จากน้ำหนักที่ quantize แล้ว ที่นั่ง และระบบขับเคลื่อน
+
+ผู้ใช้จำนวนมากเลือกน้ำหนักใกล้เคียงกันมาก เมื่อ normalize น้ำหนักแล้วปัดเศษ request เหล่านี้จะได้ key เดียวกัน
+และได้ผลลัพธ์ชุดเดียวกัน (คลาดเคลื่อนไม่เกินขั้นของการปัดเศษ) โดยไม่ต้องคำนวณ AHP/TOPSIS ซ้ำ
+key รวม catalog version และ version ของโมเดล clustering จึงไม่มีผลลัพธ์เก่าข้าม version
+
+ค่าเก็บเป็น JSON ทั้งใน process และใน backend ร่วม: ผู้เรียกได้สำเนาใหม่ทุกครั้ง (แก้ไขแล้วไม่กระทบ cache)
+และได้ชนิดข้อมูลเดียวกันไม่ว่าจะ hit จากชั้นไหน
+"""
+import collections
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from catalog_index import normalize_drive, normalize_seats
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_weights(weights, criteria, decimals):
+    """น้ำหนักตามลำดับ criteria หลัง normalize ให้รวมเป็น 1 แล้วปัดเศษ (raise หากน้ำหนักไม่ครบหรือรวมเป็น 0)"""
+    values = [float(weights[c]) for c in criteria]
+    total = sum(values)
+    if not total > 0:
+        raise ValueError("ผลรวมน้ำหนักต้องมากกว่า 0")
+    return tuple(round(v / total, decimals) for v in values)
+
+
+def make_result_key(weights, criteria, drive_config, seats, catalog_version, model_version, decimals):
+    return (catalog_version, model_version, normalize_seats(seats), normalize_drive(drive_config),
+            quantize_weights(weights, criteria, decimals))
+
+
+# key ของ object JSON ที่แทนค่าวันที่/เวลา
+_DATETIME_TAG = '$datetime'
+_DATE_TAG = '$date'
+
+
+def _plain(value):
+    """แปลงค่าที่ json ไม่รู้จักเป็นชนิดพื้นฐานของ Python (numpy scalar, Timestamp, NaT/NA)"""
+    if type(value).__name__ in ('NaTType', 'NAType'):
+        return None
+    if isinstance(value, datetime.datetime):
+        if hasattr(value, 'to_pydatetime'):
+            value = value.to_pydatetime()
+        return {_DATETIME_TAG: value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_DATE_TAG: value.isoformat()}
+    if hasattr(value, 'tolist'):
+        # numpy scalar / array
+        return value.tolist()
+    raise TypeError(f"cache ค่าชนิด {type(value).__name__} ไม่ได้")
+
+
+def _restore(obj):
+    if len(obj) == 1:
+        if _DATETIME_TAG in obj:
+            return datetime.datetime.fromisoformat(obj[_DATETIME_TAG])
+        if _DATE_TAG in obj:
+            return datetime.date.fromisoformat(obj[_DATE_TAG])
+    return obj
+
+
+def encode_value(value):
+    """ผลลัพธ์ -> JSON (วันที่/เวลาเก็บแบบมี tag เพื่อให้ decode_value คืนเป็น datetime เหมือนเดิม)"""
+    return json.dumps(value, default=_plain, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_value(raw):
+    """JSON จาก encode_value -> สำเนาใหม่ของผลลัพธ์ (ชนิดพื้นฐานของ Python และ datetime)"""
+    return json.loads(raw, object_hook=_restore)
+
+
+class RedisBackend:
+    """backend ที่ใช้ร่วมกันทุก worker ผ่าน Redis (ต้องติดตั้ง redis-py) เก็บ JSON จาก encode_value พร้อม TTL"""
+
+    def __init__(self, url, ttl, prefix='ev:result:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key):
+        return self.prefix + json.dumps(key, separators=(',', ':'))
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def set(self, key, raw):
+        self.client.set(self._key(key), raw, ex=max(1, int(self.ttl)))
+
+
+class ResultCache:
+    """LRU จำกัดจำนวน entry และอายุ (ttl วินาที) ใน process พร้อม backend ร่วม (ถ้ามี) เป็นชั้นที่สอง
+
+    ข้อผิดพลาดของ backend ร่วมไม่ทำให้ request ล้ม: ถือเป็น miss แล้วคำนวณเอง
+    """
+
+    def __init__(self, maxsize, ttl, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """คืนสำเนาของค่าที่ cache ไว้ หรือ None"""
+        now = time.monotonic()
+        raw = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, raw = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    raw = None
+                    del self._entries[key]
+                    self.expirations += 1
+        if raw is not None:
+            return decode_value(raw)
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(key)
+                value = None if raw is None else decode_value(raw)
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning("อ่าน result cache ร่วมไม่สำเร็จ: %s", e)
+                value = None
+            if value is not None:
+                self._store(key, raw)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        try:
+            raw = encode_value(value)
+        except (TypeError, ValueError) as e:
+            logger.warning("ไม่ cache ผลลัพธ์ที่แปลงเป็น JSON ไม่ได้: %s", e)
+            return
+        self._store(key, raw)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, raw)
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning("เขียน result cache ร่วมไม่สำเร็จ: %s", e)
+
+    def _store(self, key, raw):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, raw)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """ลบทุก entry ใน process (เช่นเมื่อ catalog หรือโมเดลเปลี่ยน version)"""
+        with self._lock:
+            self._entries.clear()
+
+
+def make_result_cache():
+    """สร้าง cache ตาม configuration (คืน None เมื่อ RESULT_CACHE_SIZE=0)
+
+    - RESULT_CACHE_SIZE: จำนวน entry สูงสุดต่อ process (ค่าเริ่มต้น 4096)
+    - RESULT_CACHE_TTL: อายุ entry เป็นวินาที (ค่าเริ่มต้น 600)
+    - RESULT_CACHE_REDIS_URL: ถ้ากำหนด ใช้ Redis เป็น cache ร่วมของทุก worker
+    """
+    maxsize = int(os.environ.get('RESULT_CACHE_SIZE', 4096))
+    if maxsize <= 0:
+        return None
+    ttl = float(os.environ.get('RESULT_CACHE_TTL', 600))
+    shared = None
+    redis_url = os.environ.get('RESULT_CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            shared = RedisBackend(redis_url, ttl)
+        except ImportError:
+            logger.warning("ไม่พบแพ็กเกจ redis ใช้ result cache เฉพาะใน process")
+    return ResultCache(maxsize, ttl, shared)
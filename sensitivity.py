@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""ความไวของอันดับต่อน้ำหนักแต่ละเกณฑ์ (rank stability) คำนวณทั้ง grid ในครั้งเดียวด้วย TopsisEngine.score_many"""
+import numpy as np
+
+
+def top_positions(scores, k):
+    """ตำแหน่ง k อันดับแรกของแต่ละแถวใน matrix คะแนน เรียงจากมากไปน้อย (NaN อยู่ท้ายสุด)
+
+    k ที่ใช้จริงมีค่าน้อย (top 3) การหา argmax ทีละอันดับจึงเร็วกว่า argpartition ทั้งแถวราวสิบเท่า
+    """
+    keys = np.where(np.isnan(scores), np.finfo(float).min, scores)
+    k = min(k, keys.shape[1])
+    positions = np.empty((len(keys), k), dtype=np.intp)
+    rows = np.arange(len(keys))
+    for i in range(k):
+        positions[:, i] = keys.argmax(axis=1)
+        keys[rows, positions[:, i]] = -np.inf
+    return positions
+
+
+def rank_stability(engine, base, to_criteria_weights, rows=None, top=3, points=41, limit=None):
+    """ช่วงของน้ำหนักแต่ละเกณฑ์ที่ top อันดับแรกยังเหมือนเดิมทั้งชุดและลำดับ เมื่อปรับทีละเกณฑ์ (เกณฑ์อื่นคงเดิม)
+
+    - base: น้ำหนักตั้งต้นตามลำดับ engine.criteria ในหน่วยที่ผู้ใช้ปรับ
+    - to_criteria_weights: แปลง matrix น้ำหนักในหน่วยของผู้ใช้ (แถวละชุด) เป็นน้ำหนักเกณฑ์ของ TOPSIS
+    - ตรวจค่า 0..limit (ค่าเริ่มต้นคือผลรวมของ base) จำนวน points จุดต่อเกณฑ์
+
+    คืน (lower, upper) ตามลำดับเกณฑ์: ขอบของช่วงต่อเนื่องรอบค่าตั้งต้นที่อันดับไม่เปลี่ยน
+    (ละเอียดเท่าระยะห่างของ grid; upper เท่ากับ limit หมายถึงไม่เปลี่ยนตลอดช่วงที่ตรวจ)
+    """
+    base = np.asarray(base, dtype=float)
+    n_criteria = len(base)
+    limit = float(limit if limit is not None else base.sum())
+    grid = np.linspace(0.0, limit, points)
+
+    # trial[j, p] = base ที่เปลี่ยนเฉพาะเกณฑ์ j เป็น grid[p]; แถวแรกของ matrix คือ base เอง
+    trial = np.repeat(base[None, None, :], n_criteria * points, axis=0).reshape(n_criteria, points, n_criteria)
+    criteria = np.arange(n_criteria)
+    trial[criteria, :, criteria] = grid
+    weights = to_criteria_weights(np.vstack([base[None, :], trial.reshape(-1, n_criteria)]))
+    tops = top_positions(engine.score_many(weights, rows), top)
+    same = (tops[1:] == tops[0]).all(axis=1).reshape(n_criteria, points)
+
+    lower = np.empty(n_criteria)
+    upper = np.empty(n_criteria)
+    for j in range(n_criteria):
+        below = np.flatnonzero(grid <= base[j])
+        changed = below[~same[j, below]]
+        if len(changed) == 0:
+            lower[j] = 0.0
+        else:
+            lower[j] = min(grid[changed[-1] + 1], base[j]) if changed[-1] + 1 < points else base[j]
+        above = np.flatnonzero(grid >= base[j])
+        changed = above[~same[j, above]]
+        if len(changed) == 0:
+            upper[j] = max(limit, base[j])
+        else:
+            upper[j] = max(grid[changed[0] - 1], base[j]) if changed[0] > 0 else base[j]
+    return lower, upper
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""แคตตาล็อกที่เผยแพร่ครั้งเดียวต่อ version เป็นไฟล์ memory-mapped เพื่อให้ทุก worker ใช้หน่วยความจำชุดเดียวกัน
+
+โครงสร้างใน directory (แนะนำ tmpfs เช่น /dev/shm/ev-catalog):
+    <version>/manifest.json        version, marker, จำนวนแถว, ลำดับคอลัมน์ และ criteria
+    <version>/topsis_<ชื่อ>.npy    array ของ TopsisEngine (normalized matrix, ผลต่างกำลังสองจาก ideal/anti-ideal ฯลฯ)
+    <version>/numeric.npy          คอลัมน์ตัวเลขทั้งหมดเป็น structured array หนึ่งก้อน
+    <version>/text.npy             คอลัมน์ข้อความของแต่ละแถวต่อกันเป็น UTF-8 (แยกคอลัมน์ด้วย \\x1f)
+    <version>/text_offsets.npy     ตำแหน่งเริ่มของข้อความแต่ละแถวใน text.npy
+    CURRENT                        pointer ไปยัง version ปัจจุบันพร้อม marker และเวลาเผยแพร่ (เขียนไฟล์ชั่วคราวแล้ว os.replace)
+
+worker เปิดไฟล์แบบ read-only ด้วย np.load(mmap_mode='r') หน้า memory จึงเป็น page cache ที่ใช้ร่วมกัน
+ไม่ใช่ของแต่ละ worker และการสลับ version คือการอ่าน pointer ใหม่โดยไม่ต้อง restart worker
+มีเพียง process ที่ถือ file lock เท่านั้นที่โหลดจากแหล่งข้อมูลและเผยแพร่ process อื่น attach ไฟล์เดิม
+"""
+import fcntl
+import functools
+import json
+import logging
+import operator
+import os
+import shutil
+import time
+
+import numpy as np
+
+from catalog_cache import compute_catalog_version
+from fast_topsis import CRITERIA, TopsisEngine
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+MANIFEST_FILE = 'manifest.json'
+TEXT_SEPARATOR = '\x1f'
+TEXT_NULL = '\x00'
+
+
+def _marker_key(marker):
+    """marker ในรูปที่เก็บใน pointer ได้ (เทียบเป็นข้อความ)"""
+    return None if marker is None else str(marker)
+
+
+def _load_array(path):
+    try:
+        # view แบบ ndarray ธรรมดาของ buffer เดิม (np.memmap มี overhead ทุกครั้งที่ index)
+        return np.load(path, mmap_mode='r').view(np.ndarray)
+    except ValueError:
+        # mmap ไฟล์ที่ไม่มีข้อมูล (array ขนาด 0) ไม่ได้
+        return np.load(path)
+
+
+# int64 ของ NaT ใน datetime64[ns]
+_NAT = np.iinfo(np.int64).min
+
+
+def _numeric_values(series):
+    if series.dtype.kind == 'M':
+        # datetime เก็บเป็น ns (UTC ถ้ามี timezone) แบบ int64
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        return series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    dtype = getattr(series.dtype, 'numpy_dtype', series.dtype)
+    if dtype.kind == 'f' or series.hasnans:
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    return series.to_numpy(dtype=dtype)
+
+
+def _column_types(df, numeric_columns):
+    """ชนิดของคอลัมน์ตัวเลขที่ต้องแปลงกลับตอนอ่าน ให้ได้ค่าเหมือน catalog_records(df)
+
+    - {'datetime': timezone หรือ None}: เก็บเป็น int64 ns -> Timestamp (NaT -> None)
+    - {'nullable': 'i' / 'u' / 'b'}: คอลัมน์ nullable ที่มีค่าว่างเก็บเป็น float -> int / bool (NaN -> None)
+    - {'nullable': 'f'}: คอลัมน์ Float64 แบบ nullable -> float (NaN -> None)
+    """
+    types = {}
+    for column in numeric_columns:
+        series = df[column]
+        if series.dtype.kind == 'M':
+            tz = getattr(series.dt, 'tz', None)
+            types[column] = {'datetime': None if tz is None else str(tz)}
+        elif hasattr(series.dtype, 'numpy_dtype') and series.hasnans:
+            types[column] = {'nullable': series.dtype.kind}
+    return types
+
+
+def _value_converter(column_type):
+    import pandas as pd
+
+    if 'datetime' in column_type:
+        tz = column_type['datetime']
+
+        def convert(value):
+            if value == _NAT:
+                return None
+            return pd.Timestamp(value, tz='UTC').tz_convert(tz) if tz else pd.Timestamp(value)
+        return convert
+    cast = {'i': int, 'u': int, 'b': bool}.get(column_type['nullable'], float)
+    return lambda value: None if value != value else cast(value)
+
+
+def _text_value(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return TEXT_NULL
+    text = str(value)
+    if TEXT_SEPARATOR in text or TEXT_NULL in text:
+        raise ValueError(f"ข้อความในแคตตาล็อกมีอักขระควบคุมที่ใช้แบ่งคอลัมน์: {text!r}")
+    return text
+
+
+def write_catalog_files(directory, df, version, marker, criteria):
+    """เขียนไฟล์ของแคตตาล็อก version หนึ่งลง directory (ต้องยังไม่มีอยู่)"""
+    os.makedirs(directory)
+    columns = [str(c) for c in df.columns]
+    numeric_columns = [c for c in columns if df[c].dtype.kind in 'biufM']
+    text_columns = [c for c in columns if c not in numeric_columns]
+
+    numeric = np.zeros(len(df), dtype=[(c, _numeric_values(df[c]).dtype) for c in numeric_columns])
+    for column in numeric_columns:
+        numeric[column] = _numeric_values(df[column])
+    encoded = [TEXT_SEPARATOR.join(_text_value(v) for v in row).encode('utf-8')
+               for row in df[text_columns].itertuples(index=False, name=None)] if text_columns else [b''] * len(df)
+    offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row) for row in encoded], dtype=np.int64)
+
+    np.save(os.path.join(directory, 'numeric.npy'), numeric)
+    np.save(os.path.join(directory, 'text.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, 'text_offsets.npy'), offsets)
+    engine = TopsisEngine.from_dataframe(df, criteria)
+    for name, array in engine.to_arrays().items():
+        np.save(os.path.join(directory, f'topsis_{name}.npy'), np.ascontiguousarray(array))
+    manifest = {
+        'version': version,
+        'marker': _marker_key(marker),
+        'rows': len(df),
+        'columns': columns,
+        'numeric_columns': numeric_columns,
+        'text_columns': text_columns,
+        'column_types': _column_types(df, numeric_columns),
+        'criteria': list(engine.criteria),
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+class SharedCatalogView:
+    """แคตตาล็อก version หนึ่งที่ attach แบบ read-only (ทุก array เป็น NumPy view ของไฟล์ที่ map ไว้)
+
+    ใช้แทน catalog_records(df) ได้โดยตรง (ค่าชนิดเดียวกัน): view[i] สร้าง dict ของแถว i เฉพาะเมื่อถูกเลือก
+    แถวที่ถูกเลือกบ่อยเก็บไว้ใน LRU ขนาด row_cache แถวต่อ process (dict ที่คืนใช้ร่วมกัน ห้ามแก้ไข)
+    ทุกไฟล์ถูก map ตั้งแต่ attach: ไฟล์ของ version เก่าที่ถูก prune ภายหลังยังอ่านได้ผ่าน mapping เดิมจนกว่า view จะถูกทิ้ง
+    """
+
+    def __init__(self, directory, row_cache=None):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.version = manifest['version']
+        self.columns = manifest['columns']
+        self.criteria = manifest['criteria']
+        self.numeric = _load_array(os.path.join(directory, 'numeric.npy'))
+        self.text = _load_array(os.path.join(directory, 'text.npy'))
+        self.text_offsets = _load_array(os.path.join(directory, 'text_offsets.npy'))
+        self._topsis_arrays = {name: _load_array(os.path.join(directory, f'topsis_{name}.npy'))
+                               for name in TopsisEngine.array_names()}
+        self._numeric_columns = manifest['numeric_columns']
+        self._text_columns = manifest['text_columns']
+        stored = self._numeric_columns + self._text_columns
+        order = [stored.index(c) for c in self.columns]
+        self._reorder = operator.itemgetter(*order) if len(order) > 1 else (lambda values: values)
+        column_types = manifest.get('column_types', {})
+        self._column_types = column_types
+        self._converters = {column: _value_converter(column_type) for column, column_type in column_types.items()}
+        # ตำแหน่ง (ในลำดับที่เก็บ) ของคอลัมน์ที่ต้องแปลงค่า
+        self._row_converters = [(self._numeric_columns.index(c), f) for c, f in self._converters.items()]
+        row_cache = int(row_cache if row_cache is not None else os.environ.get('SHARED_CATALOG_ROW_CACHE', 256))
+        self._row = functools.lru_cache(maxsize=row_cache)(self._decode_row)
+
+    def __len__(self):
+        return len(self.text_offsets) - 1
+
+    def __getitem__(self, position):
+        return self._row(int(position))
+
+    def _decode_row(self, position):
+        values = list(self.numeric[position].item()) if self._numeric_columns else []
+        for index, convert in self._row_converters:
+            values[index] = convert(values[index])
+        if self._text_columns:
+            start, end = self.text_offsets[position:position + 2].tolist()
+            text = self.text[start:end].tobytes().decode('utf-8').split(TEXT_SEPARATOR)
+            values += [None if v == TEXT_NULL else v for v in text] if TEXT_NULL in text else text
+        return dict(zip(self.columns, self._reorder(values)))
+
+    def column(self, name):
+        """ค่าของคอลัมน์เดียวทั้งแคตตาล็อก (คอลัมน์ตัวเลขเป็น view ไม่คัดลอก, คอลัมน์ข้อความเป็น list)"""
+        if name in self._numeric_columns:
+            convert = self._converters.get(name)
+            if convert is not None:
+                return [convert(value) for value in self.numeric[name].tolist()]
+            return self.numeric[name]
+        j = self._text_columns.index(name)
+        raw = self.text.tobytes()
+        offsets = self.text_offsets.tolist()
+        # offset เป็นจำนวน byte: ตัดเป็นแถวก่อน decode
+        values = [raw[start:end].decode('utf-8').split(TEXT_SEPARATOR)[j]
+                  for start, end in zip(offsets[:-1], offsets[1:])]
+        return [None if value == TEXT_NULL else value for value in values]
+
+    def topsis_engine(self):
+        """TopsisEngine ที่ใช้ array ที่เผยแพร่ไว้โดยตรง (ไม่คำนวณและไม่คัดลอก matrix)"""
+        return TopsisEngine.from_arrays(self._topsis_arrays, self.criteria)
+
+    def to_dataframe(self):
+        """DataFrame ของแคตตาล็อก (สำเนาของ process นี้ ใช้เฉพาะโค้ดที่ยังต้องการ DataFrame)"""
+        import pandas as pd
+
+        columns = {}
+        for name in self.columns:
+            values = self.column(name)
+            column_type = self._column_types.get(name)
+            if column_type and 'datetime' in column_type:
+                values = pd.to_datetime(values)
+            elif column_type:
+                values = pd.array(values, dtype={'b': 'boolean', 'f': 'Float64'}.get(column_type['nullable'], 'Int64'))
+            columns[name] = values
+        return pd.DataFrame(columns, columns=self.columns)
+
+
+class SharedCatalogStore:
+    """เผยแพร่และ attach แคตตาล็อกใน directory ที่ทุก worker บนเครื่องเดียวกันเห็น
+
+    - acquire() ถือ file lock: ถ้า pointer ยังตรงกับ marker ปัจจุบันและยังไม่หมดอายุ attach version นั้น
+      ไม่เช่นนั้นโหลดจากแหล่งข้อมูล เขียนไฟล์ของ version ใหม่ แล้วสลับ pointer
+    - เก็บไฟล์ของ version ล่าสุดไว้ keep ชุด (worker ที่ยัง map version เก่าอยู่ใช้ต่อได้จนสลับเอง)
+    """
+
+    def __init__(self, directory, criteria=None, keep=None):
+        self.directory = directory
+        self.criteria = list(criteria or CRITERIA)
+        self.keep = int(keep if keep is not None else os.environ.get('SHARED_CATALOG_KEEP', 3))
+
+    def read_pointer(self):
+        """ข้อมูลใน pointer (version, marker, published_at) หรือ None หากยังไม่เคยเผยแพร่"""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def current_version(self):
+        pointer = self.read_pointer()
+        return pointer['version'] if pointer else None
+
+    def attach(self, version):
+        return SharedCatalogView(os.path.join(self.directory, version))
+
+    def acquire(self, loader, marker, ttl):
+        """คืน (view, เวลาเผยแพร่) ของแคตตาล็อกปัจจุบัน โดยโหลดจากแหล่งข้อมูลเฉพาะเมื่อจำเป็น"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                pointer = self.read_pointer()
+                if (pointer is not None and pointer['marker'] == _marker_key(marker)
+                        and time.time() - pointer['published_at'] <= ttl):
+                    try:
+                        return self.attach(pointer['version']), pointer['published_at']
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.warning("attach แคตตาล็อก %s ไม่สำเร็จ โหลดใหม่: %s", pointer['version'], e)
+                df = loader()
+                version = compute_catalog_version(df)
+                self._publish(df, version, marker)
+                published_at = time.time()
+                self._write_pointer(version, marker, published_at)
+                self._prune(version)
+                return self.attach(version), published_at
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, df, version, marker):
+        target = os.path.join(self.directory, version)
+        if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+            # เนื้อหาเดิม (เช่นรีเฟรชตาม TTL): ใช้ไฟล์ที่มีอยู่ ไม่เขียนทับไฟล์ที่ worker map อยู่
+            return
+        tmp_dir = os.path.join(self.directory, f".tmp-{version}-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            write_catalog_files(tmp_dir, df, version, marker, self.criteria)
+            shutil.rmtree(target, ignore_errors=True)
+            os.rename(tmp_dir, target)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.info("เผยแพร่แคตตาล็อก version %s (%d โมเดล) ที่ %s", version, len(df), target)
+
+    def _write_pointer(self, version, marker, published_at):
+        path = os.path.join(self.directory, CURRENT_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'marker': _marker_key(marker), 'published_at': published_at}, f)
+        os.replace(tmp_path, path)
+
+    def _prune(self, current):
+        versions = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name != current and not name.startswith('.') and os.path.isdir(path):
+                versions.append((os.path.getmtime(path), path))
+        versions.sort(reverse=True)
+        for _, path in versions[max(0, self.keep - 1):]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def make_shared_catalog_store(criteria=None):
+    """สร้าง store ตาม SHARED_CATALOG_DIR (คืน None เมื่อไม่ได้กำหนด = แต่ละ process ถือแคตตาล็อกเอง)
+
+    - SHARED_CATALOG_DIR: directory ที่ทุก worker เห็น แนะนำ tmpfs เช่น /dev/shm/ev-catalog
+    - SHARED_CATALOG_KEEP: จำนวน version ที่เก็บไฟล์ไว้รวม version ปัจจุบัน (ค่าเริ่มต้น 3)
+    """
+    directory = os.environ.get('SHARED_CATALOG_DIR')
+    if not directory:
+        return None
+    return SharedCatalogStore(directory, criteria)
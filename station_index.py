@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""ดัชนีสถานีชาร์จในหน่วยความจำ: grid ตามพิกัด (สำหรับ k-nearest / รัศมี) และ inverted index ตามค่าที่ใช้กรอง"""
+import math
+import os
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# คอลัมน์ของตาราง ChargingStation -> ชื่อใน response (ตรงกับ app/api/charging-stations/route.js)
+STATION_COLUMNS = {
+    'ID': 'ID', 'Name': 'Name', 'Address': 'Address', 'Subdistrict': 'Subdistrict', 'District': 'District',
+    'Province': 'Province', 'Latitude': 'Latitude', 'Longitude': 'Longitude',
+    '25kW': 'power25', '50kW': 'power50', '120kW': 'power120', '300kW': 'power300', '360kW': 'power360',
+    'AC Type 2': 'acType2', 'CCS2': 'CCS2', 'CHAdeMO': 'CHAdeMO', 'Distributor': 'Distributor', 'logo_url': 'logo_url',
+}
+# ค่าที่กรองได้แบบตรงตัว (ตัดช่องว่างหัวท้าย)
+TEXT_FILTERS = ['Province', 'District', 'Subdistrict', 'Distributor']
+# ประเภทหัวชาร์จ / กำลังไฟ: สถานีที่มีหัวชาร์จชนิดนั้นอย่างน้อย 1 หัว
+CONNECTION_TYPES = ['AC Type 2', 'CCS2', 'CHAdeMO']
+POWER_LEVELS = ['25kW', '50kW', '120kW', '300kW', '360kW']
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def normalize_power(power):
+    """'50', '50kW', ' 50 kw' -> '50kW'"""
+    value = str(power).strip().lower().replace(' ', '').removesuffix('kw')
+    return f"{value}kW"
+
+
+def haversine_km(lat, lon, lats, lons):
+    """ระยะทาง (กม.) จากจุด (lat, lon) ไปยังทุกจุดใน lats/lons (หน่วยองศา)"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _sorted_by_distance(positions, distances, k=None):
+    if k is not None and len(positions) > k:
+        part = np.argpartition(distances, k - 1)[:k]
+        positions, distances = positions[part], distances[part]
+    order = np.argsort(distances, kind='stable')
+    return positions[order], distances[order]
+
+
+def _group_positions(values):
+    groups = {}
+    for position, value in enumerate(values):
+        if value is None or value != value:
+            continue
+        groups.setdefault(str(value).strip(), []).append(position)
+    return {value: np.array(positions, dtype=np.intp) for value, positions in groups.items()}
+
+
+class StationIndex:
+    """สถานีชาร์จหนึ่ง version ของตาราง พร้อม grid ขนาด cell_degrees องศา และ inverted index
+
+    - positions ที่ใช้ทุกเมธอดคือลำดับแถว (0..n-1) และ records[position] คือ dict สำหรับส่งให้ฟรอนต์เอนด์
+    - filter() คืนตำแหน่งที่ผ่านเงื่อนไขทั้งหมด (AND) โดยไม่สแกนตาราง
+    - nearest() / within() คำนวณระยะเฉพาะสถานีใน cell รอบจุดที่ถาม ถ้าผลกรองเหลือไม่เกิน scan_limit แห่ง
+      จะคำนวณระยะทุกแห่งในผลกรองตรง ๆ ซึ่งเร็วกว่า; ไม่รองรับการค้นข้ามเส้นแบ่งเขตวันสากล (ลองจิจูด ±180)
+    """
+
+    def __init__(self, records, latitudes, longitudes, cell_degrees=None, scan_limit=None):
+        self.records = records
+        self.size = len(records)
+        self.cell_degrees = float(cell_degrees or os.environ.get('STATION_GRID_DEGREES', 0.05))
+        # ผลกรองที่มีไม่เกินนี้คำนวณระยะทุกสถานีโดยไม่ใช้ grid
+        self.scan_limit = int(scan_limit if scan_limit is not None else os.environ.get('STATION_SCAN_LIMIT', 2000))
+        lats = np.asarray(latitudes, dtype=float)
+        lons = np.asarray(longitudes, dtype=float)
+        # สถานีที่ไม่มีพิกัดยังกรองได้ แต่ไม่อยู่ในผลค้นตามระยะ
+        located = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        self.lats = lats
+        self.lons = lons
+        self.located = located
+        self.located_mask = np.zeros(self.size, dtype=bool)
+        self.located_mask[located] = True
+
+        rows = np.floor(lats[located] / self.cell_degrees).astype(np.int64)
+        cols = np.floor(lons[located] / self.cell_degrees).astype(np.int64)
+        order = np.lexsort((cols, rows))
+        self._cell_order = located[order]
+        keys = np.stack([rows[order], cols[order]], axis=1)
+        # cell ที่มีสถานี: _cell_order[_cell_starts[i]:_cell_ends[i]] คือสถานีใน cell (_cell_rows[i], _cell_cols[i])
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]) if len(keys) else _EMPTY
+        self._cell_starts = starts
+        self._cell_ends = np.r_[starts[1:], len(keys)].astype(np.intp)
+        self._cell_rows = keys[starts, 0]
+        self._cell_cols = keys[starts, 1]
+
+        self.by_value = {}
+        self.by_connection = {}
+        self.by_power = {}
+
+    @classmethod
+    def from_dataframe(cls, df, cell_degrees=None, scan_limit=None):
+        """สร้างจาก DataFrame ของตาราง ChargingStation (คอลัมน์ตาม STATION_COLUMNS ที่มีอยู่)"""
+        import pandas as pd
+
+        columns = [c for c in STATION_COLUMNS if c in df.columns]
+        view = df[columns].rename(columns=STATION_COLUMNS)
+        counts = {}
+        for column in CONNECTION_TYPES + POWER_LEVELS:
+            if column in df.columns:
+                counts[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy()
+                view[STATION_COLUMNS[column]] = counts[column]
+        # NaN ไม่ใช่ JSON ที่ถูกต้อง
+        records = view.astype(object).where(view.notna(), None).to_dict('records')
+        index = cls(records, pd.to_numeric(df['Latitude'], errors='coerce'),
+                    pd.to_numeric(df['Longitude'], errors='coerce'), cell_degrees, scan_limit)
+        for column in TEXT_FILTERS:
+            if column in df.columns:
+                index.by_value[column] = _group_positions(df[column].tolist())
+        index.by_connection = {c: np.flatnonzero(counts[c] > 0) for c in CONNECTION_TYPES if c in counts}
+        index.by_power = {c: np.flatnonzero(counts[c] > 0) for c in POWER_LEVELS if c in counts}
+        return index
+
+    def filter(self, province=None, district=None, subdistrict=None, distributor=None,
+               connection_type=None, powers=None):
+        """ตำแหน่งสถานีที่ผ่านทุกเงื่อนไข (เรียงตามลำดับแถว) หรือ None หากไม่มีเงื่อนไขเลย
+
+        powers: รายการกำลังไฟ สถานีต้องมีหัวชาร์จอย่างน้อยหนึ่งกำลังไฟในรายการ (OR เหมือนหน้าแผนที่)
+        """
+        sets = []
+        for column, value in zip(TEXT_FILTERS, (province, district, subdistrict, distributor)):
+            if value:
+                sets.append(self.by_value.get(column, {}).get(str(value).strip(), _EMPTY))
+        if connection_type:
+            sets.append(self.by_connection.get(connection_type, _EMPTY))
+        if powers:
+            matched = [self.by_power.get(normalize_power(p), _EMPTY) for p in powers]
+            sets.append(matched[0] if len(matched) == 1 else np.unique(np.concatenate(matched)))
+        if not sets:
+            return None
+        # เริ่มจากชุดเล็กสุดเพื่อให้ intersect เร็ว
+        sets.sort(key=len)
+        positions = sets[0]
+        for other in sets[1:]:
+            if not len(positions):
+                break
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
+
+    def _candidates(self, positions):
+        if positions is None:
+            return self.located
+        return positions[self.located_mask[positions]]
+
+    def _mask(self, positions):
+        if positions is None:
+            return self.located_mask
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return mask
+
+    def _scan(self, lat, lon, positions):
+        candidates = self._candidates(positions)
+        return candidates, haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+
+    def _cell_positions(self, cells, mask):
+        """ตำแหน่งสถานีใน cell ที่เลือก (index ของ cell ที่มีสถานี) ที่ผ่าน mask"""
+        starts, lengths = self._cell_starts[cells], self._cell_ends[cells] - self._cell_starts[cells]
+        # ต่อช่วง starts[i]:starts[i] + lengths[i] ทุกช่วงโดยไม่วน loop
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        found = self._cell_order[offsets + np.arange(len(offsets))]
+        return found[mask[found]]
+
+    def nearest(self, lat, lon, k, positions=None):
+        """k สถานีที่ใกล้ (lat, lon) ที่สุดจาก positions (None = ทุกสถานี) คืน (positions, ระยะ กม.) เรียงใกล้ไปไกล"""
+        if k <= 0:
+            return _EMPTY, np.empty(0)
+        if positions is not None and len(positions) <= self.scan_limit:
+            return _sorted_by_distance(*self._scan(lat, lon, positions), k)
+        mask = self._mask(positions)
+        row, col = math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+        # ระยะของแต่ละ cell จากจุดที่ถามเป็นจำนวนวง (Chebyshev) เริ่มจากวงแรกที่มีสถานี แล้วขยายเป็นสองเท่า
+        # จนได้อย่างน้อย k สถานี (จุดที่อยู่ห่างจากสถานีทั้งหมดจึงไม่ต้องไล่วงว่างทีละวง)
+        rings = np.maximum(np.abs(self._cell_rows - row), np.abs(self._cell_cols - col))
+        if not len(rings):
+            return _EMPTY, np.empty(0)
+        ring = int(rings.min())
+        while True:
+            cells = np.flatnonzero(rings <= ring)
+            hits = self._cell_positions(cells, mask)
+            if len(hits) >= k or len(cells) == len(rings):
+                break
+            ring = 2 * ring + 1
+        result = _sorted_by_distance(hits, haversine_km(lat, lon, self.lats[hits], self.lons[hits]), k)
+        if len(hits) < k or result[1][-1] <= self._searched_radius_km(lat, lon, row, col, ring):
+            return result
+        # สถานีที่ k ไกลกว่าขอบของวงที่ค้นแล้ว: k อันดับจริงอยู่ในรัศมีนั้นเสมอ จึงค้นทุก cell ในกรอบของรัศมีอีกครั้งเดียว
+        hits = self._cell_positions(self._cells_within(lat, lon, result[1][-1]), mask)
+        return _sorted_by_distance(hits, haversine_km(lat, lon, self.lats[hits], self.lons[hits]), k)
+
+    def _cells_within(self, lat, lon, radius_km):
+        """index ของ cell ที่มีสถานีและซ้อนกับกรอบละติจูด/ลองจิจูดที่ครอบวงกลมรัศมี radius_km"""
+        size = self.cell_degrees
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = max(-90.0, lat - lat_span), min(90.0, lat + lat_span)
+        cos_max = math.cos(math.radians(max(abs(south), abs(north))))
+        # จุดในรัศมีมี sin(Δλ/2) <= sin(d/2) / cos(φmax) (ดู _searched_radius_km)
+        bound = math.sin(radius_km / EARTH_RADIUS_KM / 2) / cos_max if cos_max > 1e-9 else 1.0
+        lon_span = 180.0 if bound >= 1.0 else math.degrees(2 * math.asin(bound))
+        return np.flatnonzero((self._cell_rows >= math.floor(south / size))
+                              & (self._cell_rows <= math.floor(north / size))
+                              & (self._cell_cols >= math.floor((lon - lon_span) / size))
+                              & (self._cell_cols <= math.floor((lon + lon_span) / size)))
+
+    def _searched_radius_km(self, lat, lon, row, col, ring):
+        """ระยะต่ำสุดจาก (lat, lon) ไปยังจุดใด ๆ นอกสี่เหลี่ยม cell (row ± ring, col ± ring)"""
+        size = self.cell_degrees
+        south, north = (row - ring) * size, (row + ring + 1) * size
+        west, east = (col - ring) * size, (col + ring + 1) * size
+        lat_gap = math.radians(min(lat - south, north - lat))
+        # จุดที่อยู่ในแถบละติจูดเดียวกันแต่เลยขอบตะวันออก/ตะวันตก: sin²(d/2) >= cos²(φmax)·sin²(Δλ/2)
+        lon_gap = math.radians(min(lon - west, east - lon))
+        cos_max = math.cos(math.radians(min(90.0, max(abs(south), abs(north)))))
+        lon_bound = 2 * math.asin(min(1.0, cos_max * math.sin(min(math.pi, lon_gap) / 2)))
+        return EARTH_RADIUS_KM * min(lat_gap, lon_bound)
+
+    def within(self, lat, lon, radius_km, positions=None):
+        """สถานีใน positions (None = ทุกสถานี) ที่อยู่ห่างจาก (lat, lon) ไม่เกิน radius_km คืน (positions, ระยะ) เรียงใกล้ไปไกล"""
+        if positions is not None and len(positions) <= self.scan_limit:
+            candidates, distances = self._scan(lat, lon, positions)
+        else:
+            candidates = self._cell_positions(self._cells_within(lat, lon, radius_km), self._mask(positions))
+            distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        keep = distances <= radius_km
+        return _sorted_by_distance(candidates[keep], distances[keep])
+
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""ให้ test import โมดูลที่อยู่ที่ root ของ repo ได้ (repo ไม่ได้ติดตั้งเป็น package) และ fixture ของแอป"""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_catalog(n_models=60, seed=0):
+    """ตาราง Model รูปแบบเดียวกับใน warehouse (ชื่อคอลัมน์ก่อนทำความสะอาด ตัวเลขบางคอลัมน์เป็นข้อความ)"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Model': [f'm{i}' for i in range(n_models)],
+        'Range': rng.integers(200, 700, n_models).astype(str),
+        'Top Speed': rng.integers(120, 260, n_models),
+        'Accelarate': rng.uniform(3, 12, n_models),
+        'Efficiency': rng.uniform(12, 25, n_models),
+        'Battery': rng.uniform(40, 110, n_models),
+        'Estimated_THB_Value': [f"{x:,}" for x in rng.integers(700_000, 5_000_000, n_models)],
+        'Fast-charge': rng.integers(50, 350, n_models),
+        'Seats': rng.choice([2, 4, 5, 7], n_models),
+        'Drive_Configuration': rng.choice(['AWD', 'RWD', 'FWD'], n_models),
+    })
+
+
+def make_user_profiles(n_users=200, seed=0):
+    """ตาราง UserProfiles สำหรับ train โมเดล clustering และค่าเฉลี่ยน้ำหนักต่อ cluster"""
+    import numpy as np
+    import pandas as pd
+
+    from cluster_weights import WEIGHT_COLUMNS
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'gender': rng.choice(['m', 'f'], n_users), 'age_range': rng.choice(['a', 'b', 'c'], n_users),
+        'occupation': rng.choice(['x', 'y'], n_users), 'marital_status': rng.choice(['s', 'm'], n_users),
+        'family_status': rng.choice(['1', '2'], n_users), 'income_range': rng.choice(['l', 'h'], n_users),
+        'vehicle_status': rng.choice(['0', '1'], n_users), 'driveCon': rng.choice(['AWD', 'RWD'], n_users),
+        'seats': rng.choice([4, 5, 7], n_users),
+    })
+    for column in WEIGHT_COLUMNS.values():
+        df[column] = rng.uniform(1, 30, n_users)
+    df['cluster_id'] = rng.integers(0, 3, n_users).astype(str)
+    df['timestamp'] = '2026-01-01T00:00:00'
+    return df
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """bit15_model_app ที่ใช้ DATA_SOURCE=local กับข้อมูลจำลองใน directory ชั่วคราว (import ครั้งเดียวต่อ session)"""
+    pytest.importorskip('flask')
+    pytest.importorskip('sklearn')
+    root = tmp_path_factory.mktemp('app')
+    data_dir = root / 'data'
+    data_dir.mkdir()
+    make_catalog().to_parquet(data_dir / 'Model.parquet', index=False)
+    make_user_profiles().to_parquet(data_dir / 'UserProfiles.parquet', index=False)
+    os.environ.update({
+        'DATA_SOURCE': 'local',
+        'LOCAL_DATA_DIR': str(data_dir),
+        'CLUSTER_MODEL_PATH': str(root / 'artifacts' / 'user_clustering.pkl'),
+        'WRITE_BEHIND_SPOOL': str(root / 'artifacts' / 'write_behind.spool.jsonl'),
+        'CLUSTER_RETRAIN_INTERVAL': '0',
+        'LOG_LEVEL': 'WARNING',
+    })
+    for name in ('RESULT_CACHE_REDIS_URL', 'SHARED_CATALOG_DIR'):
+        os.environ.pop(name, None)
+    module = importlib.import_module('bit15_model_app')
+    yield module
+    module.write_sink.close()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""recommend_batch: หา cluster ภายใต้ deadline และไม่บันทึกแถวเข้า cluster 0 เมื่อไม่มีโมเดล"""
+import time
+
+import pytest
+
+SUBMISSION = {'userProfile': {'gender': 'm'}, 'driveCon': 'AWD', 'numSeats': 5,
+              'summedWeight': {'battery': 10, 'range': 20, 'accelarate': 5, 'top_speed': 5, 'efficiency': 10,
+                               'fastcharge': 10, 'estimated_thb_value': 40}}
+
+
+@pytest.fixture
+def saved_clusters(app_module, monkeypatch):
+    saved = []
+    monkeypatch.setattr(app_module, 'save_user_data', lambda *args: None)
+    monkeypatch.setattr(app_module, 'save_user_result',
+                        lambda profile, user_weights, hybrid, results, cluster_id, *args: saved.append(cluster_id))
+    return saved
+
+
+def test_batch_without_model_saves_no_cluster(app_module, monkeypatch, saved_clusters):
+    monkeypatch.setattr(app_module.cluster_store, '_model', None)
+    monkeypatch.setattr(app_module.cluster_store, 'get', lambda: None)
+    results = app_module.recommend_batch([SUBMISSION, SUBMISSION])
+    assert all(len(r) == 3 for r in results)
+    assert saved_clusters == [None, None]
+
+
+def test_batch_cluster_prediction_has_deadline(app_module, monkeypatch, saved_clusters):
+    monkeypatch.setattr(app_module.cluster_store, '_model', None)
+    monkeypatch.setattr(app_module.cluster_store, 'get', lambda: time.sleep(1))
+    monkeypatch.setattr(app_module, 'SUBMIT_CLUSTER_TIMEOUT', 0.05)
+    started = time.monotonic()
+    results = app_module.recommend_batch([SUBMISSION])
+    assert time.monotonic() - started < 0.9
+    assert len(results[0]) == 3
+    assert saved_clusters == [None]
+
+
+def test_batch_with_model_saves_predicted_cluster(app_module, saved_clusters):
+    assert app_module.cluster_store.prepare() is not None
+    app_module.recommend_batch([SUBMISSION])
+    assert isinstance(saved_clusters[0], int)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""CallPool.submit_once: request ที่รองานเดียวกันใช้ Future เดียว ไม่เพิ่มงานค้างใน pool"""
+import threading
+
+from call_pool import CallPool
+
+
+def test_submit_once_shares_inflight_future():
+    pool = CallPool(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return 'snapshot'
+
+    futures = [pool.submit_once('catalog', load) for _ in range(10)]
+    assert all(future is futures[0] for future in futures)
+    # งานอื่นยังได้ thread ว่างของ pool
+    assert pool.submit(lambda: 'other').result(timeout=5) == 'other'
+    release.set()
+    assert futures[0].result(timeout=5) == 'snapshot'
+    assert len(calls) == 1
+    pool.shutdown()
+
+
+def test_submit_once_starts_again_after_done():
+    pool = CallPool(max_workers=1)
+    first = pool.submit_once('catalog', lambda: 1)
+    assert first.result(timeout=5) == 1
+    second = pool.submit_once('catalog', lambda: 2)
+    assert second is not first
+    assert second.result(timeout=5) == 2
+    pool.shutdown()
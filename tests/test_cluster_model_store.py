@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""ClusterModelStore: get() ไม่ train ใน thread ของ request และการ train ที่ล้มเหลวเว้นระยะตาม backoff"""
+import time
+
+from cluster_model_store import ClusterModel, ClusterModelStore, save_model_artifact
+
+
+class FakePipeline:
+    def predict(self, df):
+        return [7] * len(df)
+
+
+class CountingTrainer:
+    def __init__(self, result=None):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def make_store(tmp_path, trainer, **kwargs):
+    kwargs.setdefault('retrain_interval', 3600)
+    kwargs.setdefault('poll_interval', 3600)
+    kwargs.setdefault('retry_interval', 60)
+    return ClusterModelStore(trainer, path=str(tmp_path / 'model.pkl'), **kwargs)
+
+
+def test_get_without_artifact_does_not_train(tmp_path):
+    trainer = CountingTrainer()
+    store = make_store(tmp_path, trainer)
+    for _ in range(5):
+        assert store.get() is None
+        assert store.predict([{}]) is None
+    assert trainer.calls == 0
+
+
+def test_get_loads_existing_artifact(tmp_path):
+    save_model_artifact(ClusterModel(FakePipeline(), 'v1', '2026-01-01T00:00:00'), str(tmp_path / 'model.pkl'))
+    trainer = CountingTrainer()
+    store = make_store(tmp_path, trainer)
+    assert store.get().version == 'v1'
+    assert store.predict([{}]) == 7
+    assert trainer.calls == 0
+
+
+def test_failed_training_backs_off_across_stores(tmp_path):
+    trainer = CountingTrainer()
+    store = make_store(tmp_path, trainer)
+    assert store.prepare() is None
+    assert store.prepare() is None
+    # worker อื่นอ่านสถานะจากไฟล์เดียวกัน จึงไม่ train ซ้ำระหว่าง backoff
+    assert make_store(tmp_path, trainer).prepare() is None
+    assert trainer.calls == 1
+    assert store._read_attempts()[0] == 1
+
+    # หลังพ้น backoff ลองใหม่ได้ และสำเร็จแล้วรีเซ็ตตัวนับ
+    store._write_attempts(1, time.time() - 61)
+    trainer.result = FakePipeline()
+    assert store.prepare() is not None
+    assert trainer.calls == 2
+    assert store._read_attempts()[0] == 0
+
+
+def test_backoff_doubles_up_to_retrain_interval(tmp_path):
+    store = make_store(tmp_path, CountingTrainer(), retrain_interval=500, retry_interval=60)
+    assert [store._backoff(n) for n in range(5)] == [0.0, 60, 120, 240, 480]
+    assert store._backoff(10) == 500
+
+
+def test_get_wakes_background_training(tmp_path):
+    trainer = CountingTrainer(FakePipeline())
+    store = make_store(tmp_path, trainer)
+    store.start()
+    try:
+        assert store.get() is None
+        deadline = time.monotonic() + 5
+        while store.current is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.current is not None
+        assert trainer.calls == 1
+    finally:
+        store.stop()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""HYBRID_CLUSTER_SHARE = 0 ไม่ใช้ค่าเฉลี่ยของ cluster เลย และ trained_at ของโมเดล batch เป็นเวลาที่เริ่มอ่านข้อมูล"""
+import datetime
+
+import pytest
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("ไม่ควรถูกเรียกเมื่อ HYBRID_CLUSTER_SHARE เป็น 0")
+
+
+@pytest.fixture
+def unused_weight_store(app_module, monkeypatch):
+    assert app_module.HYBRID_CLUSTER_SHARE == 0
+    store = app_module.cluster_weight_store
+    for name in ('seed', 'start', 'reconcile', 'averages', 'add'):
+        monkeypatch.setattr(store, name, fail)
+    return store
+
+
+def test_zero_share_skips_cluster_averages(app_module, unused_weight_store):
+    app_module.warmup()
+    app_module.start_background_workers()
+    user_df = app_module.transform_user_features({})
+    cluster_id, weights = app_module.predict_cluster_weights(user_df)
+    assert cluster_id is not None
+    assert weights == app_module.DEFAULT_CLUSTER_WEIGHTS
+
+
+def test_zero_share_submit_does_not_touch_weight_store(client, unused_weight_store):
+    response = client.post('/handleSubmit', json={
+        'userProfile': {'gender': 'f'}, 'driveCon': 'RWD', 'numSeats': 4,
+        'summedWeight': {'battery': 15, 'range': 20, 'accelarate': 10, 'top_speed': 10, 'efficiency': 15,
+                         'fastcharge': 10, 'estimated_thb_value': 20},
+    })
+    assert response.status_code == 200
+
+
+def test_batch_model_trained_at_is_read_start(app_module, monkeypatch):
+    source = app_module.data_source
+    load_table = source.load_table
+    read_started = []
+
+    def recording_load_table(*args, **kwargs):
+        read_started.append(datetime.datetime.now().isoformat())
+        return load_table(*args, **kwargs)
+
+    monkeypatch.setattr(source, 'load_table', recording_load_table)
+    model = app_module.build_batch_clustering_model()
+    assert model is not None
+    assert model.trained_at <= read_started[0]
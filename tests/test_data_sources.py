@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""BigQuerySource: ทุกการเรียกมี timeout และ query ที่เกินเวลาถูก cancel"""
+import concurrent.futures
+
+import pytest
+
+from data_sources import BigQuerySource
+
+
+class FakeJob:
+    def __init__(self, hang=False):
+        self.hang = hang
+        self.result_timeout = None
+        self.cancelled = False
+
+    def result(self, page_size=None, timeout=None):
+        self.result_timeout = timeout
+        if self.hang:
+            raise concurrent.futures.TimeoutError()
+        return self
+
+    def to_dataframe(self):
+        return 'frame'
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeClient:
+    def __init__(self, job):
+        self.job = job
+        self.query_timeout = None
+
+    def query(self, query, timeout=None):
+        self.query_timeout = timeout
+        return self.job
+
+
+def test_query_passes_timeout():
+    client = FakeClient(FakeJob())
+    source = BigQuerySource('p', 'd', client=client, query_timeout=5)
+    assert source.load_table('Model') == 'frame'
+    assert client.query_timeout == 5
+    assert client.job.result_timeout == 5
+
+
+def test_hung_query_is_cancelled():
+    client = FakeClient(FakeJob(hang=True))
+    source = BigQuerySource('p', 'd', client=client, query_timeout=5)
+    with pytest.raises(concurrent.futures.TimeoutError):
+        source.load_table('Model')
+    assert client.job.cancelled
+
+
+def test_zero_timeout_means_unbounded(monkeypatch):
+    monkeypatch.setenv('BQ_QUERY_TIMEOUT', '0')
+    assert BigQuerySource('p', 'd', client=FakeClient(FakeJob())).query_timeout is None
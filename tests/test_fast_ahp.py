@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""fast_ahp: น้ำหนักและ consistency ratio ตรงกับ ahpy.Compare ทั้งแบบ closed-form และแบบ eigenvector"""
+import numpy as np
+import pytest
+
+from fast_ahp import ahp_weights, comparison_weights, is_consistent, matrix_from_comparisons, random_index
+from fast_topsis import CRITERIA
+
+ahpy = pytest.importorskip('ahpy')
+
+# ahpy ปัดเศษที่ 4 ตำแหน่งและใช้ power iteration จึงยอมให้ต่างกันได้ 1 หน่วยสุดท้าย
+TOLERANCE = 1.5e-4
+SAATY_SCALE = [1 / 9, 1 / 7, 1 / 5, 1 / 3, 1, 3, 5, 7, 9]
+
+
+def ratio_comparisons(weights):
+    """dict เปรียบเทียบคู่แบบเดียวกับที่ calculate_ahp_topsis เคยสร้างให้ ahpy"""
+    keys = list(weights)
+    return {(k1, k2): weights[k1] / weights[k2] for i, k1 in enumerate(keys) for k2 in keys[i + 1:]}
+
+
+def saaty_comparisons(rng, n=7):
+    keys = CRITERIA[:n]
+    return {(k1, k2): float(rng.choice(SAATY_SCALE)) for i, k1 in enumerate(keys) for k2 in keys[i + 1:]}
+
+
+def assert_matches_ahpy(result, comparisons):
+    weights, consistency_ratio = result
+    reference = ahpy.Compare('Criteria Comparison', comparisons)
+    assert set(weights) == set(reference.target_weights)
+    for key, value in reference.target_weights.items():
+        assert weights[key] == pytest.approx(value, abs=TOLERANCE)
+    assert consistency_ratio == pytest.approx(reference.consistency_ratio, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_closed_form_matches_ahpy(seed):
+    rng = np.random.default_rng(seed)
+    weights = dict(zip(CRITERIA, rng.uniform(1, 40, len(CRITERIA))))
+    assert_matches_ahpy(ahp_weights(weights), ratio_comparisons(weights))
+
+
+def test_closed_form_keeps_criteria_order_and_scale_invariance():
+    weights = dict(zip(CRITERIA, [14.28, 20.0, 5.0, 8.0, 12.0, 30.0, 10.72]))
+    result, consistency_ratio = ahp_weights(weights)
+    assert list(result) == CRITERIA
+    assert consistency_ratio == 0.0
+    assert ahp_weights({k: v * 10 for k, v in weights.items()}) == (result, 0.0)
+
+
+@pytest.mark.parametrize('value', [0, -1, float('nan'), float('inf')])
+def test_closed_form_rejects_invalid_weights(value):
+    weights = dict.fromkeys(CRITERIA, 1.0)
+    weights['range'] = value
+    with pytest.raises(ValueError):
+        ahp_weights(weights)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_eig_fallback_matches_ahpy(seed):
+    comparisons = saaty_comparisons(np.random.default_rng(seed))
+    _, matrix = matrix_from_comparisons(comparisons)
+    assert is_consistent(matrix) is None
+    assert_matches_ahpy(comparison_weights(comparisons), comparisons)
+
+
+def test_consistent_comparisons_skip_the_solver():
+    weights = dict(zip(CRITERIA, [14.28, 20.0, 5.0, 8.0, 12.0, 30.0, 10.72]))
+    comparisons = ratio_comparisons(weights)
+    _, matrix = matrix_from_comparisons(comparisons)
+    assert is_consistent(matrix) is not None
+    assert_matches_ahpy(comparison_weights(comparisons), comparisons)
+
+
+def test_two_elements_have_zero_consistency_ratio():
+    comparisons = {('a', 'b'): 3.0}
+    assert_matches_ahpy(comparison_weights(comparisons), comparisons)
+
+
+def test_incomplete_comparisons_are_rejected():
+    with pytest.raises(ValueError):
+        comparison_weights({('a', 'b'): 3.0, ('b', 'c'): 5.0})
+
+
+def test_random_index_interpolates_between_table_sizes():
+    assert random_index(7) == 1.2519
+    assert random_index(20) < random_index(22) < random_index(25)
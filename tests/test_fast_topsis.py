@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""TopsisEngine: ผลตรงกับ skcriteria และกรณีขอบ (คอลัมน์ norm เป็น 0, แถวเดียว, NaN)"""
+import warnings
+
+import numpy as np
+import pytest
+
+from fast_topsis import COST_CRITERIA, CRITERIA, TopsisEngine
+
+skcriteria = pytest.importorskip('skcriteria')
+
+
+def random_catalog(n_models, seed=0):
+    rng = np.random.default_rng(seed)
+    low = np.array([200, 120, 3.0, 12, 40, 700_000, 50])
+    high = np.array([700, 260, 12.0, 25, 110, 5_000_000, 350])
+    return rng.uniform(low, high, size=(n_models, len(CRITERIA)))
+
+
+def skcriteria_similarity(matrix, weights, criteria=CRITERIA):
+    """คะแนนอ้างอิง: VectorScaler(matrix) แล้ว TOPSIS ของ skcriteria (TOPSIS ตามนิยาม)
+
+    ไม่ใช่ผลของโค้ดเดิม: โค้ดเดิมเรียก TOPSIS กับ matrix ดิบโดยไม่ normalize ก่อน (และใส่น้ำหนักตามลำดับของ
+    ahpy target_weights) TopsisEngine แก้ทั้งสองจุดจึงเทียบกับ reference นี้
+    """
+    from skcriteria.agg.similarity import TOPSIS
+    from skcriteria.preprocessing.scalers import VectorScaler
+
+    objectives = [skcriteria.Objective.MIN if c in COST_CRITERIA else skcriteria.Objective.MAX for c in criteria]
+    dm = skcriteria.mkdm(matrix=matrix, objectives=objectives, weights=weights, criteria=list(criteria))
+    dm = VectorScaler(target='matrix').transform(dm)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return TOPSIS().evaluate(dm).e_.similarity
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_skcriteria(seed):
+    rng = np.random.default_rng(seed)
+    matrix = random_catalog(300, seed)
+    weights = rng.uniform(0.01, 1.0, len(CRITERIA))
+    engine = TopsisEngine(matrix)
+    expected = skcriteria_similarity(matrix, weights)
+    np.testing.assert_allclose(engine.score(weights), expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(engine.score_many([weights, weights * 2])[1], expected, rtol=0, atol=1e-9)
+
+
+def test_subset_rows_are_scored_against_the_whole_catalog():
+    matrix = random_catalog(100)
+    weights = np.linspace(0.1, 1.0, len(CRITERIA))
+    engine = TopsisEngine(matrix)
+    rows = np.array([3, 50, 7])
+    np.testing.assert_allclose(engine.score(weights, rows), engine.score(weights)[rows])
+    positions, scores = engine.top_k(weights, k=2, rows=rows)
+    assert list(scores) == sorted(engine.score(weights, rows), reverse=True)[:2]
+    assert set(positions) <= set(rows)
+
+
+def test_zero_norm_column_is_ignored():
+    # skcriteria หารด้วย 0 จนได้ NaN ทั้งหมด: engine ให้ผลเท่ากับตัดคอลัมน์นั้นทิ้ง
+    matrix = random_catalog(50)
+    matrix[:, CRITERIA.index('fastcharge')] = 0.0
+    weights = np.linspace(0.1, 1.0, len(CRITERIA))
+    keep = [i for i, c in enumerate(CRITERIA) if c != 'fastcharge']
+    expected = skcriteria_similarity(matrix[:, keep], weights[keep], [CRITERIA[i] for i in keep])
+    scores = TopsisEngine(matrix).score(weights)
+    assert np.isfinite(scores).all()
+    np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-9)
+
+
+def test_single_row_catalog_scores_nan_without_error():
+    engine = TopsisEngine(random_catalog(1))
+    weights = np.ones(len(CRITERIA))
+    assert np.isnan(engine.score(weights)).all()
+    assert engine.score_many([weights]).shape == (1, 1)
+    positions, _ = engine.top_k(weights)
+    assert list(positions) == [0]
+
+
+def test_nan_only_affects_its_own_row():
+    matrix = random_catalog(40)
+    matrix[5, CRITERIA.index('efficiency')] = np.nan
+    weights = np.linspace(0.1, 1.0, len(CRITERIA))
+    scores = TopsisEngine(matrix).score(weights)
+    assert np.isnan(scores[5])
+    assert np.isfinite(np.delete(scores, 5)).all()
+    # แถวที่เป็น NaN อยู่ท้ายสุดของ top_k
+    positions, _ = TopsisEngine(matrix).top_k(weights, k=40)
+    assert positions[-1] == 5
+
+
+def test_from_arrays_round_trip():
+    matrix = random_catalog(20)
+    weights = np.linspace(0.1, 1.0, len(CRITERIA))
+    engine = TopsisEngine(matrix)
+    copy = TopsisEngine.from_arrays(engine.to_arrays())
+    np.testing.assert_array_equal(copy.score(weights), engine.score(weights))
+
+
+def test_ahp_weights_are_matched_to_criteria_by_name():
+    # ahpy เรียง target_weights ตามค่าน้ำหนักจากมากไปน้อย ไม่ใช่ตามลำดับเกณฑ์: โค้ดเดิมใช้ list(values())
+    # ตามตำแหน่งจึงให้น้ำหนักผิดเกณฑ์ engine ต้องจับคู่ตามชื่อ
+    ahpy = pytest.importorskip('ahpy')
+    matrix = random_catalog(80)
+    user_weights = dict(zip(CRITERIA, [5, 30, 10, 20, 15, 40, 25]))
+    keys = list(user_weights)
+    comparisons = {(k1, k2): user_weights[k1] / user_weights[k2] for i, k1 in enumerate(keys) for k2 in keys[i + 1:]}
+    target_weights = ahpy.Compare('Criteria Comparison', comparisons).target_weights
+    assert list(target_weights) != CRITERIA
+
+    scores = TopsisEngine(matrix).score(target_weights)
+    by_name = skcriteria_similarity(matrix, [target_weights[c] for c in CRITERIA])
+    by_position = skcriteria_similarity(matrix, list(target_weights.values()))
+    np.testing.assert_allclose(scores, by_name, rtol=0, atol=1e-9)
+    assert not np.allclose(scores, by_position)
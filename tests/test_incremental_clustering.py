@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""IncrementalOrdinalEncoder: ค่าตัวเลขที่เท่ากันเป็นหมวดเดียวกันไม่ว่าจะมาเป็นชนิดใด และ artifact รุ่นเก่ายังใช้ได้"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental_clustering import MISSING_CATEGORY, IncrementalOrdinalEncoder, category_key
+
+
+@pytest.mark.parametrize('value', [5, 5.0, '5', ' 5 ', '5.0', np.int64(5), np.float64(5.0)])
+def test_equal_numbers_share_one_key(value):
+    assert category_key(value) == '5'
+
+
+@pytest.mark.parametrize('value', [None, float('nan'), np.nan, pd.NA, pd.NaT])
+def test_missing_values_share_one_key(value):
+    assert category_key(value) == MISSING_CATEGORY
+
+
+def test_text_and_fractional_keys_stay_distinct():
+    assert category_key('AWD') == 'AWD'
+    assert category_key(5.5) != category_key(5)
+    assert category_key(True) != category_key(1)
+
+
+def test_seats_encode_the_same_across_dtypes():
+    encoder = IncrementalOrdinalEncoder(['seats'])
+    encoder.partial_fit(pd.DataFrame({'seats': [4, 5, 7]}))
+    for seats in ([4.0, 5.0, 7.0], ['4', '5', '7'], pd.array([4, 5, 7], dtype='Int64')):
+        np.testing.assert_array_equal(encoder.transform(pd.DataFrame({'seats': seats}))[:, 0], [0, 1, 2])
+    assert encoder.transform(pd.DataFrame({'seats': [6]}))[0, 0] == -1
+
+
+def test_legacy_str_keys_are_rekeyed_on_unpickle():
+    # artifact รุ่นเก่า: key เป็น str(value) จึงมี '5' กับ '5.0' แยกกัน และค่าว่างหลายแบบ
+    encoder = IncrementalOrdinalEncoder(['seats'])
+    state = dict(encoder.__dict__)
+    del state['normalized_keys_']
+    state['categories_'] = [{'5': 0, '7': 1, '5.0': 2, 'nan': 3, 'None': 4}]
+    legacy = IncrementalOrdinalEncoder.__new__(IncrementalOrdinalEncoder)
+    legacy.__setstate__(state)
+
+    assert legacy.normalized_keys_
+    # key ที่รวมกันใช้รหัสที่ได้ก่อน เพื่อให้ centroid เดิมยังมีความหมาย
+    assert legacy.categories_ == [{'5': 0, '7': 1, MISSING_CATEGORY: 3}]
+    encoded = legacy.transform(pd.DataFrame({'seats': [5.0, '7', None]}))[:, 0]
+    np.testing.assert_array_equal(encoded, [0, 1, 3])
+
+    restored = pickle.loads(pickle.dumps(legacy))
+    assert restored.categories_ == legacy.categories_
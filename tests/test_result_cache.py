@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""ResultCache: ทุก hit ได้สำเนาใหม่ และค่าวันที่/เวลา (Timestamp, NaT) ผ่าน JSON แล้วกลับมาเหมือนเดิม"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache, decode_value, encode_value
+
+RESULT = [{'model': 'm1', 'score': np.float64(0.75), 'seats': np.int64(5),
+           'released': pd.Timestamp('2024-03-01 08:30:00'), 'updated': pd.NaT,
+           'launch_date': datetime.date(2024, 1, 15), 'price': None}]
+
+
+class DictBackend:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(repr(key))
+
+    def set(self, key, raw):
+        self.data[repr(key)] = raw
+
+
+def test_get_returns_a_fresh_copy():
+    cache = ResultCache(maxsize=10, ttl=60)
+    cache.put('k', RESULT)
+    first = cache.get('k')
+    first[0]['model'] = 'changed'
+    first.append({'model': 'extra'})
+    second = cache.get('k')
+    assert second is not first
+    assert second[0]['model'] == 'm1'
+    assert len(second) == 1
+
+
+def test_put_does_not_keep_a_reference_to_the_caller_value():
+    cache = ResultCache(maxsize=10, ttl=60)
+    value = [{'model': 'm1'}]
+    cache.put('k', value)
+    value[0]['model'] = 'changed'
+    assert cache.get('k') == [{'model': 'm1'}]
+
+
+def test_timestamps_and_nat_round_trip():
+    restored = decode_value(encode_value(RESULT))[0]
+    assert restored['released'] == datetime.datetime(2024, 3, 1, 8, 30)
+    assert type(restored['released']) is datetime.datetime
+    assert restored['launch_date'] == datetime.date(2024, 1, 15)
+    assert type(restored['launch_date']) is datetime.date
+    assert restored['updated'] is None
+    assert restored['price'] is None
+    assert restored['score'] == 0.75 and type(restored['score']) is float
+    assert restored['seats'] == 5 and type(restored['seats']) is int
+
+
+def test_shared_backend_hit_is_decoded_the_same():
+    backend = DictBackend()
+    ResultCache(maxsize=10, ttl=60, shared=backend).put('k', RESULT)
+    other_worker = ResultCache(maxsize=10, ttl=60, shared=backend)
+    assert other_worker.get('k') == decode_value(encode_value(RESULT))
+    assert other_worker.shared_hits == 1
+
+
+def test_unencodable_value_is_not_cached():
+    cache = ResultCache(maxsize=10, ttl=60)
+    cache.put('k', [{'value': object()}])
+    assert cache.get('k') is None
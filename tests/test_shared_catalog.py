@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""SharedCatalogView[i] ต้องเท่ากับ catalog_records(df)[i] ทั้งค่าและชนิด (รวมคอลัมน์ datetime และ nullable)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_cache import catalog_records
+from fast_topsis import CRITERIA
+from shared_catalog import SharedCatalogView, write_catalog_files
+
+
+def make_catalog(n=6):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({c: rng.uniform(1, 100, n) for c in CRITERIA})
+    df['model'] = [f'm{i}' for i in range(n)]
+    df['seats'] = np.arange(n, dtype=np.int64)
+    df['note'] = ['a', None, 'c', 'd', None, 'f']
+    df['released'] = pd.to_datetime(['2024-01-01T00:00:00', None, '2024-03-01T12:30:00', '2023-12-31T00:00:00', None, '2022-06-15T00:00:00'])
+    df['updated'] = pd.to_datetime(['2024-01-01'] * n).tz_localize('Asia/Bangkok')
+    df['stock'] = pd.array([1, None, 3, 4, None, 6], dtype='Int64')
+    df['doors'] = pd.array([2, 4, 4, 2, 4, 5], dtype='Int64')
+    df['fast'] = pd.array([True, None, False, True, False, None], dtype='boolean')
+    df['rating'] = pd.array([4.5, None, 3.0, 5.0, 2.5, None], dtype='Float64')
+    return df
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    df = make_catalog()
+    write_catalog_files(str(tmp_path / 'v1'), df, 'v1', None, CRITERIA)
+    return df, SharedCatalogView(str(tmp_path / 'v1'))
+
+
+def test_rows_match_catalog_records(catalog):
+    df, view = catalog
+    records = catalog_records(df)
+    assert len(view) == len(records)
+    for position, expected in enumerate(records):
+        row = view[position]
+        assert list(row) == list(expected)
+        for column, value in expected.items():
+            assert row[column] == value, column
+            assert type(row[column]) is type(value), column
+
+
+def test_missing_values_are_none(catalog):
+    df, view = catalog
+    row = view[1]
+    assert row['released'] is None
+    assert row['stock'] is None
+    assert row['fast'] is None
+    assert row['rating'] is None
+    assert row['note'] is None
+    assert view[0]['stock'] == 1 and type(view[0]['stock']) is int
+
+
+def test_to_dataframe_round_trips_records(catalog):
+    df, view = catalog
+    assert catalog_records(view.to_dataframe()) == catalog_records(df)
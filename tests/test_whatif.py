@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""/whatIf: ตรวจ session และน้ำหนักที่ผู้ใช้ส่งมา (ค่าผิดรูปแบบต้องได้ 400 ไม่ใช่ 500)"""
+import base64
+import json
+
+import pytest
+
+WEIGHTS = {'battery': 10, 'range': 20, 'accelarate': 5, 'top_speed': 5, 'efficiency': 10,
+           'fastcharge': 10, 'estimated_thb_value': 40}
+SUBMIT = {'userProfile': {'gender': 'm'}, 'driveCon': 'AWD', 'numSeats': 5, 'summedWeight': WEIGHTS}
+
+
+@pytest.fixture
+def session_id(client):
+    response = client.post('/handleSubmit', json=SUBMIT)
+    assert response.status_code == 200
+    return response.headers['X-Session-Id']
+
+
+def encode(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode(session_id):
+    return json.loads(base64.urlsafe_b64decode(session_id + '=' * (-len(session_id) % 4)))
+
+
+def what_if(client, session_id, weights, **extra):
+    return client.post('/whatIf', json={'sessionId': session_id, 'summedWeight': weights, **extra})
+
+
+def test_string_weights_rank_like_numbers(client, session_id):
+    expected = what_if(client, session_id, WEIGHTS, stability=False)
+    response = what_if(client, session_id, {k: str(v) for k, v in WEIGHTS.items()}, stability=False)
+    assert response.status_code == 200
+    assert [r['model'] for r in response.json['results']] == [r['model'] for r in expected.json['results']]
+    assert response.json['catalogChanged'] is False
+
+
+@pytest.mark.parametrize('weights', [
+    dict(WEIGHTS, battery='abc'),
+    dict(WEIGHTS, battery=None),
+    dict(WEIGHTS, battery=0),
+    dict(WEIGHTS, battery=-1),
+    {k: 0 for k in WEIGHTS},
+    {'battery': 10},
+])
+def test_invalid_weights_are_rejected(client, session_id, weights):
+    assert what_if(client, session_id, weights).status_code == 400
+
+
+@pytest.mark.parametrize('change', [
+    {'w': [1.0, 2.0, 3.0]},
+    {'w': [0.0] * 7},
+    {'w': [float('nan')] + [1.0] * 6},
+    {'s': 'x'},
+    {'d': 5},
+])
+def test_invalid_session_is_rejected(client, session_id, change):
+    response = what_if(client, encode(dict(decode(session_id), **change)), WEIGHTS)
+    assert response.status_code == 400
+
+
+def test_catalog_version_mismatch_is_flagged(client, session_id):
+    response = what_if(client, encode(dict(decode(session_id), v='old-version')), WEIGHTS, stability=False)
+    assert response.status_code == 200
+    assert response.json['catalogChanged'] is True
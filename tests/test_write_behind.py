@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""WriteBehindSink: spool เมื่อ sink ใช้ไม่ได้ และ replay ไฟล์ที่ค้างภายใต้ flock โดยไม่มีแถวหาย"""
+import fcntl
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from write_behind import WriteBehindSink
+
+
+def failing_insert(table, rows, row_ids):
+    raise ConnectionError("warehouse ใช้ไม่ได้")
+
+
+class RecordingInsert:
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, table, rows, row_ids):
+        self.rows.extend(zip(row_ids, rows))
+        return []
+
+
+def make_sink(tmp_path, insert):
+    sink = WriteBehindSink(insert, spool_path=str(tmp_path / 'spool.jsonl'), batch_size=100,
+                           max_age=60, replay_interval=3600)
+    sink._closed = True  # ไม่ต้อง flush ตอนจบ test
+    return sink
+
+
+def write_replay_file(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row_id, record in rows:
+            f.write(json.dumps({'table': 't', 'row_id': row_id, 'record': record}) + '\n')
+
+
+def test_failed_flush_is_spooled_and_replayed_with_same_row_ids(tmp_path):
+    sink = make_sink(tmp_path, failing_insert)
+    sink._write([('t', 'r1', {'a': 1}), ('t', 'r2', {'a': 2})])
+    assert os.path.exists(sink.spool_path)
+
+    insert = RecordingInsert()
+    sink.insert = insert
+    assert sink.replay() == 2
+    assert insert.rows == [('r1', {'a': 1}), ('r2', {'a': 2})]
+    assert not os.listdir(tmp_path)
+
+
+def test_leftover_replay_and_orphan_files_are_claimed(tmp_path):
+    insert = RecordingInsert()
+    sink = make_sink(tmp_path, insert)
+    write_replay_file(f"{sink.spool_path}.abc.replay", [('r1', {'a': 1})])
+    write_replay_file(f"{sink.spool_path}.123.orphan", [('r2', {'a': 2})])
+    assert sink.replay() == 2
+    assert sorted(row_id for row_id, _ in insert.rows) == ['r1', 'r2']
+    assert not os.listdir(tmp_path)
+
+
+def test_replay_file_locked_by_another_process_is_skipped(tmp_path):
+    insert = RecordingInsert()
+    sink = make_sink(tmp_path, insert)
+    path = f"{sink.spool_path}.abc.replay"
+    write_replay_file(path, [('r1', {'a': 1})])
+    with open(path) as holder:
+        fcntl.flock(holder.fileno(), fcntl.LOCK_EX)
+        assert sink.replay() == 0
+        assert os.path.exists(path)
+    assert sink.replay() == 1
+    assert not os.path.exists(path)
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    insert = RecordingInsert()
+    sink = make_sink(tmp_path, insert)
+    path = f"{sink.spool_path}.abc.replay"
+    write_replay_file(path, [('r1', {'a': 1})])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"table": "t", "row_')
+    assert sink.replay() == 1
+
+
+def _spool_rows(spool_path, worker, count):
+    sink = WriteBehindSink(failing_insert, spool_path=spool_path, batch_size=1000, max_age=60, replay_interval=3600)
+    sink._closed = True
+    for i in range(count):
+        sink._write([('t', f'{worker}-{i}', {'i': i})])
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="ต้องใช้ fork")
+def test_concurrent_spool_and_replay_lose_no_rows(tmp_path):
+    insert = RecordingInsert()
+    sink = make_sink(tmp_path, insert)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_spool_rows, args=(sink.spool_path, w, 300)) for w in range(3)]
+    for process in workers:
+        process.start()
+    while any(process.is_alive() for process in workers):
+        sink.replay()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+    sink.replay()
+    row_ids = [row_id for row_id, _ in insert.rows]
+    assert len(row_ids) == len(set(row_ids)) == 900
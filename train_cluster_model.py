@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""train โมเดล clustering ผู้ใช้แบบ offline แล้วบันทึกเป็น artifact ให้ worker โหลดไปใช้
+
+ใช้งาน: python train_cluster_model.py  (กำหนดที่เก็บไฟล์ด้วย CLUSTER_MODEL_PATH)
+"""
+from bit15_model_app import cluster_store
+
+if __name__ == "__main__":
+    model = cluster_store.retrain()
+    if model is None:
+        raise SystemExit("train โมเดลคลัสเตอร์ไม่สำเร็จ")
+    print(f"บันทึกโมเดล version {model.version} ({model.n_samples} แถว) ที่ {cluster_store.path}")
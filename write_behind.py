@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""บันทึกข้อมูลลง warehouse แบบ write-behind: เข้าคิวทันที แล้ว flush เป็น batch ใน thread เบื้องหลัง"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindSink:
+    """คิวเขียนข้อมูลแบบ batch
+
+    - submit() คืนค่าทันที ไม่รอ warehouse
+    - flush เมื่อคิวครบ batch_size แถว หรือแถวที่เก่าที่สุดรอนานเกิน max_age วินาที
+    - ถ้า insert ล้มเหลวทั้ง batch (sink ใช้ไม่ได้) จะต่อท้ายไฟล์ spool แบบ append-only แล้ว replay ภายหลัง
+    - แต่ละแถวได้ row_id ตั้งแต่ตอนเข้าคิวและใช้ค่าเดิมตอน replay (insertId ของ BigQuery กันแถวซ้ำ)
+
+    insert(table, rows, row_ids) ต้องคืนรายการ error ต่อแถว (เหมือน insert_rows_json) หรือ raise หาก sink ใช้ไม่ได้
+    """
+
+    def __init__(self, insert, spool_path=None, batch_size=None, max_age=None, replay_interval=None):
+        self.insert = insert
+        self.spool_path = spool_path or os.environ.get('WRITE_BEHIND_SPOOL', 'artifacts/write_behind.spool.jsonl')
+        self.batch_size = int(batch_size if batch_size is not None
+                              else os.environ.get('WRITE_BEHIND_BATCH_SIZE', 200))
+        self.max_age = float(max_age if max_age is not None else os.environ.get('WRITE_BEHIND_MAX_AGE', 2.0))
+        self.replay_interval = float(replay_interval if replay_interval is not None
+                                     else os.environ.get('WRITE_BEHIND_REPLAY_INTERVAL', 60))
+        self._queue = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._last_replay = 0.0
+        self._closed = False
+        self._thread = None
+        self._thread_pid = None
+        atexit.register(self.close)
+
+    @property
+    def depth(self):
+        """จำนวนแถวที่รออยู่ในคิว"""
+        return len(self._queue)
+
+    def submit(self, table, record, row_id=None):
+        """เข้าคิวแถวหนึ่งแถว (คืน row_id ที่ใช้)"""
+        row_id = row_id or uuid.uuid4().hex
+        with self._cond:
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.append((table, row_id, record))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        self.start()
+        return row_id
+
+    def start(self):
+        """เริ่ม thread flush (เรียกซ้ำได้ และเรียกใหม่หลัง fork ได้)"""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        first = True
+        while not self._closed:
+            # ข้อผิดพลาดที่ไม่คาดคิด (เช่นดิสก์เต็มตอน spool) ต้องไม่ทำให้ thread หยุด มิฉะนั้นแถวที่ submit ต่อจะค้างในคิวตลอดไป
+            try:
+                if first or time.monotonic() - self._last_replay >= self.replay_interval:
+                    first = False
+                    self.replay()
+                with self._cond:
+                    if not self._due() and not self._closed:
+                        age = time.monotonic() - self._oldest if self._queue else 0.0
+                        self._cond.wait(max(0.0, self.max_age - age))
+                if self._due():
+                    self.flush()
+            except Exception:
+                logger.exception("write-behind ผิดพลาด จะลองใหม่")
+                time.sleep(min(1.0, self.max_age))
+
+    def _due(self):
+        """คิวครบ batch หรือแถวที่เก่าที่สุดรอนานเกิน max_age แล้ว"""
+        if len(self._queue) >= self.batch_size:
+            return True
+        return bool(self._queue) and time.monotonic() - self._oldest >= self.max_age
+
+    def _take(self):
+        with self._cond:
+            batch, self._queue = self._queue, []
+            self._oldest = None
+        return batch
+
+    def flush(self):
+        """เขียนทุกแถวที่อยู่ในคิวทันที (แยก batch ตามตาราง)"""
+        with self._flush_lock:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        """insert แถวทีละตาราง คืนแถวที่เขียนไม่สำเร็จเพราะ sink ใช้ไม่ได้ (ถูก spool แล้ว)"""
+        by_table = {}
+        for table, row_id, record in batch:
+            by_table.setdefault(table, []).append((row_id, record))
+        failed = []
+        for table, rows in by_table.items():
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                try:
+                    errors = self.insert(table, [r for _, r in chunk], [i for i, _ in chunk])
+                except Exception as e:
+                    logger.warning("เขียนข้อมูลลง %s ไม่สำเร็จ เก็บลง spool แทน: %s", table, e)
+                    failed.extend((table, row_id, record) for row_id, record in chunk)
+                    continue
+                if errors:
+                    # แถวที่ข้อมูลไม่ถูกต้องถูกข้ามไป (skip_invalid_rows) ไม่ต้อง spool
+                    logger.error("บันทึกข้อมูลไม่สำเร็จ: %s", errors)
+        if failed:
+            self._spool(failed)
+        return failed
+
+    @staticmethod
+    def _open_locked(path, mode):
+        """เปิดไฟล์แล้วถือ flock แบบ exclusive (รอได้) คืน None หากไฟล์ไม่มีแล้ว
+
+        ทุก process ใช้ spool path เดียวกัน: หลังได้ lock ต้องตรวจว่า path ยังชี้ไปที่ไฟล์เดิม เพราะ process อื่นอาจ
+        ย้ายไฟล์ไป replay (และลบ) ระหว่าง open กับ lock ถ้าเขียนต่อไฟล์ที่ถูกลบไปแล้ว แถวจะหายเงียบ ๆ
+        """
+        while True:
+            try:
+                f = open(path, mode, encoding='utf-8')
+            except FileNotFoundError:
+                return None
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+            if 'a' not in mode:
+                return None
+
+    def _spool(self, rows):
+        directory = os.path.dirname(os.path.abspath(self.spool_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._spool_lock, self._open_locked(self.spool_path, 'a') as f:
+            for table, row_id, record in rows:
+                f.write(json.dumps({'table': table, 'row_id': row_id, 'record': record},
+                                   ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self):
+        """ส่งแถวใน spool ซ้ำ (row_id เดิม) แถวที่ยังส่งไม่ได้จะกลับไปอยู่ใน spool
+
+        spool ถูกย้ายเป็นไฟล์ replay ชื่อ uuid (ไม่ทับไฟล์ที่ค้างอยู่) ขณะถือ flock ของ spool ซึ่ง _spool ถือตอนเขียนเช่นกัน
+        จึงไม่มีการย้ายไฟล์กลางบรรทัดที่เขียนไม่ครบ แล้วทุกไฟล์ replay ที่พบ รวมถึงไฟล์ที่ค้างจาก process ที่ตายระหว่าง replay
+        ถูกประมวลผลภายใต้ flock ของไฟล์นั้น: process ที่ถือ lock อยู่ทำงานกับไฟล์ได้รายเดียว และ lock หลุดเองเมื่อ
+        process ตาย ไฟล์จึงถูกรับช่วงในรอบถัดไปเสมอ (ไม่พึ่ง pid ซึ่งซ้ำได้หลัง restart)
+        """
+        self._last_replay = time.monotonic()
+        replay_path = f"{self.spool_path}.{uuid.uuid4().hex}.replay"
+        with self._spool_lock:
+            spool = self._open_locked(self.spool_path, 'r')
+            if spool is not None:
+                with spool:
+                    os.replace(self.spool_path, replay_path)
+        replayed = 0
+        for path in self._replay_files():
+            replayed += self._replay_file(path)
+        return replayed
+
+    def _replay_files(self):
+        """ไฟล์ replay ทั้งหมด (รวม *.orphan ที่ถูกรับช่วงไว้แล้วโดยรูปแบบชื่อไฟล์เดิม)"""
+        pattern = glob.escape(self.spool_path)
+        return sorted(glob.glob(f"{pattern}.*.replay") + glob.glob(f"{pattern}.*.orphan"))
+
+    def _replay_file(self, path):
+        try:
+            f = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            return 0
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # process อื่นกำลัง replay ไฟล์นี้อยู่
+                return 0
+            try:
+                # ไฟล์อาจถูก replay และลบไปแล้วระหว่าง glob กับ open
+                if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                    return 0
+            except FileNotFoundError:
+                return 0
+            rows = self._read_lines(f)
+            with self._flush_lock:
+                failed = self._write(rows) if rows else []
+            os.remove(path)
+        return len(rows) - len(failed)
+
+    @staticmethod
+    def _read_lines(f):
+        rows = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                # บรรทัดสุดท้ายอาจเขียนไม่ครบถ้า process ตายระหว่างเขียน
+                logger.warning("ข้ามบรรทัดที่เสียใน spool: %.80s", line)
+                continue
+            rows.append((item['table'], item['row_id'], item['record']))
+        return rows
+
+    def close(self):
+        """flush ทุกแถวที่ค้างก่อนปิด process"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._cond:
+            self._cond.notify_all()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("flush ตอนปิดไม่สำเร็จ: %s", e)